@@ -1,13 +1,21 @@
 # -*- encoding: utf-8 -*-
-
-from tekmate.configuration import PyGameInitializer, TekmateFactory
+from argparse import ArgumentParser
 import logging
 
+from tekmate.profiler import startup_profiler
+
 
 def main():
+    parser = ArgumentParser(description="Tek'ma'te")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="log import and initialization times up to the first frame")
+    arguments = parser.parse_args()
+
     logging.basicConfig(level=logging.DEBUG)
-    initializer = PyGameInitializer({"display_width": 1024, "display_height": 576})
-    game_factory = TekmateFactory(initializer)
+    startup_profiler.enabled = arguments.startup_report
+    configuration = startup_profiler.import_module("tekmate.configuration")
+    initializer = configuration.PyGameInitializer({"display_width": 1024, "display_height": 576})
+    game_factory = configuration.TekmateFactory(initializer)
     game = game_factory.create()
     game.enter_mainloop()
 
@@ -0,0 +1,120 @@
+# -*- encoding: utf-8 -*-
+from argparse import ArgumentParser
+from fnmatch import fnmatch
+import io
+from json import dumps, loads
+import mmap
+import os
+from os.path import abspath, join, normpath, relpath, split
+import struct
+
+ASSET_ROOT = normpath(join(abspath(split(__file__)[0]), "..", "assets"))
+PACK_PATH = ASSET_ROOT + ".pak"
+
+
+class AssetPack(object):
+    class InvalidPack(Exception):
+        pass
+
+    MAGIC = b"TKPK"
+    HEADER = struct.Struct("<4sI")
+    EXCLUDED_FILES = ("*.xcf", "diagrams/*")
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as pack_file:
+            self.mmap = mmap.mmap(pack_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.mmap)
+        self.index = self.read_index()
+
+    def read_index(self):
+        try:
+            magic, index_length = self.HEADER.unpack_from(self.mmap, 0)
+        except struct.error:
+            raise AssetPack.InvalidPack(self.path)
+        if magic != self.MAGIC:
+            raise AssetPack.InvalidPack(self.path)
+        data_offset = self.HEADER.size + index_length
+        index = loads(self.mmap[self.HEADER.size:data_offset].decode("utf-8"))
+        return dict((name, (data_offset + offset, length)) for name, (offset, length) in index.items())
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def names(self):
+        return list(self.index)
+
+    def read(self, name):
+        offset, length = self.index[name]
+        return self.view[offset:offset + length]
+
+    def open(self, name):
+        return PackedFile(self.read(name))
+
+    def close(self):
+        self.view.release()
+        self.mmap.close()
+
+    @staticmethod
+    def build(source_directory, pack_path):
+        files = [(name, path) for name, path in AssetPack.collect_files(source_directory)
+                 if not any(fnmatch(name, pattern) for pattern in AssetPack.EXCLUDED_FILES)]
+        index, offset = dict(), 0
+        for name, path in files:
+            length = os.path.getsize(path)
+            index[name] = (offset, length)
+            offset += length
+        encoded_index = dumps(index, sort_keys=True).encode("utf-8")
+        with open(pack_path, "wb") as pack_file:
+            pack_file.write(AssetPack.HEADER.pack(AssetPack.MAGIC, len(encoded_index)))
+            pack_file.write(encoded_index)
+            for _, path in files:
+                with open(path, "rb") as asset_file:
+                    pack_file.write(asset_file.read())
+
+    @staticmethod
+    def collect_files(source_directory):
+        files = list()
+        for directory, _, file_names in os.walk(source_directory):
+            for file_name in sorted(file_names):
+                path = join(directory, file_name)
+                files.append((relpath(path, source_directory).replace(os.sep, "/"), path))
+        return sorted(files)
+
+
+class PackedFile(io.RawIOBase):
+    def __init__(self, view):
+        super(PackedFile, self).__init__()
+        self.data = view
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer_to_fill):
+        length = min(len(buffer_to_fill), len(self.data) - self.position)
+        buffer_to_fill[:length] = self.data[self.position:self.position + length]
+        self.position += length
+        return length
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        start = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: len(self.data)}[whence]
+        self.position = max(0, start + offset)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+
+def main():  # pragma: no cover
+    parser = ArgumentParser(description="Pack the asset directory into a single archive.")
+    parser.add_argument("source", nargs="?", default=ASSET_ROOT)
+    parser.add_argument("pack", nargs="?", default=PACK_PATH)
+    arguments = parser.parse_args()
+    AssetPack.build(arguments.source, arguments.pack)
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
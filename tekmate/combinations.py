@@ -0,0 +1,155 @@
+# -*- encoding: utf-8 -*-
+import codecs
+from functools import partial
+from json import loads
+
+from tekmate.resources import resources
+
+WRONG_COMBINATION = "I can't do that!"
+
+
+class CombinationRule(object):
+    def __init__(self, selected, target, conditions=(), effects=(), message=None):
+        self.selected = selected
+        self.target = target
+        self.conditions = list(conditions)
+        self.effects = list(effects)
+        self.message = message
+
+    def check(self, selected, target):
+        for condition, message in self.conditions:
+            if not condition(selected, target):
+                return False, selected.get_combination_message(target, message) if message else WRONG_COMBINATION
+        return True, selected.get_combination_message(selected, self.message) if self.message else None
+
+    def apply(self, selected, target):
+        for effect in self.effects:
+            effect(selected, target)
+
+
+class _ImpossibleCombination(object):
+    @staticmethod
+    def check(selected, target):
+        return False, WRONG_COMBINATION
+
+    @staticmethod
+    def apply(selected, target):
+        pass
+
+
+IMPOSSIBLE_COMBINATION = _ImpossibleCombination()
+
+
+def get_item(reference, selected, target):
+    if reference == "selected":
+        return selected
+    if reference == "target":
+        return target
+    return target.find_in_parent_container(reference)
+
+
+def has_value(reference, flag, value, selected, target):
+    return get_item(reference, selected, target).get_flag(flag) == value
+
+
+def has_flag_of(reference, flag, other_reference, other_flag, selected, target):
+    return get_item(reference, selected, target).get_flag(flag) == \
+        get_item(other_reference, selected, target).get_flag(other_flag)
+
+
+def set_flag(reference, flag, value, selected, target):
+    get_item(reference, selected, target).set_flag(flag, value)
+
+
+def increment_flag(reference, flag, selected, target):
+    item = get_item(reference, selected, target)
+    item.set_flag(flag, item.get_flag(flag) + 1)
+
+
+def remove_item(reference, selected, target):
+    get_item(reference, selected, target).remove_from_parent_container()
+
+
+def change_look_at(reference, message, selected, target):
+    item = get_item(reference, selected, target)
+    item.change_look_at_message(item, message)
+
+
+def spawn_item(reference, name, selected, target):
+    get_item(reference, selected, target).spawn_in_parent_container(name)
+
+
+class CombinationTable(object):
+    class InvalidCombination(Exception):
+        pass
+
+    EFFECTS = {
+        "set": lambda effect: partial(set_flag, effect["item"], effect["flag"], effect["value"]),
+        "increment": lambda effect: partial(increment_flag, effect["item"], effect["flag"]),
+        "remove": lambda effect: partial(remove_item, effect["item"]),
+        "look_at": lambda effect: partial(change_look_at, effect["item"], effect["message"]),
+        "spawn": lambda effect: partial(spawn_item, effect["item"], effect["name"])
+    }
+
+    def __init__(self, source, name):
+        self.source = source
+        self.name = name
+        self.mtime = None
+        self.rules = dict()
+
+    def get_rule(self, selected_name, target_name):
+        self.reload_if_modified()
+        return self.rules.get((selected_name, target_name), IMPOSSIBLE_COMBINATION)
+
+    def reload_if_modified(self):
+        mtime = self.source.getmtime(self.name)
+        if mtime != self.mtime:
+            self.rules = self.load()
+            self.mtime = mtime
+
+    def load(self):
+        return self.compile(loads(codecs.decode(self.source.read(self.name), "utf-8")))
+
+    @staticmethod
+    def compile(rules_data):
+        if not isinstance(rules_data, list):
+            raise CombinationTable.InvalidCombination("combinations must be a list of rules")
+        rules = dict()
+        for rule_data in rules_data:
+            rule = CombinationTable.compile_rule(rule_data)
+            key = (rule.selected, rule.target)
+            if key in rules:
+                raise CombinationTable.InvalidCombination("%s is combined with %s twice" % key)
+            rules[key] = rule
+        return rules
+
+    @staticmethod
+    def compile_rule(rule_data):
+        try:
+            return CombinationRule(rule_data["selected"], rule_data["target"],
+                                   [CombinationTable.compile_condition(condition)
+                                    for condition in rule_data.get("conditions", [])],
+                                   [CombinationTable.compile_effect(effect) for effect in rule_data.get("effects", [])],
+                                   rule_data.get("message"))
+        except (KeyError, TypeError) as error:
+            raise CombinationTable.InvalidCombination("invalid rule %r: %s" % (rule_data, error))
+
+    @staticmethod
+    def compile_condition(condition):
+        if "equals" in condition:
+            other_reference, other_flag = condition["equals"]
+            check = partial(has_flag_of, condition["item"], condition["flag"], other_reference, other_flag)
+        else:
+            check = partial(has_value, condition["item"], condition["flag"], condition["value"])
+        return check, condition.get("message")
+
+    @staticmethod
+    def compile_effect(effect):
+        try:
+            compile_action = CombinationTable.EFFECTS[effect["action"]]
+        except KeyError:
+            raise CombinationTable.InvalidCombination("unknown action in effect %r" % (effect,))
+        return compile_action(effect)
+
+
+combination_table = CombinationTable(resources, "global/combinations.json")
@@ -1,31 +1,73 @@
 # -*- encoding: utf-8 -*-
-from glob import glob
-from os.path import join, splitext, abspath, split
-import sys
+from collections import OrderedDict
+import logging
+from os.path import join, splitext
+from threading import Thread
+from xml.etree import ElementTree
 
 import pygame
-from pytmx.util_pygame import load_pygame
-from taz.game import Game
 
-from tekmate.game import Map, Waypoint
-from tekmate.draw.scenes import WorldScene
-from tekmate.draw.ui import DoorUI, LetterUI, BackgroundUI, LetterUnderDoorUI
+from tekmate.resources import resources
+from tekmate.events import EventDispatcher
+from tekmate.game import Map, WaypointGraph
+from tekmate.items import ItemContainer, item_data
+from tekmate.mapcache import MapCache, MapDescription
+from tekmate.pathfinding import FlowFieldService
+from tekmate.profiler import lazy_import, startup_profiler
+from tekmate.scheduler import Scheduler
+
+try:  # pragma: no cover
+    from collections.abc import Mapping
+except ImportError:  # pragma: no cover
+    from collections import Mapping
+
+try:  # pragma: no cover
+    from queue import Queue, Empty
+except ImportError:  # pragma: no cover
+    from Queue import Queue, Empty
+
+logger = logging.getLogger()
+
+pytmx = lazy_import("pytmx")
+taz_game = lazy_import("taz.game")
+scenes = lazy_import("tekmate.draw.scenes")
+preload = lazy_import("tekmate.draw.preload")
+surfacecache = lazy_import("tekmate.draw.surfacecache")
+ui = lazy_import("tekmate.draw.ui")
 
 
 class PyGameInitializer(object):
     CAPTION = "Tek'ma'te"
 
-    def __init__(self, configuration):
+    def __init__(self, configuration, map_cache=None):
         self.configuration = configuration
+        self.map_cache = map_cache
+        self.map_loader = None
+        self.global_images = None
 
     def initialize(self):
-        pygame.init()
-        self.set_up_display()
-        self.set_up_mouse()
-        self.load_global_images()
+        with startup_profiler.section("map index"):
+            self.map_loader = MapLoader(self.map_cache)
+        with startup_profiler.section("startup image decoding (start)"):
+            startup_loader = preload.StartupLoader(self.get_startup_image_names(), surfacecache.surface_cache)
+            startup_loader.start()
+        with startup_profiler.section("pygame.init"):
+            pygame.init()
+        with startup_profiler.section("display"):
+            self.set_up_display()
+            self.set_up_mouse()
+        with startup_profiler.section("startup image decoding (collect)"):
+            ui.UI.decoded_images.update(startup_loader.collect())
+        with startup_profiler.section("global images"):
+            self.global_images = self.load_global_images()
 
         return self.get_update_context(), self.get_render_context()
 
+    def get_startup_image_names(self):
+        start_map = self.map_loader.load_description(scenes.WorldScene.START_MAP)
+        return resources.glob("global/*.png") + self.map_loader.get_map_image_names(
+            start_map, self.map_loader.get_item_attributes())
+
     def set_up_display(self):
         pygame.display.set_mode((self.configuration["display_width"], self.configuration["display_height"]))
         pygame.display.set_caption(self.CAPTION)
@@ -35,34 +77,36 @@ class PyGameInitializer(object):
 
     def load_global_images(self):
         images = dict()
-        base_path = join("assets", "global")
-        for image_file in glob(join(base_path, "*.png")):
+        for image_file in resources.glob("global/*.png"):
             self.add_image_to_images_dict(image_file, images)
         return images
 
     def add_image_to_images_dict(self, image_file, images):
         surface = self.load_image_from_hard_drive(image_file)
-        name = splitext(image_file)
+        name = splitext(join("assets", image_file))
         images[name[0]] = surface
 
     def load_image_from_hard_drive(self, image_file):
-        surface = pygame.image.load(image_file).convert()
-        surface.set_colorkey((0, 128, 128))
-        return surface
+        return surfacecache.surface_cache.load(image_file, colorkey=(0, 128, 128),
+                                               decoded_image=ui.UI.decoded_images.pop(image_file, None))
 
     def get_render_context(self):
         render_context = {
             "flip": pygame.display.flip,
             "display": pygame.display.get_surface(),
-            "images-global": self.load_global_images()
+            "images-global": self.global_images
         }
         return render_context
 
     def get_update_context(self):
+        maps = self.map_loader.map_dict
         update_context = {
             "clock": pygame.time.Clock(),
             "get_events": pygame.event.get,
-            "maps": MapLoader().map_dict
+            "event_dispatcher": EventDispatcher(),
+            "scheduler": Scheduler(),
+            "maps": maps,
+            "map_prefetcher": MapPrefetcher(maps)
         }
         return update_context
 
@@ -73,121 +117,284 @@ class TekmateFactory(object):
 
     def create(self):
         update_context, render_context = self.pygame_initializer.initialize()
-        game = Game(update_context, render_context)
+        with startup_profiler.section("world scene"):
+            game = taz_game.Game(update_context, render_context)
 
-        scene = WorldScene("world")
-        game.register_new_scene(scene)
-        game.push_scene_on_stack("world")
+            scene = scenes.WorldScene("world")
+            game.register_new_scene(scene)
+            game.push_scene_on_stack("world")
         return game
 
 
+class MapRepository(Mapping):
+    RESIDENT_MAPS = 4
+
+    def __init__(self, map_loader, resident_maps=RESIDENT_MAPS):
+        self.map_loader = map_loader
+        self.resident_maps = resident_maps
+        self.names = map_loader.get_map_names()
+        self.maps = dict()
+        self.resident = OrderedDict()
+        self.last_accessed = None
+
+    def __getitem__(self, name):
+        if name not in self.names:
+            raise KeyError(name)
+        if name not in self.maps:
+            self.add(name, self.map_loader.load_map(name))
+        self.make_resident(name)
+        self.last_accessed = name
+        return self.maps[name]
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def is_loaded(self, name):
+        return name in self.maps
+
+    def get_loaded_maps(self):
+        return [self.maps[name] for name in self.names if name in self.maps]
+
+    def add_prefetched(self, name, new_map):
+        if not self.is_loaded(name):
+            self.add(name, new_map)
+            self.make_resident(self.last_accessed)
+
+    def add(self, name, new_map):
+        if name not in self.names:
+            self.names.append(name)
+        self.maps[name] = new_map
+        self.resident[name] = True
+
+    def unload(self, name):
+        self.maps.pop(name, None)
+        self.resident.pop(name, None)
+        if self.last_accessed == name:
+            self.last_accessed = None
+
+    def is_resident(self, name):
+        return name in self.resident
+
+    def make_resident(self, name):
+        if name is None:
+            return
+        if not self.is_resident(name):
+            self.restore_surfaces(self.maps[name])
+        self.resident.pop(name, None)
+        self.resident[name] = True
+        self.evict_least_recently_used()
+
+    def evict_least_recently_used(self):
+        while len(self.resident) > self.resident_maps:
+            name, _ = self.resident.popitem(last=False)
+            self.release_surfaces(self.maps[name])
+
+    @staticmethod
+    def release_surfaces(evicted_map):
+        evicted_map.background.release_image()
+        for item_ui in evicted_map.items:
+            item_ui.release_image()
+
+    @staticmethod
+    def restore_surfaces(resident_map):
+        resident_map.background.restore_image()
+        for item_ui in resident_map.items:
+            item_ui.restore_image()
+
+
+class MapPrefetcher(object):
+    def __init__(self, map_repository):
+        self.map_repository = map_repository
+        self.requested_maps = Queue()
+        self.prefetched_maps = Queue()
+        self.pending = set()
+        self.thread = None
+
+    def prefetch_neighbors(self, current_map):
+        for name in set(current_map.exits.values()):
+            self.prefetch(name)
+
+    def prefetch(self, name):
+        if self.is_prefetch_needed(name):
+            self.pending.add(name)
+            self.requested_maps.put((name, self.map_repository.map_loader.get_item_attributes()))
+            self.start_thread()
+
+    def is_prefetch_needed(self, name):
+        return name in self.map_repository and not self.map_repository.is_loaded(name) and name not in self.pending
+
+    def start_thread(self):
+        if self.thread is None:
+            self.thread = Thread(target=self.read_requested_maps, name="map-prefetcher")
+            self.thread.daemon = True
+            self.thread.start()
+
+    def read_requested_maps(self):  # pragma: no cover
+        while True:
+            self.read_map(*self.requested_maps.get())
+
+    def read_map(self, name, item_attributes):
+        try:
+            prefetched_map = self.map_repository.map_loader.read_map(name, item_attributes)
+        except Exception:
+            logger.exception("Prefetching map %s failed" % name)
+            prefetched_map = None
+        self.prefetched_maps.put((name, prefetched_map))
+
+    def finish_prefetched_map(self):
+        try:
+            name, prefetched_map = self.prefetched_maps.get_nowait()
+        except Empty:
+            return
+        self.pending.discard(name)
+        if prefetched_map is not None and not self.map_repository.is_loaded(name):
+            self.map_repository.add_prefetched(name, self.map_repository.map_loader.create_prefetched_map(
+                *prefetched_map))
+
+
 class MapLoader(object):
-    ITEM_TYPES = {
-        "door": DoorUI,
-        "letter": LetterUI,
-        "letter_under_door": LetterUnderDoorUI
-    }
-
-    def __init__(self):
-        self.map_dict = dict()
+    def __init__(self, map_cache=None):
         self.tmx_dict = dict()
-        self.fill_tmx()
-        self.create_maps()
+        self.map_cache = map_cache if map_cache is not None else MapCache()
+        self.map_dict = MapRepository(self)
+
+    def get_map_names(self):
+        return [splitext(tmx_name)[0][len("maps/"):] for tmx_name in resources.glob("maps/*.tmx")]
+
+    def get_tmx_name(self, name):
+        return "maps/%s.tmx" % name
+
+    def read_tmx_data(self, name):
+        return resources.read(self.get_tmx_name(name))
+
+    def load_map(self, name):
+        return self.create_map(self.load_description(name))
+
+    def read_map(self, name, item_attributes):
+        description = self.load_description(name)
+        return description, self.decode_map_images(description, item_attributes)
+
+    def decode_map_images(self, description, item_attributes):
+        return dict((image_name, ui.UI.decode_image(image_name))
+                    for image_name in self.get_map_image_names(description, item_attributes))
+
+    def get_item_attributes(self):
+        item_data.reload_if_modified()
+        return dict((tmx_type, item_data.items[name]) for tmx_type, name in item_data.tmx_types.items())
+
+    def get_map_image_names(self, description, item_attributes):
+        image_names = set(ui.UI.get_image_name("items", item_attributes[item_type]["image"])
+                          for item_type, _ in description.items)
+        image_names.add(ui.UI.get_image_name(*ui.BackgroundUI.get_image_location(description.background)))
+        return sorted(image_names)
+
+    def create_prefetched_map(self, description, decoded_images):
+        ui.UI.decoded_images.update(decoded_images)
+        return self.create_map(description)
+
+    def load_description(self, name):
+        tmx_data = self.read_tmx_data(name)
+        description = self.map_cache.load(name, tmx_data)
+        if description is None:
+            description = self.compile_description(name, tmx_data)
+        return description
+
+    def compile_description(self, name, tmx_data):
+        description = self.describe_tmx(name, self.parse_tmx(name, tmx_data))
+        self.map_cache.store(description, tmx_data)
+        return description
+
+    def parse_tmx(self, name, tmx_data=None):
+        tmx = pytmx.TiledMap()
+        tmx.filename = self.get_tmx_name(name)
+        tmx.parse_xml(ElementTree.fromstring(bytes(tmx_data or self.read_tmx_data(name))))
+        return tmx
 
     def fill_tmx(self):
-        pth = abspath(split(__file__)[0])
-        sys.path.append(abspath(join(pth, u"..")))
-        self.tmx_dict["example"] = load_pygame(join(pth, "..", "assets", "maps", "example.tmx"))
+        for name in self.get_map_names():
+            self.tmx_dict[name] = self.parse_tmx(name)
 
     def create_maps(self):
         for key, value in self.tmx_dict.items():
-            new_map = Map(key)
-            self.load_objects(value, new_map)
-            self.set_map_properties(value, new_map)
-            self.map_dict[key] = new_map
+            self.map_dict.add(key, self.create_map(self.describe_tmx(key, value)))
+
+    def describe_tmx(self, name, tmx):
+        description = MapDescription(name)
+        self.describe_objects(tmx, description)
+        self.describe_background(tmx, description)
+        return description
 
-    def load_objects(self, tmx, new_map):  # pragma: no cover
+    def describe_objects(self, tmx, description):  # pragma: no cover
         for object_group in tmx.objectgroups:
-            self.load_items(new_map, object_group)
-            self.load_waypoints(new_map, object_group)
-            self.load_exits(new_map, object_group)
+            self.describe_items(description, object_group)
+            self.describe_waypoints(description, object_group)
+            self.describe_exits(description, object_group)
+            self.describe_obstacles(description, object_group)
 
-    def load_items(self, new_map, object_group):
+    def describe_items(self, description, object_group):
         if object_group.name == "items":
-            new_map.items = self.create_items(object_group)
-            new_map.set_items_parent_container()
+            for item in object_group:
+                description.add_item(item.name, (item.x, item.y))
 
-    def create_items(self, items):  # pragma: no cover
-        items_list = []
-        for item in items:
-            item_ui = self.create_item_object(item)
-            items_list.append(item_ui)
-        return items_list
-
-    def create_item_object(self, item):
-        item_ui = self.ITEM_TYPES[item.name]()
-        item_ui.rect.move_ip((item.x, item.y))
-        return item_ui
-
-    def load_waypoints(self, new_map, object_group):
+    def describe_waypoints(self, description, object_group):
         if object_group.name == "waypoints":
-            new_map.waypoints = self.create_waypoints(object_group)
-            self.create_neighbors(new_map, object_group)
-
-    def create_waypoints(self, waypoints):
-        wp_list = dict()
-        for waypoint in waypoints:
-            wp = self.create_waypoint_object(waypoint)
-            wp_list[waypoint.name] = wp
-        return wp_list
-
-    def create_waypoint_object(self, waypoint):
-        wp = Waypoint(waypoint.name)
-        wp.pos = (waypoint.x, waypoint.y + waypoint.height)
-        return wp
-
-    def create_neighbors(self, new_map, object_group):
-        for waypoint_of_object_group in object_group:
-            waypoint_object = self.get_waypoint_of_map(new_map, waypoint_of_object_group)
-            self.setup_waypoint_properties(waypoint_object, waypoint_of_object_group, new_map)
-
-    def setup_waypoint_properties(self, waypoint_object, waypoint_of_object_group, new_map):
-        for wp_property in waypoint_of_object_group.properties:
-            self.set_waypoint_as_spawn(waypoint_object, wp_property)
-            self.add_neighbor_to_waypoint(waypoint_object, waypoint_of_object_group, wp_property, new_map)
-
-    def get_waypoint_of_map(self, new_map, waypoint):
-        return new_map.waypoints[waypoint.name]
-
-    def set_waypoint_as_spawn(self, wp, wp_property):
-        if wp_property == "spawn":
-            wp.is_spawn = True
-
-    def add_neighbor_to_waypoint(self, waypoint_object, waypoint_of_object_group, wp_property, new_map):
-        if wp_property == "connect":
-            neighbors_array = self.build_neighbors_array(waypoint_of_object_group)
-            self.fill_up_neighbors_array_for_wp(neighbors_array, waypoint_object, new_map)
+            for waypoint in object_group:
+                description.add_waypoint(waypoint.name, (waypoint.x, waypoint.y + waypoint.height),
+                                         "spawn" in waypoint.properties, self.build_neighbors_array(waypoint))
 
     def build_neighbors_array(self, waypoint):
-        return waypoint.properties["connect"].split(", ")
-
-    def fill_up_neighbors_array_for_wp(self, neighbors_array, waypoint_object, new_map):
-        for neighbor in neighbors_array:
-            waypoint_object.neighbors[neighbor] = new_map.waypoints[neighbor]
+        return waypoint.properties["connect"].split(", ") if "connect" in waypoint.properties else []
 
-    def load_exits(self, new_map, object_group):
+    def describe_exits(self, description, object_group):
         if object_group.name == "exits":
-            new_map.exits = self.create_exits(object_group)
+            for exit_of_map in object_group:
+                description.add_exit((exit_of_map.x, exit_of_map.y), exit_of_map.name)
+
+    def describe_obstacles(self, description, object_group):
+        if object_group.name == "obstacles":
+            for obstacle in object_group:
+                description.add_obstacle((obstacle.x, obstacle.y, obstacle.width, obstacle.height))
+
+    def describe_background(self, tmx, description):
+        description.background = tmx.get_layer_by_name("background").source
 
-    def create_exits(self, exits):
-        exit_dict = dict()
-        for exit_of_map in exits:
-            exit_dict[(exit_of_map.x, exit_of_map.y)] = exit_of_map.name
-        return exit_dict
+    def create_map(self, description):
+        new_map = Map(description.name)
+        self.load_items(new_map, description)
+        self.load_waypoints(new_map, description)
+        new_map.exits = dict(description.exits)
+        self.set_background(new_map, description)
+        return new_map
+
+    def get_item_name(self, item_type):
+        return item_data.get_item_name(item_type)
+
+    def load_items(self, new_map, description):
+        new_map.items = ItemContainer(self.create_items(description.items))
+        new_map.set_items_parent_container()
+
+    def create_items(self, items):  # pragma: no cover
+        items_list = []
+        for item_type, pos in items:
+            item_ui = self.create_item_object(item_type, pos)
+            items_list.append(item_ui)
+        return items_list
+
+    def create_item_object(self, item_type, pos):
+        item_ui = ui.ItemUI(self.get_item_name(item_type))
+        item_ui.rect.move_ip(pos)
+        return item_ui
 
-    def set_map_properties(self, tmx, new_map):
-        self.set_background(new_map, tmx)
+    def load_waypoints(self, new_map, description):
+        new_map.graph = WaypointGraph.from_description(description.waypoints, description.obstacles)
+        new_map.waypoints = new_map.graph.get_waypoints()
+        new_map.flow_fields = FlowFieldService(new_map.graph)
 
-    def set_background(self, new_map, tmx):
-        background_layer = tmx.get_layer_by_name("background")
-        new_map.background = BackgroundUI(background_layer)
+    def set_background(self, new_map, description):
+        new_map.background = ui.BackgroundUI(description.background)
@@ -1,22 +1,27 @@
 # -*- encoding: utf-8 -*-
-from os.path import join, abspath, split
-
 import pygame
-import sys
+
+from tekmate.resources import resources
 
 
 class MessageSystem(pygame.sprite.Sprite):
+    FONT = "RosesareFF0000.ttf"
+
     def __init__(self):
         pygame.sprite.Sprite.__init__(self)
         self.surface = None
         self.image = None
         self.rect = None
-        self.font = self.load_font("RosesareFF0000.ttf")
+        self.loaded_font = None
+
+    @property
+    def font(self):
+        if self.loaded_font is None:
+            self.loaded_font = self.load_font(self.FONT)
+        return self.loaded_font
 
     def load_font(self, font_name):
-        pth = abspath(split(__file__)[0])
-        sys.path.append(abspath(join(pth, u"..")))
-        return pygame.font.Font(join(pth, "..", "..", "assets", "global", "fonts", font_name), 20)
+        return pygame.font.Font(resources.open("global/fonts/" + font_name), 20)
 
     def set_sprite_properties(self, height, o2, width):
         self.surface = pygame.Surface((width + o2, height + o2), pygame.SRCALPHA)
@@ -0,0 +1,73 @@
+# -*- encoding: utf-8 -*-
+import logging
+from multiprocessing import Pool, cpu_count
+import time
+
+import pygame
+
+from tekmate.resources import resources
+
+logger = logging.getLogger()
+
+
+def decode_image_file(image_name):
+    start = time.time()
+    image = pygame.image.load(resources.open(image_name), image_name)
+    pixels = pygame.image.tostring(image, "RGBA")
+    return image_name, image.get_size(), pixels, time.time() - start
+
+
+class StartupLoader(object):
+    MINIMUM_IMAGES_FOR_POOL = 2
+
+    def __init__(self, image_names, surface_cache, processes=None):
+        self.image_names = sorted(set(image_names))
+        self.surface_cache = surface_cache
+        self.processes = processes or cpu_count()
+        self.pool = None
+        self.pending = None
+        self.timings = dict()
+
+    def get_images_to_decode(self):
+        return [image_name for image_name in self.image_names if not self.surface_cache.is_fresh(image_name)]
+
+    def start(self):
+        images_to_decode = self.get_images_to_decode()
+        if len(images_to_decode) >= self.MINIMUM_IMAGES_FOR_POOL:
+            self.pool = Pool(min(self.processes, len(images_to_decode)))
+            self.pending = self.pool.map_async(decode_image_file, images_to_decode)
+        else:
+            self.pending = _DecodedInProcess(images_to_decode)
+
+    def collect(self):
+        decoded_images = dict()
+        for image_name, size, pixels, decode_time in self.pending.get():
+            start = time.time()
+            decoded_images[image_name] = pygame.image.frombuffer(pixels, size, "RGBA")
+            self.timings[image_name] = (decode_time, time.time() - start)
+        self.close_pool()
+        self.report()
+        return decoded_images
+
+    def close_pool(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def report(self):
+        for image_name in self.image_names:
+            if image_name in self.timings:
+                decode_time, create_time = self.timings[image_name]
+                logger.debug("%s: decoded in %.1f ms, surface created in %.1f ms" %
+                             (image_name, decode_time * 1000, create_time * 1000))
+            else:
+                logger.debug("%s: served from surface cache" % image_name)
+
+
+class _DecodedInProcess(object):
+    def __init__(self, image_names):
+        self.image_names = image_names
+
+    def get(self):
+        return [decode_image_file(image_name) for image_name in self.image_names]
@@ -6,7 +6,12 @@ import pygame
 from taz.game import Scene, Game
 
 from tekmate.draw.messages import MessageSystem
-from tekmate.draw.ui import ContextMenuUI, PlayerUI, UI
+from tekmate.draw.spatial import SpatialGroup
+from tekmate.draw.ui import ContextMenuUI, ItemUI, PlayerUI
+from tekmate.entities import EntityWorld
+from tekmate.items import ItemContainer
+from tekmate.profiler import startup_profiler
+from tekmate.savegame import GameSnapshot, MapState, SaveStore, SaveWriter, capture_container, restore_entries
 
 import logging
 
@@ -14,54 +19,91 @@ logger = logging.getLogger()
 
 
 class WorldScene(Scene):
-    FPS_EVENT = pygame.USEREVENT + 0
+    FPS_LOG_INTERVAL = 3000
+    DISPLAY_TEXT_DURATION = 2000
+    AUTOSAVE_INTERVAL = 60000
 
-    STOP_DISPLAY_TEXT_EVENT = pygame.USEREVENT + 1
+    AUTOSAVE_SLOT = "autosave"
+    QUICKSAVE_SLOT = "quicksave"
+
+    START_MAP = "example"
 
     def __init__(self, ident):
         super(WorldScene, self).__init__(ident)
         self.display = None
 
         self.context_menu = ContextMenuUI()
-        self.player_ui = PlayerUI()
+        self.entity_world = EntityWorld()
+        self.entity_world.subscribe(self.entity_arrived)
+        self.player_ui = PlayerUI(self.entity_world)
         self.message_system = MessageSystem()
 
-        self.item_group = pygame.sprite.OrderedUpdates()
+        self.item_group = SpatialGroup()
         self.default_group = pygame.sprite.OrderedUpdates()
         self.context_group = pygame.sprite.OrderedUpdates()
         self.display_text_group = pygame.sprite.GroupSingle()
         self.background_group = pygame.sprite.GroupSingle()
-        self.animation_group = pygame.sprite.GroupSingle()
 
-        self.map_items = list()
+        self.current_map = None
+        self.map_items = ItemContainer()
+        self.item_listeners = dict()
 
         self.current_observed_item = None
         self.current_selected_item = None
+        self.hovered_item = None
 
-        self.best_path = list()
         self.callback = None
 
-        self.last_destination = (0, 0)
-
         self.is_wait_for_crouch = False
 
+        self.scheduler = None
+        self.hide_text_timer = None
+
+        self.save_store = SaveStore()
+        self.save_writer = SaveWriter(self.save_store)
+
     def initialize(self):
         self.display = self.game.render_context["display"]
-        pygame.time.set_timer(self.FPS_EVENT, 3000)
+        self.scheduler = self.player_ui.scheduler = self.game.update_context["scheduler"]
+        self.scheduler.call_every(self.FPS_LOG_INTERVAL, self.log_fps)
+        self.scheduler.call_every(self.AUTOSAVE_INTERVAL, self.autosave)
+        self.subscribe_to_events(self.game.update_context["event_dispatcher"])
 
-        self.change_map(self.game.update_context["maps"]["example"])
+        self.change_map(self.START_MAP)
         self.default_group.add(self.player_ui)
 
-    def change_map(self, map_to_load):
+    def change_map(self, name):
+        map_to_load = self.current_map = self.game.update_context["maps"][name]
+        self.item_group.empty()
         self.background_group.add(map_to_load.background)
         self.load_items(map_to_load)
         self.player_ui.waypoints = map_to_load.waypoints
+        self.player_ui.navigation = map_to_load.flow_fields
         self.find_spawn_for_player()
+        self.game.update_context["map_prefetcher"].prefetch_neighbors(map_to_load)
 
     def load_items(self, map_to_load):
+        self.stop_listening_to_items()
         self.map_items = map_to_load.items
         for item_ui in self.map_items:
             item_ui.item.parent_container = self.map_items
+            self.listen_to_item(item_ui)
+            self.update_item_visibility(item_ui)
+
+    def listen_to_item(self, item_ui):
+        listener = self.item_listeners[item_ui] = partial(self.update_item_visibility, item_ui)
+        item_ui.item.subscribe(listener)
+
+    def stop_listening_to_items(self):
+        for item_ui, listener in self.item_listeners.items():
+            item_ui.item.unsubscribe(listener)
+        self.item_listeners.clear()
+
+    def update_item_visibility(self, item_ui, item=None):
+        if item_ui.item.visible and item_ui in self.map_items:
+            self.item_group.add(item_ui)
+        else:
+            item_ui.remove(self.item_group)
 
     def find_spawn_for_player(self):
         self.player_ui.find_spawn()
@@ -70,50 +112,48 @@ class WorldScene(Scene):
         clock = self.game.update_context["clock"]
         delta = clock.tick(1000)
 
-        self.update_visible_items()
-        self.animation_group.update(delta)
-        self.stop_animation_when_player_reached_destination()
+        self.scheduler.run_due()
+        self.game.update_context["map_prefetcher"].finish_prefetched_map()
+        self.entity_world.update(delta)
 
-        for event in self.game.update_context["get_events"]():
-            self.handle_input(event)
+        self.game.update_context["event_dispatcher"].dispatch_all(self.game.update_context["get_events"]())
 
         self.default_group.update()
 
-    def update_visible_items(self):
-        for item_ui in self.map_items:
-            if item_ui.item.visible and item_ui not in self.item_group:
-                self.item_group.add(item_ui)
+    def entity_arrived(self, entity):
+        if entity == self.player_ui.entity:
+            self.player_arrived()
+
+    def player_arrived(self):
+        self.player_ui.reset_walk()
+        callback, self.callback = self.callback, None
+        if callback is not None:
+            callback()
 
-    def stop_animation_when_player_reached_destination(self):
-        if self.player_ui.rect.bottomleft == self.last_destination:
-            self.player_ui.reset_walk()
-            pygame.time.set_timer(UI.WALK_EVENT, 0)
-            self.last_destination = (0, 0)
+    def stop_player(self):
+        self.player_ui.stop_walking()
+        self.player_ui.reset_walk()
+        self.callback = None
+
+    def subscribe_to_events(self, event_dispatcher):
+        event_dispatcher.subscribe(pygame.QUIT, self.handle_close_game_event)
+        event_dispatcher.subscribe(pygame.KEYDOWN, self.handle_close_game_event, pygame.K_ESCAPE)
+        event_dispatcher.subscribe(pygame.MOUSEBUTTONDOWN, self.handle_mouse_left_event, 1)
+        event_dispatcher.subscribe(pygame.MOUSEBUTTONDOWN, self.handle_mouse_right_event, 3)
+        event_dispatcher.subscribe(pygame.MOUSEMOTION, self.handle_mouse_motion_event)
+        event_dispatcher.subscribe(pygame.KEYDOWN, self.handle_i_key_pressed_event, pygame.K_i)
+        event_dispatcher.subscribe(pygame.KEYDOWN, self.handle_quick_save_event, pygame.K_F5)
+        event_dispatcher.subscribe(pygame.KEYDOWN, self.handle_quick_load_event, pygame.K_F9)
+        event_dispatcher.set_allowed_events()
 
     def handle_input(self, event):
-        self.handle_close_game_event(event)
-        self.handle_mouse_button_pressed_event(event)
-        self.handle_i_key_pressed_event(event)
-        self.handle_ui_events(event)
-        self.handle_logging_events(event)
+        self.game.update_context["event_dispatcher"].dispatch(event)
 
     def handle_close_game_event(self, event):
-        if event.type == pygame.QUIT or self.is_escape_key_pressed(event):
-            raise Game.GameExitException
-
-    def is_escape_key_pressed(self, event):
-        return event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE
-
-    def handle_mouse_button_pressed_event(self, event):
-        self.handle_mouse_left_event(event)
-        self.handle_mouse_right_event(event)
+        raise Game.GameExitException
 
     def handle_mouse_left_event(self, event):
-        if self.is_left_mouse_pressed(event):
-            self.process_left_mouse_button_pressed(event)
-
-    def is_left_mouse_pressed(self, event):
-        return event.type == pygame.MOUSEBUTTONDOWN and event.button == 1
+        self.process_left_mouse_button_pressed(event)
 
     def process_left_mouse_button_pressed(self, event):
         self.handle_opened_context_menu(event.pos) if self.is_context_menu_visible() else self.move_player(event.pos)
@@ -145,9 +185,12 @@ class WorldScene(Scene):
     def move_player(self, pos, callback=None):
         if not self.is_bag_visible():
             direction = self.get_direction(pos)
-            self.best_path = self.find_shortest_path_to_destination(pos, direction)
-            self.callback = callback
-            self.move_to_next_waypoint()
+            best_path = self.find_shortest_path_to_destination(pos, direction)
+            if best_path:
+                self.callback = callback
+                self.player_ui.walk_along(best_path)
+            else:
+                self.stop_player()
 
     def get_direction(self, pos):
         return 1 if pos[0] > self.player_ui.rect.left else -1
@@ -155,32 +198,6 @@ class WorldScene(Scene):
     def find_shortest_path_to_destination(self, pos, direction):
         return self.player_ui.find_shortest_path_to_destination(pos, direction)
 
-    def move_to_next_waypoint(self):
-        self.trigger_next_animation() if self.is_next_waypoint_not_last_waypoint() \
-            else self.trigger_last_animation_and_execute_interaction()
-
-    def trigger_next_animation(self):
-        pos = self.best_path[0].pos
-        self.best_path.pop(0)
-        self.start_walk_animation(self.move_to_next_waypoint, pos)
-
-    def is_next_waypoint_not_last_waypoint(self):
-        return len(self.best_path) > 1
-
-    def start_walk_animation(self, callback, pos):
-        ani = self.player_ui.move(pos)
-        if callback is not None:
-            ani.callback = lambda: callback()
-        ani.start(self.player_ui.rect)
-        self.animation_group.add(ani)
-        pygame.time.set_timer(UI.WALK_EVENT, 100)
-
-    def trigger_last_animation_and_execute_interaction(self):
-        pos = self.best_path[0].pos
-        self.best_path.pop(0)
-        self.start_walk_animation(self.callback, pos)
-        self.last_destination = pos
-
     def walk_to_item_before_interacting(self, callback):
         if self.is_target_in_range():
             self.face_target(self.current_observed_item)
@@ -202,7 +219,9 @@ class WorldScene(Scene):
     def show_display_text(self, message):
         self.message_system.display_text(message, self.player_ui)
         self.message_system.add(self.display_text_group)
-        pygame.time.set_timer(self.STOP_DISPLAY_TEXT_EVENT, 2000)
+        if self.hide_text_timer is not None:
+            self.hide_text_timer.cancel()
+        self.hide_text_timer = self.scheduler.call_later(self.DISPLAY_TEXT_DURATION, self.hide_displayed_text)
 
     def look_at_item(self):
         self.show_display_text(self.current_observed_item.look_at())
@@ -238,15 +257,11 @@ class WorldScene(Scene):
         return self.player_ui.is_bag_visible()
 
     def handle_mouse_right_event(self, event):
-        if self.is_right_mouse_pressed(event):
-            self.process_right_mouse_pressed(event.pos)
-
-    def is_right_mouse_pressed(self, event):
-        return event.type == pygame.MOUSEBUTTONDOWN and event.button == 3
+        self.process_right_mouse_pressed(event.pos)
 
     def process_right_mouse_pressed(self, pos):
-        if len(self.animation_group) > 0:
-            self.animation_group.empty()
+        if self.player_ui.is_moving():
+            self.stop_player()
         clicked_in_bag_but_not_on_item = self.select_correct_context_menu_list(pos)
         self.close_context_menu() if clicked_in_bag_but_not_on_item else self.open_context_menu(pos)
 
@@ -264,23 +279,20 @@ class WorldScene(Scene):
         self.context_menu.build_context_menu(layout)
 
     def is_mouse_pos_inside_world_item(self, pos):
-        is_item_clicked = False
-        for item in self.item_group.sprites():
-            if item.rect.collidepoint(pos):
-                self.current_observed_item = item
-                is_item_clicked = True
-        return is_item_clicked
+        item = self.item_group.topmost_at(pos)
+        if item is not None:
+            self.current_observed_item = item
+        return item is not None
 
     def set_world_item_context_menu(self):
         self.set_context_menu(ContextMenuUI.CONTEXT_COMBINE_ITEM) if self.current_selected_item is not None \
             else self.set_context_menu(ContextMenuUI.CONTEXT_MENU_ITEM)
 
     def is_mouse_pos_inside_bag_item(self, pos):
-        for item in self.player_ui.bag_sprite_group.sprites()[1:]:
-            if item.rect.collidepoint(pos):
-                self.current_observed_item = item
-                return True
-        return False
+        item = self.player_ui.bag_item_group.topmost_at(pos)
+        if item is not None:
+            self.current_observed_item = item
+        return item is not None
 
     def set_bag_item_world_context_menu(self):
         self.set_context_menu(ContextMenuUI.CONTEXT_MENU_BAG_ITEM)
@@ -292,17 +304,63 @@ class WorldScene(Scene):
         self.context_menu.open(pos)
         self.context_menu.add(self.context_group)
 
-    def handle_i_key_pressed_event(self, event):
-        if self.is_i_pressed(event):
-            if not self.context_menu.alive():
-                self.handle_bag()
+    def handle_mouse_motion_event(self, event):
+        self.hovered_item = self.get_item_under_mouse(event.pos)
+
+    def get_item_under_mouse(self, pos):
+        return self.player_ui.bag_item_group.topmost_at(pos) if self.is_bag_visible() \
+            else self.item_group.topmost_at(pos)
 
-    def is_i_pressed(self, event):
-        return event.type == pygame.KEYDOWN and event.key == pygame.K_i
+    def handle_i_key_pressed_event(self, event):
+        if not self.context_menu.alive():
+            self.handle_bag()
 
     def handle_bag(self):
         self.player_ui.bag_visible = True if not self.is_bag_visible() else False
 
+    def handle_quick_save_event(self, event):
+        self.save_game(self.QUICKSAVE_SLOT)
+
+    def handle_quick_load_event(self, event):
+        self.load_game(self.QUICKSAVE_SLOT)
+
+    def autosave(self):
+        self.save_game(self.AUTOSAVE_SLOT)
+
+    def save_game(self, slot):
+        self.save_writer.save(slot, self.take_snapshot())
+
+    def load_game(self, slot):
+        snapshot = self.save_store.load(slot)
+        if snapshot is not None:
+            self.restore_snapshot(snapshot)
+
+    def take_snapshot(self):
+        maps = self.game.update_context["maps"].get_loaded_maps()
+        return GameSnapshot(self.current_map.name, self.player_ui.rect.bottomleft, self.player_ui.capture_bag(),
+                            tuple(MapState(game_map.name, capture_container(game_map.items)) for game_map in maps))
+
+    def restore_snapshot(self, snapshot):
+        self.stop_player()
+        self.stop_listening_to_items()
+        maps = self.game.update_context["maps"]
+        saved_names = set(map_state.name for map_state in snapshot.maps)
+        for game_map in maps.get_loaded_maps():
+            if game_map.name not in saved_names:
+                maps.unload(game_map.name)
+        for map_state in snapshot.maps:
+            if map_state.name in maps:
+                self.restore_map_items(maps[map_state.name], map_state.items)
+        self.player_ui.restore_bag(snapshot.bag)
+        self.current_selected_item = self.current_observed_item = self.hovered_item = None
+        self.change_map(snapshot.current_map)
+        self.player_ui.place_at(snapshot.player_pos)
+
+    def restore_map_items(self, game_map, states):
+        game_map.items = ItemContainer(restore_entries(states, game_map.items, ItemUI))
+        for entry in game_map.items:
+            getattr(entry, "item", entry).parent_container = game_map.items
+
     def render(self):
         self.display.fill((0, 0, 0))
 
@@ -314,61 +372,18 @@ class WorldScene(Scene):
         self.context_group.draw(self.display)
 
         pygame.display.flip()
+        startup_profiler.mark_first_frame()
 
     def render_bag(self):
         if self.is_bag_visible():
             self.player_ui.bag_sprite_group.draw(self.display)
 
-    def handle_ui_events(self, event):
-        self.handle_walk_event(event)
-        self.handle_crouch_event(event)
-        self.handle_crouch_stop_event(event)
-        self.handle_text_displaying_event(event)
-
-    def handle_walk_event(self, event):
-        if self.is_player_walking(event):
-            self.player_ui.animate_walk()
-
-    def is_player_walking(self, event):
-        return event.type == UI.WALK_EVENT
-
-    def handle_crouch_event(self, event):
-        if self.is_player_crouching(event):
-            self.handle_pickup_with_delay_event() if self.player_ui.is_waiting_for_crouch else \
-                self.handle_put_down_without_delay_event()
-
-    def is_player_crouching(self, event):
-        return event.type == UI.CROUCH_EVENT
-
-    def handle_pickup_with_delay_event(self):
-        self.player_ui.is_waiting_for_crouch = False
-        pygame.time.wait(1000)
-
-    def handle_put_down_without_delay_event(self):
-        self.player_ui.animate_crouch()
-
-    def handle_crouch_stop_event(self, event):
-        if event.type == UI.STOP_CROUCH_EVENT:
-            self.reset_crouching_event()
-
-    def reset_crouching_event(self):
-        self.player_ui.reset_crouch()
-        pygame.time.set_timer(UI.CROUCH_EVENT, 0)
-
-    def handle_text_displaying_event(self, event):
-        if self.is_text_displayed_long_enough(event):
-            self.hide_displayed_text()
-
-    def is_text_displayed_long_enough(self, event):
-        return event.type == self.STOP_DISPLAY_TEXT_EVENT
-
     def hide_displayed_text(self):
         self.display_text_group.empty()
-        pygame.time.set_timer(self.STOP_DISPLAY_TEXT_EVENT, 0)
+        self.hide_text_timer = None
 
-    def handle_logging_events(self, event):
-        if event.type == self.FPS_EVENT:
-            logger.debug("FPS: " + str(self.game.update_context["clock"].get_fps()))
+    def log_fps(self):
+        logger.debug("FPS: " + str(self.game.update_context["clock"].get_fps()))
 
     def resume(self):
         print("Resuming World")
@@ -0,0 +1,67 @@
+# -*- encoding: utf-8 -*-
+from itertools import count
+
+import pygame
+
+
+class SpatialGroup(pygame.sprite.OrderedUpdates):
+    CELL_SIZE = 64
+
+    def __init__(self, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = dict()
+        self.indexed_cells = dict()
+        self.depths = dict()
+        self.depth_counter = count()
+        pygame.sprite.OrderedUpdates.__init__(self)
+
+    def add_internal(self, sprite, *args):
+        pygame.sprite.OrderedUpdates.add_internal(self, sprite, *args)
+        self.depths[sprite] = next(self.depth_counter)
+        self.index(sprite)
+
+    def remove_internal(self, sprite):
+        pygame.sprite.OrderedUpdates.remove_internal(self, sprite)
+        self.unindex(sprite)
+        del self.depths[sprite]
+
+    def reindex(self, sprite):
+        self.unindex(sprite)
+        self.index(sprite)
+
+    def index(self, sprite):
+        cells = self.get_cells(sprite.rect)
+        for cell in cells:
+            self.cells.setdefault(cell, set()).add(sprite)
+        self.indexed_cells[sprite] = cells
+
+    def unindex(self, sprite):
+        for cell in self.indexed_cells.pop(sprite):
+            sprites_in_cell = self.cells[cell]
+            sprites_in_cell.discard(sprite)
+            if not sprites_in_cell:
+                del self.cells[cell]
+
+    def get_cells(self, rect):
+        left, top = rect.left // self.cell_size, rect.top // self.cell_size
+        right = max(rect.right - 1, rect.left) // self.cell_size
+        bottom = max(rect.bottom - 1, rect.top) // self.cell_size
+        return [(x, y) for x in range(left, right + 1) for y in range(top, bottom + 1)]
+
+    def get_cell(self, pos):
+        return pos[0] // self.cell_size, pos[1] // self.cell_size
+
+    def sprites_at(self, pos):
+        candidates = [sprite for sprite in self.cells.get(self.get_cell(pos), ()) if self.is_hit(sprite, pos)]
+        return sorted(candidates, key=self.depths.get, reverse=True)
+
+    @staticmethod
+    def is_hit(sprite, pos):
+        if not sprite.rect.collidepoint(pos):
+            return False
+        mask = getattr(sprite, "mask", None)
+        return mask is None or bool(mask.get_at((pos[0] - sprite.rect.x, pos[1] - sprite.rect.y)))
+
+    def topmost_at(self, pos):
+        sprites = self.sprites_at(pos)
+        return sprites[0] if sprites else None
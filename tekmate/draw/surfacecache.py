@@ -0,0 +1,136 @@
+# -*- encoding: utf-8 -*-
+import logging
+import mmap
+import os
+from os.path import join
+import struct
+
+import pygame
+
+from tekmate.mapcache import get_default_cache_directory
+from tekmate.resources import resources
+
+logger = logging.getLogger()
+
+
+class SurfaceCache(object):
+    MAGIC = b"TKSF"
+    VERSION = 1
+    HEADER = struct.Struct("<4sHII4s3BBd")
+    HEADER_SIZE = 64
+    EXTENSION = ".raw"
+
+    HAS_COLORKEY = 1
+    RLE = 2
+
+    PIXEL_FORMATS = {
+        (0xff0000, 0xff00, 0xff, 0): "BGRA"
+    }
+
+    def __init__(self, directory=None, locator=resources):
+        self.directory = directory or join(get_default_cache_directory(), "surfaces")
+        self.locator = locator
+        self.masks = dict()
+
+    def get_path(self, name, flags=0):
+        return join(self.directory, "%s.%d%s" % (name.replace("/", "_"), flags, self.EXTENSION))
+
+    @staticmethod
+    def get_flags(colorkey, rle):
+        return (SurfaceCache.HAS_COLORKEY if colorkey is not None else 0) | (SurfaceCache.RLE if rle else 0)
+
+    @staticmethod
+    def get_pixel_format():
+        display = pygame.display.get_surface()
+        return SurfaceCache.PIXEL_FORMATS.get(display.get_masks()) if display is not None else None
+
+    def load(self, name, colorkey=None, rle=False, decoded_image=None):
+        pixel_format = self.get_pixel_format()
+        source_mtime = self.locator.getmtime(name)
+        path = self.get_path(name, self.get_flags(colorkey, rle))
+        surface = self.map_cached_surface(path, pixel_format, source_mtime) if pixel_format else None
+        if surface is None:
+            surface = self.convert(name, decoded_image)
+            self.set_colorkey(surface, colorkey, rle)
+            if pixel_format:
+                self.store(path, surface, pixel_format, source_mtime, colorkey, rle)
+        return surface
+
+    def get_mask(self, name, surface):
+        try:
+            return self.masks[name]
+        except KeyError:
+            mask = self.masks[name] = pygame.mask.from_surface(surface)
+            return mask
+
+    def convert(self, name, decoded_image):
+        if decoded_image is None:
+            decoded_image = pygame.image.load(self.locator.open(name), name)
+        return decoded_image.convert()
+
+    @staticmethod
+    def set_colorkey(surface, colorkey, rle):
+        if colorkey is not None:
+            surface.set_colorkey(colorkey, pygame.RLEACCEL if rle else 0)
+
+    def is_fresh(self, name):
+        source_mtime = self.locator.getmtime(name)
+        return any(self.is_entry_fresh(self.get_path(name, flags), source_mtime)
+                   for flags in range((self.HAS_COLORKEY | self.RLE) + 1))
+
+    def is_entry_fresh(self, path, source_mtime):
+        try:
+            with open(path, "rb") as cache_file:
+                header = self.read_header(cache_file.read(self.HEADER.size))
+        except (IOError, OSError):
+            return False
+        return header is not None and header[-1] == source_mtime
+
+    def map_cached_surface(self, path, pixel_format, source_mtime):
+        try:
+            with open(path, "rb") as cache_file:
+                mapping = mmap.mmap(cache_file.fileno(), 0, access=mmap.ACCESS_COPY)
+        except (IOError, OSError, ValueError):
+            return None
+        header = self.read_header(mapping)
+        if header is None or header[4] != pixel_format.encode("ascii") or header[-1] != source_mtime:
+            mapping.close()
+            return None
+        return self.wrap(mapping, header)
+
+    def read_header(self, mapping):
+        try:
+            header = self.HEADER.unpack_from(mapping, 0)
+        except struct.error:
+            return None
+        return header if header[0] == self.MAGIC and header[1] == self.VERSION else None
+
+    def wrap(self, mapping, header):
+        _, _, width, height, pixel_format, red, green, blue, flags, _ = header
+        pixels = memoryview(mapping)[self.HEADER_SIZE:self.HEADER_SIZE + width * height * 4]
+        surface = pygame.image.frombuffer(pixels, (width, height), pixel_format.decode("ascii"))
+        surface.set_alpha(None)
+        self.set_colorkey(surface, (red, green, blue) if flags & self.HAS_COLORKEY else None, flags & self.RLE)
+        return surface
+
+    def store(self, path, surface, pixel_format, source_mtime, colorkey, rle):
+        flags = self.get_flags(colorkey, rle)
+        header = self.HEADER.pack(self.MAGIC, self.VERSION, surface.get_width(), surface.get_height(),
+                                  pixel_format.encode("ascii"), *(tuple(colorkey or (0, 0, 0)) + (flags, source_mtime)))
+        try:
+            self.write(path, header.ljust(self.HEADER_SIZE, b"\0"),
+                       pygame.image.tostring(surface, pixel_format))
+        except (IOError, OSError) as error:
+            logger.warning("Could not write surface cache %s: %s" % (path, error))
+
+    def write(self, path, header, pixels):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "wb") as cache_file:
+            cache_file.write(header)
+            cache_file.write(pixels)
+        os.rename(temporary_path, path)
+
+
+surface_cache = SurfaceCache()
@@ -1,16 +1,15 @@
 # -*- encoding: utf-8 -*-
-from abc import abstractmethod, ABCMeta
 import os
-from os.path import abspath, join
-from os.path import split
-import sys
 
 import pygame
-from pygameanimation.animation import Animation
 
+from tekmate.resources import resources
+from tekmate.draw.spatial import SpatialGroup
+from tekmate.draw.surfacecache import surface_cache
 from tekmate.game import Player
-from tekmate.items import Door, Letter, Paperclip, Key, LetterUnderDoor
-from tekmate.pathfinding import AStar
+from tekmate.combinations import combination_table
+from tekmate.items import Item, ItemContainer, item_data
+from tekmate.savegame import capture_item, restore_entries
 
 
 class UI(object):
@@ -19,25 +18,31 @@ class UI(object):
 
     COLOR_KEY = (0, 128, 128)
 
-    WALK_EVENT = pygame.USEREVENT+2
-    CROUCH_EVENT = pygame.USEREVENT+3
-    CROUCH_DELAY_EVENT = pygame.USEREVENT+4
-
-    STOP_CROUCH_EVENT = pygame.USEREVENT+5
+    decoded_images = dict()
 
     @staticmethod
-    def load_image(folder, name_of_file):
+    def load_image(folder, name_of_file, colorkey=None, rle=False):
         try:
-            return UI.try_loading_image(folder, name_of_file)
+            return UI.try_loading_image(folder, name_of_file, colorkey, rle)
         except:
             raise UI.ImageNotFound
 
     @staticmethod
-    def try_loading_image(folder, name_of_file):
-        pth = abspath(split(__file__)[0])
-        sys.path.append(abspath(join(pth, u"..")))
-        fullname = os.path.join(pth, "..", "..", "assets", folder, name_of_file+".png")
-        return pygame.image.load(fullname).convert()
+    def try_loading_image(folder, name_of_file, colorkey=None, rle=False):
+        image_name = UI.get_image_name(folder, name_of_file)
+        return surface_cache.load(image_name, colorkey, rle, UI.decoded_images.pop(image_name, None))
+
+    @staticmethod
+    def load_mask(folder, name_of_file, image):
+        return surface_cache.get_mask(UI.get_image_name(folder, name_of_file), image)
+
+    @staticmethod
+    def get_image_name(folder, name_of_file):
+        return "%s/%s.png" % (folder, name_of_file)
+
+    @staticmethod
+    def decode_image(image_name):
+        return pygame.image.load(resources.open(image_name), image_name)
 
     @staticmethod
     def is_new_pos_hiding_current_object_at_right_side(pos, width):
@@ -68,7 +73,13 @@ class PlayerUI(pygame.sprite.Sprite):
     WALK = (1, 0)
     CROUCH = (0, 1)
 
-    def __init__(self):
+    WALK_SPEED = 0.3
+
+    CROUCH_FRAME_INTERVAL = 100
+    CROUCH_DURATION = 400
+    CROUCH_DELAY = 1000
+
+    def __init__(self, entity_world):
         pygame.sprite.Sprite.__init__(self)
         self.direction = 1
         self.asset = UI.load_image("global", "player")
@@ -76,6 +87,7 @@ class PlayerUI(pygame.sprite.Sprite):
         self.set_image(PlayerUI.IDLE)
         self.rect = self.image.get_rect()
         self.bag_sprite_group = pygame.sprite.OrderedUpdates()
+        self.bag_item_group = SpatialGroup()
 
         self.bag_background = BagBackground()
         self.bag_sprite_group.add(self.bag_background)
@@ -84,14 +96,21 @@ class PlayerUI(pygame.sprite.Sprite):
 
         self.bag_visible = False
         self.rect.move_ip(self.player.position)
+        self.entity_world = entity_world
+        self.entity = entity_world.create_entity(self.rect.bottomleft, PlayerUI.WALK_SPEED)
 
         self.waypoints = None
+        self.navigation = None
 
         self.current_image_index = 0
         self.is_walking = False
         self.is_crouching = False
         self.is_waiting_for_crouch = False
 
+        self.scheduler = None
+        self.crouch_timer = None
+        self.crouch_end = None
+
     def set_image(self, action):
         surface_size = (PlayerUI.PLAYER_SUBSURFACE_WIDTH, PlayerUI.PLAYER_SUBSURFACE_HEIGHT)
         image = self.asset.subsurface(pygame.Rect(self.get_image_tile(action), surface_size))
@@ -111,11 +130,21 @@ class PlayerUI(pygame.sprite.Sprite):
     def is_direction_left(self):
         return self.direction == -1
 
-    def move(self, dest_pos):
-        dest_x = dest_pos[0] - self.rect.width + self.rect.width
-        dest_y = dest_pos[1] - self.rect.height
-        ani = Animation(x=dest_x, y=dest_y, duration=750, round_values=True, transition='in_out_sine')
-        return ani
+    def walk_along(self, path):
+        self.is_walking = True
+        self.entity_world.set_path(self.entity, path)
+
+    def stop_walking(self):
+        self.entity_world.stop(self.entity)
+
+    def is_moving(self):
+        return self.entity_world.is_moving(self.entity)
+
+    def mirror_entity(self):
+        self.rect.bottomleft = self.entity_world.get_position(self.entity)
+        if self.is_walking:
+            self.direction = int(self.entity_world.facing[self.entity])
+            self.current_image_index = int(self.entity_world.animation_frames[self.entity])
 
     def add_item(self, item_ui, map_items):
         if self.player.add_item(item_ui.item):
@@ -127,9 +156,8 @@ class PlayerUI(pygame.sprite.Sprite):
         return item_ui.item.get_add_message()
 
     def trigger_item_pick_up_animation(self, item_ui):
-        if item_ui.get_name() == "LetterUnderDoor":
-            pygame.time.set_timer(UI.CROUCH_EVENT, 100)
-            pygame.time.set_timer(UI.STOP_CROUCH_EVENT, 400)
+        if item_ui.is_pick_up_animation_triggered:
+            self.start_crouching()
 
     def item_has_to_be_split(self, item_ui):
         return item_ui.item.is_split_needed
@@ -143,17 +171,19 @@ class PlayerUI(pygame.sprite.Sprite):
         x = 100
         y = 50
         for item_ui in new_items:
-            self.player.add_item(item_ui.item)
-            self.bag_sprite_group.add(item_ui)
+            self.player.add_item_to_bag(item_ui.item)
             item_ui.rect.topleft = (self.bag_background.rect.x + x, self.bag_background.rect.y + y)
+            self.bag_sprite_group.add(item_ui)
+            self.bag_item_group.add(item_ui)
             x += 100
 
     def hide_item_from_world_when_in_bag(self, item_ui):
         item_ui.kill()
 
     def add_item_to_ui_bag(self, item_ui):
-        self.bag_sprite_group.add(item_ui)
         item_ui.rect.topleft = (self.bag_background.rect.x + 100, self.bag_background.rect.y + 50)
+        self.bag_sprite_group.add(item_ui)
+        self.bag_item_group.add(item_ui)
 
     def split_up_item(self, item_ui):
         return item_ui.split()
@@ -162,9 +192,10 @@ class PlayerUI(pygame.sprite.Sprite):
         return self.bag_visible
 
     def combine_items(self, item_selected, item_observed):
-        is_combination_possible, reason = item_selected.item.is_combination_possible(item_observed.item)
+        rule = combination_table.get_rule(item_selected.get_name(), item_observed.get_name())
+        is_combination_possible, reason = rule.check(item_selected.item, item_observed.item)
         if is_combination_possible:
-            self.player.trigger_item_combination(item_selected.item, item_observed.item)
+            rule.apply(item_selected.item, item_observed.item)
             item_selected.kill()
 
             if item_selected.is_animation_triggered:
@@ -172,41 +203,33 @@ class PlayerUI(pygame.sprite.Sprite):
         return reason
 
     def trigger_item_animation(self, item):
-        if item.get_name() == "Letter":
-            pygame.time.set_timer(UI.CROUCH_EVENT, 100)
-            pygame.time.set_timer(UI.STOP_CROUCH_EVENT, 400)
+        self.start_crouching()
+
+    def start_crouching(self):
+        self.cancel_crouch_timers()
+        self.crouch_timer = self.scheduler.call_every(PlayerUI.CROUCH_FRAME_INTERVAL, self.continue_crouching)
+        self.crouch_end = self.scheduler.call_later(PlayerUI.CROUCH_DURATION, self.reset_crouch)
+
+    def continue_crouching(self):
+        if self.is_waiting_for_crouch:
+            self.is_waiting_for_crouch = False
+            self.cancel_crouch_timers()
+            self.crouch_end = self.scheduler.call_later(PlayerUI.CROUCH_DELAY, self.start_crouching)
+        else:
+            self.animate_crouch()
+
+    def cancel_crouch_timers(self):
+        for timer in (self.crouch_timer, self.crouch_end):
+            if timer is not None:
+                timer.cancel()
+        self.crouch_timer = self.crouch_end = None
 
     def get_position(self):
         return self.rect
 
     def find_shortest_path_to_destination(self, pos, direction):
         self.direction = direction
-        start_node = self.get_start_node()
-        end_node = self.get_closest_node_to_pos(pos)
-
-        a_star = AStar(self.waypoints, start_node, end_node)
-        best_path = a_star.find_shortest_path()
-        return best_path
-
-    def get_start_node(self):
-        start_node = None
-        for waypoint in self.waypoints.values():
-            if self.rect.bottomleft == waypoint.pos:
-                start_node = waypoint
-            else:
-                # TODO: THIS NEEDS TO DIJKSTRA TO NOT WALK BACKWARDS
-                start_node = self.get_closest_node_to_pos(self.rect.bottomleft)
-        return start_node
-
-    def get_closest_node_to_pos(self, pos):
-        smallest_path = 999999
-        smallest_node = None
-        for waypoint in self.waypoints.values():
-            euclid = AStar.calculate_euclidean_distance(waypoint.pos, pos)
-            if euclid < smallest_path:
-                smallest_path = euclid
-                smallest_node = waypoint
-        return smallest_node
+        return self.navigation.find_route(self.rect.bottomleft, pos)
 
     def find_spawn(self):
         for waypoint in self.waypoints.values():
@@ -214,13 +237,28 @@ class PlayerUI(pygame.sprite.Sprite):
                 self.set_player_start(waypoint)
 
     def set_player_start(self, waypoint):
-        self.rect.bottomleft = waypoint.pos
-
-    def animate_walk(self):
-        self.is_walking = True
-        self.current_image_index += 1
-        if self.current_image_index >= 6:
-            self.current_image_index = 0
+        self.place_at(waypoint.pos)
+
+    def place_at(self, pos):
+        self.entity_world.stop(self.entity)
+        self.entity_world.set_position(self.entity, pos)
+        self.rect.bottomleft = pos
+
+    def capture_bag(self):
+        bag_item_uis = dict((id(item_ui.item), item_ui) for item_ui in self.bag_item_group)
+        return tuple(capture_item(bag_item_uis.get(id(item), item)) for item in self.player.bag)
+
+    def restore_bag(self, states):
+        old_item_uis = self.bag_item_group.sprites()
+        self.bag_item_group.empty()
+        self.bag_sprite_group.remove(*old_item_uis)
+        self.player.bag = ItemContainer()
+        for entry in restore_entries(states, old_item_uis, ItemUI):
+            item = getattr(entry, "item", entry)
+            self.player.add_item_to_bag(item)
+            if entry is not item:
+                self.bag_sprite_group.add(entry)
+                self.bag_item_group.add(entry)
 
     def animate_crouch(self):
         self.is_crouching = True
@@ -229,6 +267,7 @@ class PlayerUI(pygame.sprite.Sprite):
             self.current_image_index = 0
 
     def update(self):
+        self.mirror_entity()
         new_image = PlayerUI.IDLE
         if self.is_walking:
             new_image = (PlayerUI.WALK[0]+self.current_image_index, PlayerUI.WALK[1])
@@ -241,6 +280,7 @@ class PlayerUI(pygame.sprite.Sprite):
         self.set_image(PlayerUI.IDLE)
 
     def reset_crouch(self):
+        self.cancel_crouch_timers()
         self.is_crouching = False
         self.set_image(PlayerUI.IDLE)
 
@@ -265,17 +305,22 @@ class ContextMenuUI(pygame.sprite.Sprite):
     MENU_ITEM_HEIGHT = 30
     MENU_ITEM_WIDTH = 100
 
+    shared_font = None
+
     def __init__(self):
         pygame.sprite.Sprite.__init__(self)
-        pygame.font.init()
         self.surface = None
-        self.current_layout = None
-        self.font = pygame.font.SysFont("arial", 25)
-
-        self.build_context_menu(ContextMenuUI.CONTEXT_MENU_DEFAULT)
+        self.image = None
+        self.current_layout = ContextMenuUI.CONTEXT_MENU_DEFAULT
+        self.rect = pygame.Rect(0, 0, ContextMenuUI.MENU_ITEM_WIDTH,
+                                ContextMenuUI.MENU_ITEM_HEIGHT * len(self.current_layout))
 
-        self.image = self.surface
-        self.rect = self.image.get_rect()
+    @property
+    def font(self):
+        if ContextMenuUI.shared_font is None:
+            pygame.font.init()
+            ContextMenuUI.shared_font = pygame.font.SysFont("arial", 25)
+        return ContextMenuUI.shared_font
 
     # noinspection PyArgumentList
     def build_context_menu(self, layout):
@@ -321,33 +366,29 @@ class ContextMenuUI(pygame.sprite.Sprite):
 class BagBackground(pygame.sprite.Sprite):
     def __init__(self):
         pygame.sprite.Sprite.__init__(self)
-        self.image = UI.load_image("global", "bag").convert()
+        self.image = UI.load_image("global", "bag", UI.COLOR_KEY, rle=True)
         self.rect = self.image.get_rect()
-        self.image.set_colorkey(UI.COLOR_KEY)
         self.rect.center = (
             pygame.display.get_surface().get_width() // 2, pygame.display.get_surface().get_height() // 2)
 
 
 class ItemUI(pygame.sprite.Sprite):
-    __metaclass__ = ABCMeta
-
-    def __init__(self):
+    def __init__(self, name):
         pygame.sprite.Sprite.__init__(self)
         self.image = None
+        self.image_name = None
         self.rect = None
-        self.item = None
-        self.is_animation_triggered = False
-        self.setup()
-
-    @abstractmethod
-    def setup(self):
-        pass
+        self.mask = None
+        self.item = Item(ItemContainer(), name)
+        self.definition = item_data.get(name)
+        self.is_animation_triggered = self.definition.get("crouch_on_combine", False)
+        self.is_pick_up_animation_triggered = self.definition.get("crouch_on_pick_up", False)
+        self.load_image(self.definition["image"])
 
     def split(self):
-        pass
-
-    def post_animation_behavior(self):
-        pass
+        if "split_image" in self.definition:
+            self.load_image(self.definition["split_image"])
+        return [self if name == self.get_name() else ItemUI(name) for name in self.definition["split_into"]]
 
     def look_at(self):
         return self.item.get_look_at_message()
@@ -371,61 +412,37 @@ class ItemUI(pygame.sprite.Sprite):
         return self.item.name
 
     def load_image(self, name):
-        self.image = UI.load_image("items", name)
-        self.image.set_colorkey(UI.COLOR_KEY)
+        self.image_name = name
+        self.image = UI.load_image("items", name, UI.COLOR_KEY, rle=True)
+        self.mask = UI.load_mask("items", name, self.image)
         self.rect = self.image.get_rect()
 
+    def release_image(self):
+        self.image = None
 
-class NoteUI(ItemUI):
-    def setup(self):
-        self.load_image("note")
-
-
-class DoorUI(ItemUI):
-    def setup(self):
-        self.load_image("door")
-        self.item = Door([])
-
-
-class LetterUI(ItemUI):
-    def setup(self):
-        self.load_image("letter")
-        self.item = Letter([])
-        self.is_animation_triggered = True
-
-    def change_to_letter_without_paperclip(self):
-        self.load_image("letter_no_paperclip")
-
-    def split(self):
-        self.change_to_letter_without_paperclip()
-        return PaperclipUI(), self
-
-
-class PaperclipUI(ItemUI):
-    def setup(self):
-        self.load_image("paperclip")
-        self.item = Paperclip([])
-        self.is_animation_triggered = True
-
-
-class KeyUI(ItemUI):
-    def setup(self):
-        self.load_image("key")
-        self.item = Key([])
-
-
-class LetterUnderDoorUI(ItemUI):
-    def setup(self):
-        self.load_image("letter_under_door")
-        self.item = LetterUnderDoor([])
-
-    def split(self):
-        return [KeyUI()]
+    def restore_image(self):
+        if self.image is None:
+            topleft = self.rect.topleft
+            self.load_image(self.image_name)
+            self.rect.topleft = topleft
 
 
 class BackgroundUI(pygame.sprite.Sprite):
-    def __init__(self, background):
+    def __init__(self, source):
         pygame.sprite.Sprite.__init__(self)
-        path = os.path.split(background.source)
-        self.image = UI.load_image(path[0][3:], path[1][:-4])
+        self.source = source
+        self.image = None
+        self.restore_image()
         self.rect = self.image.get_rect()
+
+    def release_image(self):
+        self.image = None
+
+    def restore_image(self):
+        if self.image is None:
+            self.image = UI.load_image(*self.get_image_location(self.source))
+
+    @staticmethod
+    def get_image_location(source):
+        path = os.path.split(source)
+        return path[0][3:], path[1][:-4]
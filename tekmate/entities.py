@@ -0,0 +1,187 @@
+# -*- encoding: utf-8 -*-
+from tekmate.profiler import lazy_import
+
+numpy = lazy_import("numpy")
+
+
+class EntityWorld(object):
+    class NoSuchEntity(Exception):
+        pass
+
+    INITIAL_CAPACITY = 64
+    INITIAL_PATH_CAPACITY = 256
+
+    def __init__(self, capacity=INITIAL_CAPACITY, path_capacity=INITIAL_PATH_CAPACITY):
+        self.capacity = 0
+        self.alive = numpy.zeros(0, dtype=bool)
+        self.positions = numpy.zeros((0, 2))
+        self.velocities = numpy.zeros((0, 2))
+        self.speeds = numpy.zeros(0)
+        self.facing = numpy.zeros(0, dtype=numpy.int8)
+        self.animation_frames = numpy.zeros(0, dtype=numpy.int16)
+        self.animation_times = numpy.zeros(0)
+        self.moving = numpy.zeros(0, dtype=bool)
+        self.path_cursors = numpy.zeros(0, dtype=numpy.intp)
+        self.path_ends = numpy.zeros(0, dtype=numpy.intp)
+        self.path_points = numpy.zeros((path_capacity, 2))
+        self.path_size = 0
+        self.free = list()
+        self.arrived = list()
+        self.listeners = list()
+        self.systems = [MovementSystem(), AnimationSystem()]
+        self.grow(capacity)
+
+    def grow(self, capacity):
+        def resized(values, fill=0):
+            grown = numpy.full((capacity,) + values.shape[1:], fill, dtype=values.dtype)
+            grown[:len(values)] = values
+            return grown
+
+        self.alive = resized(self.alive)
+        self.positions = resized(self.positions)
+        self.velocities = resized(self.velocities)
+        self.speeds = resized(self.speeds)
+        self.facing = resized(self.facing, 1)
+        self.animation_frames = resized(self.animation_frames)
+        self.animation_times = resized(self.animation_times)
+        self.moving = resized(self.moving)
+        self.path_cursors = resized(self.path_cursors)
+        self.path_ends = resized(self.path_ends)
+        self.free.extend(range(capacity - 1, self.capacity - 1, -1))
+        self.capacity = capacity
+
+    def create_entity(self, position, speed):
+        if not self.free:
+            self.grow(self.capacity * 2)
+        entity = self.free.pop()
+        self.alive[entity] = True
+        self.positions[entity] = position
+        self.velocities[entity] = 0
+        self.speeds[entity] = speed
+        self.facing[entity] = 1
+        self.animation_frames[entity] = 0
+        self.animation_times[entity] = 0
+        self.moving[entity] = False
+        return entity
+
+    def destroy_entity(self, entity):
+        self.check_entity(entity)
+        self.alive[entity] = False
+        self.moving[entity] = False
+        self.free.append(entity)
+
+    def check_entity(self, entity):
+        if not 0 <= entity < self.capacity or not self.alive[entity]:
+            raise EntityWorld.NoSuchEntity(entity)
+
+    def __len__(self):
+        return int(numpy.count_nonzero(self.alive))
+
+    def set_position(self, entity, position):
+        self.check_entity(entity)
+        self.positions[entity] = position
+
+    def get_position(self, entity):
+        x, y = self.positions[entity]
+        return int(round(x)), int(round(y))
+
+    def is_moving(self, entity):
+        return bool(self.moving[entity])
+
+    def set_path(self, entity, positions):
+        self.check_entity(entity)
+        count = len(positions)
+        if count == 0:
+            self.stop(entity)
+            return
+        if self.path_size + count > len(self.path_points):
+            self.compact_paths(count)
+        start = self.path_size
+        self.path_points[start:start + count] = positions
+        self.path_size += count
+        self.path_cursors[entity] = start
+        self.path_ends[entity] = start + count
+        self.moving[entity] = True
+
+    def compact_paths(self, reserve):
+        moving = numpy.flatnonzero(self.moving)
+        lengths = self.path_ends[moving] - self.path_cursors[moving]
+        needed = int(lengths.sum()) + reserve
+        capacity = len(self.path_points)
+        while capacity < needed * 2:
+            capacity *= 2
+        points = numpy.zeros((capacity, 2))
+        size = 0
+        for entity, length in zip(moving, lengths):
+            points[size:size + length] = self.path_points[self.path_cursors[entity]:self.path_ends[entity]]
+            self.path_cursors[entity] = size
+            self.path_ends[entity] = size + length
+            size += length
+        self.path_points = points
+        self.path_size = size
+
+    def stop(self, entity):
+        self.moving[entity] = False
+        self.velocities[entity] = 0
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        self.listeners.remove(listener)
+
+    def update(self, delta):
+        for system in self.systems:
+            system.update(self, delta)
+        arrived, self.arrived = self.arrived, list()
+        for entity in arrived:
+            for listener in self.listeners:
+                listener(entity)
+
+
+class MovementSystem(object):
+    def update(self, world, delta):
+        remaining = numpy.where(world.moving, world.speeds * delta, 0.0)
+        active = numpy.flatnonzero(remaining > 0)
+        while active.size:
+            targets = world.path_points[world.path_cursors[active]]
+            offsets = targets - world.positions[active]
+            distances = numpy.hypot(offsets[:, 0], offsets[:, 1])
+            steps = remaining[active]
+            self.face(world, active, offsets)
+
+            walking = distances > steps
+            walking_entities = active[walking]
+            directions = offsets[walking] / distances[walking, None]
+            world.positions[walking_entities] += directions * steps[walking, None]
+            world.velocities[walking_entities] = directions * world.speeds[walking_entities, None]
+            remaining[walking_entities] = 0
+
+            reached = active[~walking]
+            world.positions[reached] = targets[~walking]
+            remaining[reached] = steps[~walking] - distances[~walking]
+            world.path_cursors[reached] += 1
+            finished = reached[world.path_cursors[reached] >= world.path_ends[reached]]
+            world.moving[finished] = False
+            world.velocities[finished] = 0
+            remaining[finished] = 0
+            world.arrived.extend(finished.tolist())
+            active = reached[remaining[reached] > 0]
+
+    @staticmethod
+    def face(world, entities, offsets):
+        horizontal = offsets[:, 0] != 0
+        world.facing[entities[horizontal]] = numpy.sign(offsets[horizontal, 0])
+
+
+class AnimationSystem(object):
+    WALK_FRAMES = 6
+    FRAME_INTERVAL = 100
+
+    def update(self, world, delta):
+        world.animation_times[world.moving] += delta
+        advanced = world.animation_times // self.FRAME_INTERVAL
+        world.animation_frames[:] = (world.animation_frames + advanced) % self.WALK_FRAMES
+        world.animation_times %= self.FRAME_INTERVAL
+        world.animation_frames[~world.moving] = 0
+        world.animation_times[~world.moving] = 0
@@ -0,0 +1,60 @@
+# -*- encoding: utf-8 -*-
+import pygame
+
+
+class EventDispatcher(object):
+    SUB_KEYS = {
+        pygame.MOUSEBUTTONDOWN: "button",
+        pygame.MOUSEBUTTONUP: "button",
+        pygame.KEYDOWN: "key",
+        pygame.KEYUP: "key"
+    }
+
+    COALESCED_EVENTS = (pygame.MOUSEMOTION,)
+
+    def __init__(self):
+        self.handlers = dict()
+        self.is_blocking = False
+
+    def subscribe(self, event_type, handler, sub_key=None):
+        self.handlers.setdefault((event_type, sub_key), list()).append(handler)
+        if self.is_blocking:
+            pygame.event.set_allowed(event_type)
+
+    def unsubscribe(self, event_type, handler, sub_key=None):
+        handlers = self.handlers[(event_type, sub_key)]
+        handlers.remove(handler)
+        if not handlers:
+            del self.handlers[(event_type, sub_key)]
+
+    def get_event_types(self):
+        return sorted(set(event_type for event_type, _ in self.handlers))
+
+    def set_allowed_events(self):
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed(self.get_event_types())
+        self.is_blocking = True
+
+    def dispatch_all(self, events):
+        for event in self.coalesce(events):
+            self.dispatch(event)
+
+    def coalesce(self, events):
+        previous = None
+        for event in events:
+            if previous is not None and not (event.type == previous.type and event.type in self.COALESCED_EVENTS):
+                yield previous
+            previous = event
+        if previous is not None:
+            yield previous
+
+    def dispatch(self, event):
+        for handler in self.get_handlers(event):
+            handler(event)
+
+    def get_handlers(self, event):
+        handlers = self.handlers.get((event.type, None), [])
+        sub_key = self.SUB_KEYS.get(event.type)
+        if sub_key is not None:
+            handlers = handlers + self.handlers.get((event.type, getattr(event, sub_key)), [])
+        return handlers
@@ -1,4 +1,10 @@
 # -*- encoding: utf-8 -*-
+from collections import OrderedDict
+
+from tekmate.items import ItemContainer
+from tekmate.profiler import lazy_import
+
+numpy = lazy_import("numpy")
 
 
 class Player(object):
@@ -11,7 +17,7 @@ class Player(object):
 
     def __init__(self):
         self.position = (0, 400)
-        self.bag = []
+        self.bag = ItemContainer()
 
     def add_item(self, item):
         return False if not item.obtainable else self.add_item_to_bag(item)
@@ -33,9 +39,11 @@ class Player(object):
 class Map(object):
     def __init__(self, name):
         self.name = name
-        self.items = list()
+        self.items = ItemContainer()
         self.exits = dict()
+        self.graph = None
         self.waypoints = dict()
+        self.flow_fields = None
         self.background = None
 
     def set_items_parent_container(self):
@@ -43,11 +51,100 @@ class Map(object):
             item_ui.parent_container = self.items
 
 
+class WaypointGraph(object):
+    def __init__(self, names, positions, spawns, indptr, indices, obstacles=()):
+        self.names = list(names)
+        self.ids = dict((name, node) for node, name in enumerate(self.names))
+        self.positions = numpy.asarray(positions, dtype=float).reshape(-1, 2)
+        self.spawns = numpy.asarray(spawns, dtype=bool)
+        self.indptr = numpy.asarray(indptr, dtype=numpy.intp)
+        self.indices = numpy.asarray(indices, dtype=numpy.intp)
+        self.sources = numpy.repeat(numpy.arange(len(self.names), dtype=numpy.intp), numpy.diff(self.indptr))
+        offsets = self.positions[self.indices] - self.positions[self.sources]
+        self.lengths = numpy.hypot(offsets[:, 0], offsets[:, 1])
+        self.waypoints = [Waypoint(self, node) for node in range(len(self.names))]
+        self.visibility = self.compute_visibility(numpy.asarray(obstacles, dtype=float).reshape(-1, 4))
+
+    @staticmethod
+    def from_description(waypoints, obstacles=()):
+        ids = dict((name, node) for node, (name, _, _, _) in enumerate(waypoints))
+        indptr = [0]
+        indices = list()
+        for _, _, _, neighbors in waypoints:
+            indices.extend(ids[neighbor] for neighbor in neighbors)
+            indptr.append(len(indices))
+        return WaypointGraph([name for name, _, _, _ in waypoints], [pos for _, pos, _, _ in waypoints],
+                             [is_spawn for _, _, is_spawn, _ in waypoints], indptr, indices, obstacles)
+
+    def compute_visibility(self, obstacles):
+        count = len(self.names)
+        if not len(obstacles):
+            return self.compute_edge_visibility(count)
+        firsts, seconds = numpy.triu_indices(count, 1)
+        blocked = self.is_blocked(self.positions[firsts], self.positions[seconds], obstacles)
+        visible = numpy.ones((count, count), dtype=bool)
+        visible[firsts[blocked], seconds[blocked]] = False
+        visible[seconds[blocked], firsts[blocked]] = False
+        return numpy.packbits(visible, axis=1)
+
+    def compute_edge_visibility(self, count):
+        visible = numpy.identity(count, dtype=bool)
+        visible[self.sources, self.indices] = True
+        visible[self.indices, self.sources] = True
+        return numpy.packbits(visible, axis=1)
+
+    @staticmethod
+    def is_blocked(starts, ends, obstacles):
+        directions = (ends - starts)[:, None, :]
+        starts = starts[:, None, :]
+        lows, highs = obstacles[None, :, :2], obstacles[None, :, :2] + obstacles[None, :, 2:]
+        parallel = directions == 0
+        inside = (lows <= starts) & (starts <= highs)
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            near, far = (lows - starts) / directions, (highs - starts) / directions
+        entries = numpy.where(parallel, numpy.where(inside, -numpy.inf, numpy.inf), numpy.minimum(near, far))
+        exits = numpy.where(parallel, numpy.where(inside, numpy.inf, -numpy.inf), numpy.maximum(near, far))
+        enter = numpy.maximum(entries.max(axis=2), 0.0)
+        leave = numpy.minimum(exits.min(axis=2), 1.0)
+        return (enter < leave).any(axis=1)
+
+    def is_visible(self, first, second):
+        return bool(self.visibility[first, second >> 3] & (0x80 >> (second & 7)))
+
+    def __len__(self):
+        return len(self.names)
+
+    def get_neighbors(self, node):
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+    def get_edge_lengths(self, node):
+        return self.lengths[self.indptr[node]:self.indptr[node + 1]]
+
+    def get_waypoints(self):
+        return OrderedDict((waypoint.name, waypoint) for waypoint in self.waypoints)
+
+
 class Waypoint(object):
-    def __init__(self, name):
-        self.neighbors = dict()
-        self.name = name
-        self.pos = None
-        self.is_spawn = False
-        self.height = 32
-        self.width = 32
+    __slots__ = ("graph", "id")
+
+    def __init__(self, graph, node):
+        self.graph = graph
+        self.id = node
+
+    @property
+    def name(self):
+        return self.graph.names[self.id]
+
+    @property
+    def pos(self):
+        x, y = self.graph.positions[self.id].tolist()
+        return x, y
+
+    @property
+    def is_spawn(self):
+        return bool(self.graph.spawns[self.id])
+
+    @property
+    def neighbors(self):
+        return OrderedDict((self.graph.names[node], self.graph.waypoints[node])
+                           for node in self.graph.get_neighbors(self.id))
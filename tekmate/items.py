@@ -1,93 +1,260 @@
 # -*- encoding: utf-8 -*-
-from functools import partial
-from json import load
-import os
-from os.path import join, abspath, split
-import sys
+import codecs
+from collections import OrderedDict
+from json import loads
 
+from tekmate.combinations import WRONG_COMBINATION, combination_table
+from tekmate.resources import resources
 
-def load_item_data(name):
-    pth = abspath(split(__file__)[0])
-    sys.path.append(abspath(join(pth, u"..")))
-    items_path = os.path.join(pth, "..", "assets", "global", "item_data.json")
-    with open(items_path) as item_file:
-        items_data = load(item_file)
-    return next(items_data[item] for item in items_data if item == name)
+
+class ItemDataRepository(object):
+    class NoSuchItem(Exception):
+        pass
+
+    class InvalidItemData(Exception):
+        pass
+
+    def __init__(self, source, name):
+        self.source = source
+        self.name = name
+        self.mtime = None
+        self.items = dict()
+        self.tmx_types = dict()
+        self.item_types = dict()
+
+    def get(self, name):
+        self.reload_if_modified()
+        try:
+            return self.items[name]
+        except KeyError:
+            raise ItemDataRepository.NoSuchItem(name)
+
+    def find(self, name):
+        self.reload_if_modified()
+        return self.items.get(name, {})
+
+    def get_type(self, name):
+        self.reload_if_modified()
+        try:
+            return self.item_types[name]
+        except KeyError:
+            item_type = self.item_types[name] = ItemType(name, self.items.get(name, {}))
+            return item_type
+
+    def get_message(self, name, key):
+        return self.get(name)[key]
+
+    def get_item_name(self, tmx_type):
+        self.reload_if_modified()
+        try:
+            return self.tmx_types[tmx_type]
+        except KeyError:
+            raise ItemDataRepository.NoSuchItem(tmx_type)
+
+    def reload_if_modified(self):
+        mtime = self.source.getmtime(self.name)
+        if mtime != self.mtime:
+            self.items = self.load()
+            self.tmx_types = dict((attributes["tmx"], name) for name, attributes in self.items.items()
+                                  if "tmx" in attributes)
+            self.item_types = dict()
+            self.mtime = mtime
+
+    def load(self):
+        items_data = loads(codecs.decode(self.source.read(self.name), "utf-8"))
+        self.validate(items_data)
+        return items_data
+
+    @staticmethod
+    def validate(items_data):
+        if not isinstance(items_data, dict):
+            raise ItemDataRepository.InvalidItemData("item data must be an object of items")
+        for name, attributes in items_data.items():
+            if not isinstance(attributes, dict):
+                raise ItemDataRepository.InvalidItemData("attributes of %s must be an object" % name)
+
+
+class ItemType(object):
+    __slots__ = ("name", "usable", "obtainable", "visible", "is_split_needed", "flags", "messages")
+
+    MESSAGES = {
+        "look_at": "look_at_message",
+        "inspect": "inspect_message",
+        "use": "use_message",
+        "use_not_usable": "use_not_usable_message",
+        "add": "add_message",
+        "add_not_obtainable": "add_not_obtainable_message"
+    }
+
+    DEFAULT_MESSAGES = {
+        "look_at_message": "LOOK_AT",
+        "inspect_message": "INSPECT",
+        "use_message": "USE",
+        "use_not_usable_message": "NOT_USABLE",
+        "add_message": "ADD",
+        "add_not_obtainable_message": "NOT OBTAINABLE"
+    }
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.usable = attributes.get("usable", False)
+        self.obtainable = attributes.get("obtainable", False)
+        self.visible = attributes.get("visible", True)
+        self.is_split_needed = attributes.get("split_needed", False)
+        self.flags = attributes.get("flags", {})
+        self.messages = dict(ItemType.DEFAULT_MESSAGES)
+        self.messages.update((message, attributes[key]) for key, message in ItemType.MESSAGES.items()
+                             if key in attributes)
+
+
+item_data = ItemDataRepository(resources, "global/item_data.json")
+
+
+class ItemContainer(object):
+    class NoSuchItem(Exception):
+        pass
+
+    ADDED = "added"
+    REMOVED = "removed"
+
+    def __init__(self, entries=()):
+        self.entries = list()
+        self.positions = dict()
+        self.names = dict()
+        self.listeners = list()
+        for entry in entries:
+            self.append(entry)
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        self.listeners.remove(listener)
+
+    def notify(self, change, entry):
+        for listener in self.listeners:
+            listener(change, entry)
+
+    def append(self, entry):
+        entry_id = id(entry)
+        if entry_id not in self.positions:
+            self.positions[entry_id] = len(self.entries)
+            self.entries.append(entry)
+            self.names.setdefault(entry.get_name(), OrderedDict())[entry_id] = entry
+            self.notify(ItemContainer.ADDED, entry)
+
+    def remove(self, entry):
+        entry_id = id(entry)
+        if entry_id not in self.positions:
+            raise ValueError("%r is not in container" % (entry,))
+        position = self.positions.pop(entry_id)
+        del self.entries[position]
+        for moved_entry in self.entries[position:]:
+            self.positions[id(moved_entry)] -= 1
+        entries_with_name = self.names[entry.get_name()]
+        del entries_with_name[entry_id]
+        if not entries_with_name:
+            del self.names[entry.get_name()]
+        self.notify(ItemContainer.REMOVED, entry)
+
+    def get(self, entry_id):
+        try:
+            return self.entries[self.positions[entry_id]]
+        except KeyError:
+            raise ItemContainer.NoSuchItem(entry_id)
+
+    def find(self, name):
+        try:
+            return next(iter(self.names[name].values()))
+        except KeyError:
+            raise ItemContainer.NoSuchItem(name)
+
+    def __contains__(self, entry):
+        return id(entry) in self.positions
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, index):
+        return self.entries[index]
+
+
+def message_property(message):
+    def get_message(item):
+        return item.messages[message]
+
+    def set_message(item, value):
+        if item.messages is item.item_type.messages:
+            item.messages = dict(item.messages)
+        item.messages[message] = value
+
+    return property(get_message, set_message)
 
 
 class Item(object):
-    WRONG_COMBINATION = "I can't do that!"
+    __slots__ = ("parent_container", "name", "item_type", "usable", "obtainable", "looked_at", "is_visible",
+                 "is_split_needed", "messages", "flags", "listeners")
+
+    WRONG_COMBINATION = WRONG_COMBINATION
+
+    look_at_message = message_property("look_at_message")
+    inspect_message = message_property("inspect_message")
+    use_message = message_property("use_message")
+    use_not_usable_message = message_property("use_not_usable_message")
+    add_message = message_property("add_message")
+    add_not_obtainable_message = message_property("add_not_obtainable_message")
 
-    def __init__(self, parent_container):
+    def __init__(self, parent_container, name="NAME"):
         assert parent_container is not None
+        self.name = name
+        self.looked_at = False
+        self.listeners = None
+        self.set_item_type(item_data.get_type(name))
         parent_container.append(self)
         self.parent_container = parent_container
-        self.usable = False
-        self.obtainable = False
-        self.looked_at = False
-        self.name = "NAME"
-        self.look_at_message = "LOOK_AT"
-        self.inspect_message = "INSPECT"
-        self.use_message = "USE"
-        self.use_not_usable_message = "NOT_USABLE"
-        self.add_message = "ADD"
-        self.add_not_obtainable_message = "NOT OBTAINABLE"
-        self.unique_attributes = {}
-        self.is_split_needed = False
-        self.visible = True
-        self.setup()
-        self.fill_attributes()
-
-    def setup(self):  # pragma: no cover
-        pass
+
+    def set_item_type(self, item_type):
+        self.item_type = item_type
+        self.usable = item_type.usable
+        self.obtainable = item_type.obtainable
+        self.is_visible = item_type.visible
+        self.is_split_needed = item_type.is_split_needed
+        self.messages = item_type.messages
+        self.flags = None
 
     def fill_attributes(self):
-        value = ""
-        actions = {
-            "obtainable": lambda: partial(self.set_obtainable, value),
-            "look_at": lambda: partial(self.set_look_at, value),
-            "usable": lambda: partial(self.set_usable, value),
-            "use": lambda: partial(self.set_use_message, value),
-            "use_not_usable": lambda: partial(self.set_use_not_usable_message, value),
-            "inspect": lambda: partial(self.set_inspect, value),
-            "split_needed": lambda: partial(self.set_split_needed, value),
-            "add": lambda: partial(self.set_add_message, value),
-            "add_not_obtainable": lambda: partial(self.set_add_not_obtainable_message, value)
-        }
-        attributes = load_item_data(self.name)
-        for key, value in attributes.items():
-            if key in actions.keys():
-                actions[key]()()
-
-    def set_obtainable(self, value):
-        self.obtainable = value
-
-    def set_look_at(self, value):
-        self.look_at_message = value
-
-    def set_usable(self, value):
-        self.usable = value
-
-    def set_inspect(self, value):
-        self.inspect_message = value
-
-    def set_use_message(self, value):
-        self.use_message = value
-
-    def set_use_not_usable_message(self, value):
-        self.use_not_usable_message = value
-
-    def set_split_needed(self, value):
-        self.is_split_needed = value
-
-    def set_add_message(self, value):
-        self.add_message = value
-
-    def set_add_not_obtainable_message(self, value):
-        self.add_not_obtainable_message = value
-
-    def combine(self, other):  # pragma: no cover
-        pass
+        self.set_item_type(ItemType(self.name, item_data.get(self.name)))
+
+    def subscribe(self, listener):
+        if self.listeners is None:
+            self.listeners = list()
+        self.listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        self.listeners.remove(listener)
+
+    @property
+    def visible(self):
+        return self.is_visible
+
+    @visible.setter
+    def visible(self, visible):
+        if visible != self.is_visible:
+            self.is_visible = visible
+            for listener in self.listeners or ():
+                listener(self)
+
+    @property
+    def unique_attributes(self):
+        if self.flags is None:
+            self.flags = dict(self.item_type.flags)
+        return self.flags
+
+    def combine(self, other):
+        combination_table.get_rule(self.name, other.get_name()).apply(self, other)
 
     def remove_from_parent_container(self):
         self.parent_container.remove(self)
@@ -113,166 +280,27 @@ class Item(object):
     def get_add_message(self):
         return self.add_not_obtainable_message if not self.obtainable else self.add_message
 
-    def is_combination_possible(self, other):  # pragma: no cover
-        pass
-
-    def is_wrong_combination(self, other, name):
-        return True if other.get_name() != name else False
-
-    def change_look_at_message(self, other, new_look_at_key):
-        attributes = load_item_data(other.get_name())
-        other.look_at_message = next(value for key, value in attributes.items() if key == new_look_at_key)
-
-    def get_combination_message(self, other, combination_error):
-        attributes = load_item_data(other.get_name())
-        return next(value for key, value in attributes.items() if key == combination_error)
-
-
-class Paperclip(Item):
-    def setup(self):
-        self.name = "Paperclip"
-
-    def is_combination_possible(self, other):
-        if self.is_wrong_combination(other, "Door"):
-            return False, Item.WRONG_COMBINATION
-        if not other.looked_at:
-            return False, self.get_combination_message(other, "combination_paperclip_not_looked_at")
-        if not other.unique_attributes["combined_with_letter"]:
-            return False, self.get_combination_message(other, "combination_letter_not_under_door")
-        return True, self.get_combination_message(self, "combinate")
-
-    def combine(self, other):
-        self.remove_from_parent_container()
-        letter_under_door = next((item_ui for item_ui in other.parent_container
-                                  if item_ui.get_name() == "LetterUnderDoor"))
-        letter_under_door.item.obtainable = True
-
-        other.unique_attributes["combined_with_paperclip"] = True
-        self.change_look_at_message(other, "look_at_when_key_obtainable")
-
-
-class Key(Item):
-    def setup(self):
-        self.name = "Key"
-        self.visible = False
-
-    def is_combination_possible(self, other):
-        if self.is_wrong_combination(other, "Door"):
-            return False, Item.WRONG_COMBINATION
-        return True, self.get_combination_message(self, "combinate")
-
-    def combine(self, other):
-        other.usable = True
-        self.remove_from_parent_container()
-
-        self.change_look_at_message(other, "look_at_door_unlocked")
-
-
-class IdCard(Item):
-    class AccessDenied(Exception):
-        pass
-
-    def setup(self):
-        self.unique_attributes["key_code"] = 0
-        self.obtainable = True
-        self.name = "ID-Card"
-
     def is_combination_possible(self, other):
-        if self.has_insufficient_permissions(other):
-            return False, Item.WRONG_COMBINATION
-        return True, None
-
-    def combine(self, other):
-        other.usable = True
-
-    def has_insufficient_permissions(self, other):
-        return other.unique_attributes["access_code"] != self.unique_attributes["key_code"]
-
+        return combination_table.get_rule(self.name, other.get_name()).check(self, other)
 
-class Door(Item):
-    def setup(self):
-        self.unique_attributes["access_code"] = 0
-        self.unique_attributes["combined_with_letter"] = False
-        self.name = "Door"
+    def get_flag(self, flag):
+        return self.unique_attributes[flag] if flag in self.unique_attributes else getattr(self, flag)
 
+    def set_flag(self, flag, value):
+        if flag in self.unique_attributes or not hasattr(self, flag):
+            self.unique_attributes[flag] = value
+        else:
+            setattr(self, flag, value)
 
-class CardReader(Item):
-    def setup(self):
-        self.name = "Card-Reader"
+    def find_in_parent_container(self, name):
+        found = self.parent_container.find(name)
+        return getattr(found, "item", found)
 
-    def is_combination_possible(self, other):
-        if self.is_wrong_combination(other, "ID-Card"):
-            return False, Item.WRONG_COMBINATION
-        return True, None
-
-    def combine(self, other):
-        other.unique_attributes["key_code"] += 1
-
-
-class Note(Item):
-    def setup(self):
-        self.obtainable = True
-        self.name = "Note"
-
-    def is_combination_possible(self, other):
-        if self.is_wrong_combination(other, "Symbols-Folder"):
-            return False, Item.WRONG_COMBINATION
-        return True, None
-
-    def combine(self, other):
-        self.add_telephone_note_to_player_bag()
-        self.remove_from_parent_container()
-
-    def add_telephone_note_to_player_bag(self):
-        player_bag = self.parent_container
-        tel_note = TelephoneNote(player_bag)
-        player_bag.append(tel_note)
-
-
-class TelephoneNote(Item):
-    def setup(self):
-        self.name = "Telephone-Note"
-
-
-class Telephone(Item):
-    def setup(self):
-        self.name = "Telephone"
-
-    def is_combination_possible(self, other):
-        if self.is_wrong_combination(other, "Telephone-Note"):
-            return False, Item.WRONG_COMBINATION
-        return True, None
-
-    def combine(self, other):
-        other.remove_from_parent_container()
-
-
-class Letter(Item):
-    def setup(self):
-        self.name = "Letter"
-
-    def is_combination_possible(self, other):
-        if self.is_wrong_combination(other, "Door"):
-            return False, Item.WRONG_COMBINATION
-        if not other.looked_at:
-            return False, self.get_combination_message(other, "combination_letter_not_looked_at")
-        return True, self.get_combination_message(self, "combinate")
-
-    def combine(self, other):
-        self.remove_from_parent_container()
-        other.unique_attributes["combined_with_letter"] = True
-        letter_under_door = next((item_ui for item_ui in other.parent_container
-                                  if item_ui.get_name() == "LetterUnderDoor"))
-        letter_under_door.item.visible = True
-        self.change_look_at_message(other, "look_at_after_letter")
-
-
-class LetterUnderDoor(Item):
-    def setup(self):
-        self.visible = False
-        self.name = "LetterUnderDoor"
+    def spawn_in_parent_container(self, name):
+        return Item(self.parent_container, name)
 
+    def change_look_at_message(self, other, new_look_at_key):
+        other.look_at_message = item_data.get_message(other.get_name(), new_look_at_key)
 
-class SymbolsFolder(Item):
-    def setup(self):
-        self.name = "Symbols-Folder"
+    def get_combination_message(self, other, combination_error):
+        return item_data.get_message(other.get_name(), combination_error)
@@ -0,0 +1,200 @@
+# -*- encoding: utf-8 -*-
+from hashlib import sha1
+import logging
+import os
+from os.path import join, expanduser
+import struct
+
+logger = logging.getLogger()
+
+LOADER_VERSION = 2
+
+
+class MapDescription(object):
+    def __init__(self, name):
+        self.name = name
+        self.background = None
+        self.items = list()
+        self.waypoints = list()
+        self.exits = dict()
+        self.obstacles = list()
+
+    def add_item(self, item_type, pos):
+        self.items.append((item_type, pos))
+
+    def add_waypoint(self, name, pos, is_spawn, neighbors):
+        self.waypoints.append((name, pos, is_spawn, neighbors))
+
+    def add_exit(self, pos, name):
+        self.exits[pos] = name
+
+    def add_obstacle(self, rect):
+        self.obstacles.append(rect)
+
+
+class MapCodec(object):
+    class InvalidFormat(Exception):
+        pass
+
+    MAGIC = b"TKMC"
+    HEADER = struct.Struct("<4sH20s")
+    COUNT = struct.Struct("<H")
+    POSITION = struct.Struct("<dd")
+    RECT = struct.Struct("<dddd")
+    FLAG = struct.Struct("<B")
+
+    @staticmethod
+    def get_digest(tmx_data):
+        return sha1(tmx_data).digest()
+
+    def dumps(self, description, digest):
+        chunks = [self.HEADER.pack(self.MAGIC, LOADER_VERSION, digest)]
+        self.write_string(chunks, description.name)
+        self.write_string(chunks, description.background or u"")
+        self.write_items(chunks, description.items)
+        self.write_waypoints(chunks, description.waypoints)
+        self.write_exits(chunks, description.exits)
+        self.write_obstacles(chunks, description.obstacles)
+        return b"".join(chunks)
+
+    def write_string(self, chunks, value):
+        encoded = value.encode("utf-8")
+        chunks.append(self.COUNT.pack(len(encoded)))
+        chunks.append(encoded)
+
+    def write_items(self, chunks, items):
+        chunks.append(self.COUNT.pack(len(items)))
+        for item_type, pos in items:
+            self.write_string(chunks, item_type)
+            chunks.append(self.POSITION.pack(*pos))
+
+    def write_waypoints(self, chunks, waypoints):
+        index_of = dict((waypoint[0], index) for index, waypoint in enumerate(waypoints))
+        chunks.append(self.COUNT.pack(len(waypoints)))
+        for name, pos, is_spawn, neighbors in waypoints:
+            self.write_string(chunks, name)
+            chunks.append(self.POSITION.pack(*pos))
+            chunks.append(self.FLAG.pack(is_spawn))
+            chunks.append(self.COUNT.pack(len(neighbors)))
+            chunks.append(struct.pack("<%dH" % len(neighbors), *[index_of[neighbor] for neighbor in neighbors]))
+
+    def write_exits(self, chunks, exits):
+        chunks.append(self.COUNT.pack(len(exits)))
+        for pos, name in exits.items():
+            chunks.append(self.POSITION.pack(*pos))
+            self.write_string(chunks, name)
+
+    def write_obstacles(self, chunks, obstacles):
+        chunks.append(self.COUNT.pack(len(obstacles)))
+        for rect in obstacles:
+            chunks.append(self.RECT.pack(*rect))
+
+    def read_digest(self, data):
+        try:
+            magic, version, digest = self.HEADER.unpack_from(data, 0)
+        except struct.error:
+            raise MapCodec.InvalidFormat
+        if magic != self.MAGIC or version != LOADER_VERSION:
+            raise MapCodec.InvalidFormat
+        return digest
+
+    def loads(self, data):
+        reader = _Reader(data, self.HEADER.size)
+        try:
+            return self.read_description(reader)
+        except (struct.error, IndexError, UnicodeDecodeError):
+            raise MapCodec.InvalidFormat
+
+    def read_description(self, reader):
+        description = MapDescription(reader.string())
+        description.background = reader.string() or None
+        for _ in range(reader.count()):
+            description.add_item(reader.string(), reader.position())
+        self.read_waypoints(reader, description)
+        for _ in range(reader.count()):
+            description.add_exit(reader.position(), reader.string())
+        for _ in range(reader.count()):
+            description.add_obstacle(reader.rect())
+        return description
+
+    def read_waypoints(self, reader, description):
+        waypoints = list()
+        for _ in range(reader.count()):
+            name, pos, is_spawn = reader.string(), reader.position(), bool(reader.flag())
+            waypoints.append((name, pos, is_spawn, reader.indices(reader.count())))
+        for name, pos, is_spawn, neighbors in waypoints:
+            description.add_waypoint(name, pos, is_spawn, [waypoints[index][0] for index in neighbors])
+
+
+class _Reader(object):
+    def __init__(self, data, offset):
+        self.data = data
+        self.offset = offset
+
+    def unpack(self, structure):
+        values = structure.unpack_from(self.data, self.offset)
+        self.offset += structure.size
+        return values
+
+    def count(self):
+        return self.unpack(MapCodec.COUNT)[0]
+
+    def flag(self):
+        return self.unpack(MapCodec.FLAG)[0]
+
+    def position(self):
+        return self.unpack(MapCodec.POSITION)
+
+    def rect(self):
+        return self.unpack(MapCodec.RECT)
+
+    def indices(self, count):
+        return self.unpack(struct.Struct("<%dH" % count))
+
+    def string(self):
+        length = self.count()
+        value = self.data[self.offset:self.offset + length]
+        if len(value) != length:
+            raise struct.error("string exceeds data")
+        self.offset += length
+        return value.decode("utf-8")
+
+
+def get_default_cache_directory():
+    return os.environ.get("TEKMATE_CACHE_DIR", join(expanduser("~"), ".cache", "tekmate"))
+
+
+class MapCache(object):
+    EXTENSION = ".tkmc"
+
+    def __init__(self, directory=None):
+        self.directory = directory or join(get_default_cache_directory(), "maps")
+        self.codec = MapCodec()
+
+    def get_path(self, name):
+        return join(self.directory, name + self.EXTENSION)
+
+    def load(self, name, tmx_data):
+        try:
+            with open(self.get_path(name), "rb") as cache_file:
+                data = cache_file.read()
+            if self.codec.read_digest(data) != MapCodec.get_digest(tmx_data):
+                return None
+            return self.codec.loads(data)
+        except (IOError, OSError, MapCodec.InvalidFormat):
+            return None
+
+    def store(self, description, tmx_data):
+        data = self.codec.dumps(description, MapCodec.get_digest(tmx_data))
+        try:
+            self.write(self.get_path(description.name), data)
+        except (IOError, OSError) as error:
+            logger.warning("Could not write map cache for %s: %s" % (description.name, error))
+
+    def write(self, path, data):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "wb") as cache_file:
+            cache_file.write(data)
+        os.rename(temporary_path, path)
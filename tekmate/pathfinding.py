@@ -1,4 +1,9 @@
 import math
+from collections import OrderedDict
+
+from tekmate.profiler import lazy_import
+
+numpy = lazy_import("numpy")
 
 
 class AStar(object):
@@ -61,3 +66,243 @@ class AStar(object):
         for node in self.open_list:
             smallest_node = ((node[0], node[1]) if node[1] < smallest_node[1] else smallest_node)
         return smallest_node
+
+
+class FlowField(object):
+    __slots__ = ("goal", "distances", "next_nodes")
+
+    ARRIVED = -1
+
+    def __init__(self, goal, distances, next_nodes):
+        self.goal = goal
+        self.distances = distances
+        self.next_nodes = next_nodes
+
+    def next_node(self, node):
+        return int(self.next_nodes[node])
+
+    def distance(self, node):
+        return float(self.distances[node])
+
+    def is_reachable(self, node):
+        return bool(numpy.isfinite(self.distances[node]))
+
+
+class PathBatch(object):
+    __slots__ = ("nodes", "offsets", "waypoints")
+
+    def __init__(self, nodes, offsets, waypoints):
+        self.nodes = nodes
+        self.offsets = offsets
+        self.waypoints = waypoints
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def get_nodes(self, index):
+        return self.nodes[self.offsets[index]:self.offsets[index + 1]]
+
+    def get_path(self, index):
+        return [self.waypoints[node] for node in self.get_nodes(index)]
+
+
+class EdgeIndex(object):
+    CELL_SIZE = 64
+
+    def __init__(self, graph, cell_size=CELL_SIZE):
+        self.graph = graph
+        self.cell_size = cell_size
+        pairs = numpy.sort(numpy.stack([graph.sources, graph.indices], axis=1), axis=1)
+        self.edges = numpy.unique(pairs[pairs[:, 0] != pairs[:, 1]], axis=0).reshape(-1, 2)
+        self.starts = graph.positions[self.edges[:, 0]]
+        self.segments = graph.positions[self.edges[:, 1]] - self.starts
+        self.cells = dict()
+        self.low = self.high = None
+        if len(self.edges):
+            self.index_edges()
+
+    def index_edges(self):
+        ends = self.starts + self.segments
+        lows = numpy.floor(numpy.minimum(self.starts, ends) / self.cell_size).astype(int)
+        highs = numpy.floor(numpy.maximum(self.starts, ends) / self.cell_size).astype(int)
+        for edge, (left, top), (right, bottom) in zip(range(len(self.edges)), lows.tolist(), highs.tolist()):
+            for x in range(left, right + 1):
+                for y in range(top, bottom + 1):
+                    self.cells.setdefault((x, y), list()).append(edge)
+        self.low, self.high = lows.min(axis=0).tolist(), highs.max(axis=0).tolist()
+
+    def get_cell(self, pos):
+        return int(pos[0] // self.cell_size), int(pos[1] // self.cell_size)
+
+    def get_ring(self, cell, radius):
+        x, y = cell
+        if radius == 0:
+            return [cell]
+        ring = [(x + dx, y + dy) for dx in (-radius, radius) for dy in range(-radius, radius + 1)]
+        return ring + [(x + dx, y + dy) for dx in range(1 - radius, radius) for dy in (-radius, radius)]
+
+    def project(self, pos):
+        if not len(self.edges):
+            return None
+        cell = self.get_cell(pos)
+        last_radius = max(abs(cell[0] - self.low[0]), abs(cell[0] - self.high[0]),
+                          abs(cell[1] - self.low[1]), abs(cell[1] - self.high[1]))
+        seen = set()
+        best = None
+        for radius in range(last_radius + 1):
+            candidates = set(edge for ring_cell in self.get_ring(cell, radius)
+                             for edge in self.cells.get(ring_cell, ())) - seen
+            seen.update(candidates)
+            if candidates:
+                projection = self.project_onto(numpy.fromiter(candidates, dtype=numpy.intp), pos)
+                best = projection if best is None or projection[0] < best[0] else best
+            if best is not None and best[0] <= radius * self.cell_size:
+                break
+        _, edge, point = best
+        start, end = self.edges[edge].tolist()
+        return start, end, point
+
+    def project_onto(self, edges, pos):
+        starts, segments = self.starts[edges], self.segments[edges]
+        lengths = (segments * segments).sum(axis=1)
+        along = ((numpy.asarray(pos, dtype=float) - starts) * segments).sum(axis=1)
+        fractions = numpy.clip(along / numpy.where(lengths > 0, lengths, 1.0), 0.0, 1.0)
+        points = starts + segments * fractions[:, None]
+        offsets = points - pos
+        distances = numpy.hypot(offsets[:, 0], offsets[:, 1])
+        best = int(numpy.argmin(distances))
+        x, y = points[best].tolist()
+        return float(distances[best]), int(edges[best]), (x, y)
+
+
+class FlowFieldService(object):
+    CAPACITY = 8
+
+    def __init__(self, graph, capacity=CAPACITY):
+        self.capacity = capacity
+        self.graph = graph
+        self.fields = OrderedDict()
+        self.edge_index = None
+
+    def get_field(self, goal):
+        field = self.fields.pop(goal, None)
+        if field is None:
+            field = self.compute_field(goal)
+        self.fields[goal] = field
+        while len(self.fields) > self.capacity:
+            self.fields.popitem(last=False)
+        return field
+
+    def get_field_to(self, pos):
+        return self.get_field(self.get_closest_node(pos))
+
+    def get_closest_node(self, pos):
+        return int(self.get_closest_nodes([pos])[0])
+
+    def get_closest_nodes(self, positions):
+        offsets = numpy.asarray(positions, dtype=float).reshape(-1, 1, 2) - self.graph.positions
+        return numpy.argmin((offsets * offsets).sum(axis=2), axis=1)
+
+    def compute_field(self, goal, seeds=None):
+        initial = numpy.full(len(self.graph), numpy.inf)
+        if seeds is None:
+            initial[goal] = 0.0
+        else:
+            for node, distance in seeds:
+                initial[node] = min(initial[node], distance)
+        distances = self.compute_distances(initial)
+        return FlowField(goal, distances, self.compute_next_nodes(initial, distances))
+
+    def compute_distances(self, initial):
+        distances = initial.copy()
+        changed = numpy.isfinite(distances)
+        while changed.any():
+            frontier = changed[self.graph.indices]
+            relaxed = distances.copy()
+            numpy.minimum.at(relaxed, self.graph.sources[frontier],
+                             self.graph.lengths[frontier] + distances[self.graph.indices[frontier]])
+            changed = relaxed < distances
+            distances = relaxed
+        return distances
+
+    def compute_next_nodes(self, initial, distances):
+        next_nodes = numpy.full(len(self.graph), FlowField.ARRIVED, dtype=numpy.intp)
+        costs = self.graph.lengths + distances[self.graph.indices]
+        reachable = numpy.isfinite(costs) & (distances[self.graph.sources] < initial[self.graph.sources])
+        sources, targets, costs = self.graph.sources[reachable], self.graph.indices[reachable], costs[reachable]
+        order = numpy.lexsort((costs, sources))
+        sources, targets = sources[order], targets[order]
+        first = numpy.ones(len(sources), dtype=bool)
+        first[1:] = sources[1:] != sources[:-1]
+        next_nodes[sources[first]] = targets[first]
+        return next_nodes
+
+    def next_waypoint(self, waypoint, goal):
+        field = self.get_field(goal.id)
+        next_node = field.next_node(waypoint.id)
+        return None if next_node == FlowField.ARRIVED else self.graph.waypoints[next_node]
+
+    def find_paths(self, starts, goals):
+        start_nodes = self.get_closest_nodes(starts)
+        goal_nodes, goal_rows = numpy.unique(self.get_closest_nodes(goals), return_inverse=True)
+        fields = [self.get_field(int(goal)) for goal in goal_nodes]
+        shape = (len(fields), len(self.graph))
+        next_table = numpy.array([field.next_nodes for field in fields], dtype=numpy.intp).reshape(shape)
+        distance_table = numpy.array([field.distances for field in fields]).reshape(shape)
+
+        queries = numpy.flatnonzero(numpy.isfinite(distance_table[goal_rows, start_nodes]))
+        current = start_nodes[queries]
+        step_queries, step_nodes = [numpy.zeros(0, dtype=numpy.intp)], [numpy.zeros(0, dtype=numpy.intp)]
+        while queries.size:
+            step_queries.append(queries)
+            step_nodes.append(current)
+            current = next_table[goal_rows[queries], current]
+            walking = current != FlowField.ARRIVED
+            queries, current = queries[walking], current[walking]
+
+        query_ids = numpy.concatenate(step_queries)
+        order = numpy.argsort(query_ids, kind="stable")
+        offsets = numpy.zeros(len(start_nodes) + 1, dtype=numpy.intp)
+        offsets[1:] = numpy.cumsum(numpy.bincount(query_ids, minlength=len(start_nodes)))
+        return PathBatch(numpy.concatenate(step_nodes)[order], offsets, self.graph.waypoints)
+
+    def get_edge_index(self):
+        if self.edge_index is None:
+            self.edge_index = EdgeIndex(self.graph)
+        return self.edge_index
+
+    def find_route(self, start, goal):
+        edge_index = self.get_edge_index()
+        start_projection, goal_projection = edge_index.project(start), edge_index.project(goal)
+        if start_projection is None:
+            return []
+        first, second, source = start_projection
+        last, before_last, target = goal_projection
+        if set((first, second)) == set((last, before_last)):
+            return [target]
+        field = self.compute_field(None, [(node, self.get_distance(node, target)) for node in (last, before_last)])
+        costs = [self.get_distance(node, source) + field.distance(node) for node in (first, second)]
+        node = first if costs[0] <= costs[1] else second
+        if not field.is_reachable(node):
+            return []
+        nodes = list()
+        while node != FlowField.ARRIVED:
+            nodes.append(node)
+            node = field.next_node(node)
+        route = [self.graph.waypoints[node].pos for node in self.smooth(nodes)]
+        if route[-1] != target:
+            route.append(target)
+        return route
+
+    def smooth(self, nodes):
+        smoothed = [nodes[0]]
+        index = 0
+        while index < len(nodes) - 1:
+            index = next((farther for farther in range(len(nodes) - 1, index + 1, -1)
+                          if self.graph.is_visible(nodes[index], nodes[farther])), index + 1)
+            smoothed.append(nodes[index])
+        return smoothed
+
+    def get_distance(self, node, pos):
+        x, y = self.graph.positions[node]
+        return math.hypot(x - pos[0], y - pos[1])
@@ -0,0 +1,68 @@
+# -*- encoding: utf-8 -*-
+from contextlib import contextmanager
+from importlib import import_module
+import logging
+import sys
+import time
+
+logger = logging.getLogger()
+
+
+class StartupProfiler(object):
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.start_time = clock()
+        self.imports = list()
+        self.sections = list()
+        self.first_frame_time = None
+        self.enabled = False
+
+    def import_module(self, name):
+        already_imported = name in sys.modules
+        start = self.clock()
+        module = import_module(name)
+        if not already_imported:
+            self.imports.append((name, self.clock() - start))
+        return module
+
+    @contextmanager
+    def section(self, name):
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.sections.append((name, self.clock() - start))
+
+    def mark_first_frame(self):
+        if self.first_frame_time is None:
+            self.first_frame_time = self.clock() - self.start_time
+            if self.enabled:
+                for line in self.report():
+                    logger.info(line)
+
+    def report(self):
+        lines = ["Startup report:"]
+        lines.extend("  import %-36s %8.1f ms" % (name, elapsed * 1000) for name, elapsed in self.imports)
+        lines.extend("  init   %-36s %8.1f ms" % (name, elapsed * 1000) for name, elapsed in self.sections)
+        if self.first_frame_time is not None:
+            lines.append("  first frame after %.1f ms" % (self.first_frame_time * 1000))
+        return lines
+
+
+class LazyModule(object):
+    def __init__(self, name, profiler):
+        self.__name = name
+        self.__profiler = profiler
+        self.__module = None
+
+    def __getattr__(self, attribute):
+        if self.__module is None:
+            self.__module = self.__profiler.import_module(self.__name)
+        return getattr(self.__module, attribute)
+
+
+startup_profiler = StartupProfiler()
+
+
+def lazy_import(name):
+    return LazyModule(name, startup_profiler)
@@ -0,0 +1,128 @@
+# -*- encoding: utf-8 -*-
+from fnmatch import fnmatch
+from glob import glob
+import os
+from os.path import dirname, exists, getmtime, isdir, isfile, join
+
+from tekmate.assetpack import ASSET_ROOT, PACK_PATH, AssetPack
+
+GAME_ROOT = dirname(ASSET_ROOT)
+
+
+class DirectoryRoot(object):
+    def __init__(self, path):
+        self.path = path
+
+    def get_path(self, name):
+        return join(self.path, *name.split("/"))
+
+    def __contains__(self, name):
+        return isfile(self.get_path(name))
+
+    def open(self, name):
+        return open(self.get_path(name), "rb")
+
+    def read(self, name):
+        with self.open(name) as resource_file:
+            return resource_file.read()
+
+    def getmtime(self, name):
+        return getmtime(self.get_path(name))
+
+    def names(self):
+        return [name for name, _ in AssetPack.collect_files(self.path)] if isdir(self.path) else []
+
+
+class PackRoot(object):
+    def __init__(self, pack):
+        self.pack = pack
+        self.path = pack.path
+
+    def get_path(self, name):
+        return None
+
+    def __contains__(self, name):
+        return name in self.pack
+
+    def open(self, name):
+        return self.pack.open(name)
+
+    def read(self, name):
+        return self.pack.read(name)
+
+    def getmtime(self, name):
+        return getmtime(self.pack.path)
+
+    def names(self):
+        return self.pack.names()
+
+
+class ResourceLocator(object):
+    class ResourceNotFound(Exception):
+        pass
+
+    def __init__(self, roots):
+        self.roots = list(roots)
+        self.resolved = dict()
+        self.names = None
+
+    def add_root(self, root, index=0):
+        self.roots.insert(index, root)
+        self.resolved.clear()
+        self.names = None
+
+    def resolve(self, name):
+        try:
+            return self.resolved[name]
+        except KeyError:
+            root = self.resolved[name] = self.find_root(name)
+            return root
+
+    def find_root(self, name):
+        for root in self.roots:
+            if name in root:
+                return root
+        raise ResourceLocator.ResourceNotFound(name)
+
+    def __contains__(self, name):
+        try:
+            self.resolve(name)
+            return True
+        except ResourceLocator.ResourceNotFound:
+            return False
+
+    def open(self, name):
+        return self.resolve(name).open(name)
+
+    def read(self, name):
+        return self.resolve(name).read(name)
+
+    def getmtime(self, name):
+        return self.resolve(name).getmtime(name)
+
+    def get_path(self, name):
+        return self.resolve(name).get_path(name)
+
+    def glob(self, pattern):
+        if self.names is None:
+            self.names = sorted(set(name for root in self.roots for name in root.names()))
+        return [name for name in self.names if fnmatch(name, pattern)]
+
+    @staticmethod
+    def create_default(game_root=GAME_ROOT, loose=None):
+        if loose is None:
+            loose = bool(os.environ.get("TEKMATE_LOOSE_ASSETS"))
+        mods = [DirectoryRoot(path) for path in sorted(glob(join(game_root, "mods", "*"))) if isdir(path)]
+        patches = [DirectoryRoot(join(game_root, "patches"))]
+        packs = [PackRoot(AssetPack(path)) for path in ResourceLocator.find_packs(game_root)]
+        base = [DirectoryRoot(join(game_root, "assets"))]
+        return ResourceLocator(mods + patches + (base + packs if loose else packs + base))
+
+    @staticmethod
+    def find_packs(game_root):
+        default_pack = join(game_root, os.path.basename(PACK_PATH))
+        patch_packs = sorted(glob(join(game_root, "patches", "*.pak")), reverse=True)
+        return patch_packs + ([default_pack] if exists(default_pack) else [])
+
+
+resources = ResourceLocator.create_default()
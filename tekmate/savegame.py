@@ -0,0 +1,258 @@
+# -*- encoding: utf-8 -*-
+from collections import namedtuple
+import logging
+import os
+from os.path import join, expanduser
+import struct
+from threading import Thread
+
+from tekmate.items import Item, ItemContainer
+from tekmate.mapcache import _Reader
+
+try:  # pragma: no cover
+    from queue import Queue, Empty
+except ImportError:  # pragma: no cover
+    from Queue import Queue, Empty
+
+logger = logging.getLogger()
+
+SAVE_VERSION = 1
+
+ItemState = namedtuple("ItemState", ["name", "pos", "image_name", "usable", "obtainable", "looked_at", "visible",
+                                     "flags", "messages"])
+MapState = namedtuple("MapState", ["name", "items"])
+GameSnapshot = namedtuple("GameSnapshot", ["current_map", "player_pos", "bag", "maps"])
+
+
+def freeze(values):
+    return None if values is None else tuple(sorted(values.items()))
+
+
+def capture_item(entry):
+    item = getattr(entry, "item", entry)
+    rect = getattr(entry, "rect", None)
+    pos = None if rect is None else tuple(rect.topleft)
+    messages = None if item.messages is item.item_type.messages else freeze(item.messages)
+    return ItemState(item.name, pos, getattr(entry, "image_name", None) or u"", item.usable, item.obtainable,
+                     item.looked_at, item.visible, freeze(item.flags), messages)
+
+
+def capture_container(container):
+    return tuple(capture_item(entry) for entry in container)
+
+
+def restore_item(entry, state):
+    item = getattr(entry, "item", entry)
+    item.usable = state.usable
+    item.obtainable = state.obtainable
+    item.looked_at = state.looked_at
+    item.flags = None if state.flags is None else dict(state.flags)
+    item.messages = item.item_type.messages if state.messages is None else dict(state.messages)
+    if state.pos is not None:
+        if state.image_name and state.image_name != entry.image_name:
+            entry.load_image(state.image_name)
+        entry.rect.topleft = state.pos
+    item.visible = state.visible
+
+
+def restore_entries(states, old_entries, create_entry):
+    reusable = dict()
+    for entry in old_entries:
+        if hasattr(entry, "rect"):
+            reusable.setdefault(entry.get_name(), list()).append(entry)
+    entries = list()
+    for state in states:
+        if state.pos is None:
+            entry = Item(ItemContainer(), state.name)
+        elif reusable.get(state.name):
+            entry = reusable[state.name].pop(0)
+        else:
+            entry = create_entry(state.name)
+        restore_item(entry, state)
+        entries.append(entry)
+    return entries
+
+
+class SaveCodec(object):
+    class InvalidFormat(Exception):
+        pass
+
+    MAGIC = b"TKSV"
+    HEADER = struct.Struct("<4sH")
+    COUNT = struct.Struct("<H")
+    POSITION = struct.Struct("<ii")
+    BYTE = struct.Struct("<B")
+    INTEGER = struct.Struct("<q")
+    REAL = struct.Struct("<d")
+
+    USABLE, OBTAINABLE, LOOKED_AT, VISIBLE, HAS_POSITION, HAS_FLAGS, HAS_MESSAGES = [1 << bit for bit in range(7)]
+    NONE, FALSE, TRUE, INTEGER_VALUE, REAL_VALUE, STRING_VALUE = range(6)
+
+    def dumps(self, snapshot):
+        chunks = [self.HEADER.pack(self.MAGIC, SAVE_VERSION)]
+        self.write_string(chunks, snapshot.current_map)
+        chunks.append(self.POSITION.pack(*snapshot.player_pos))
+        self.write_items(chunks, snapshot.bag)
+        chunks.append(self.COUNT.pack(len(snapshot.maps)))
+        for map_state in snapshot.maps:
+            self.write_string(chunks, map_state.name)
+            self.write_items(chunks, map_state.items)
+        return b"".join(chunks)
+
+    def write_string(self, chunks, value):
+        encoded = value.encode("utf-8")
+        chunks.append(self.COUNT.pack(len(encoded)))
+        chunks.append(encoded)
+
+    def write_items(self, chunks, items):
+        chunks.append(self.COUNT.pack(len(items)))
+        for state in items:
+            self.write_item(chunks, state)
+
+    def write_item(self, chunks, state):
+        self.write_string(chunks, state.name)
+        chunks.append(self.BYTE.pack(self.get_item_bits(state)))
+        if state.pos is not None:
+            chunks.append(self.POSITION.pack(*state.pos))
+        self.write_string(chunks, state.image_name)
+        for pairs in (state.flags, state.messages):
+            if pairs is not None:
+                self.write_pairs(chunks, pairs)
+
+    def get_item_bits(self, state):
+        bits = [(state.usable, self.USABLE), (state.obtainable, self.OBTAINABLE), (state.looked_at, self.LOOKED_AT),
+                (state.visible, self.VISIBLE), (state.pos is not None, self.HAS_POSITION),
+                (state.flags is not None, self.HAS_FLAGS), (state.messages is not None, self.HAS_MESSAGES)]
+        return sum(bit for is_set, bit in bits if is_set)
+
+    def write_pairs(self, chunks, pairs):
+        chunks.append(self.COUNT.pack(len(pairs)))
+        for key, value in pairs:
+            self.write_string(chunks, key)
+            self.write_value(chunks, value)
+
+    def write_value(self, chunks, value):
+        if value is None:
+            chunks.append(self.BYTE.pack(self.NONE))
+        elif isinstance(value, bool):
+            chunks.append(self.BYTE.pack(self.TRUE if value else self.FALSE))
+        elif isinstance(value, int):
+            chunks.append(self.BYTE.pack(self.INTEGER_VALUE) + self.INTEGER.pack(value))
+        elif isinstance(value, float):
+            chunks.append(self.BYTE.pack(self.REAL_VALUE) + self.REAL.pack(value))
+        else:
+            chunks.append(self.BYTE.pack(self.STRING_VALUE))
+            self.write_string(chunks, value)
+
+    def loads(self, data):
+        try:
+            magic, version = self.HEADER.unpack_from(data, 0)
+            if magic != self.MAGIC or version != SAVE_VERSION:
+                raise SaveCodec.InvalidFormat
+            return self.read_snapshot(_Reader(data, self.HEADER.size))
+        except (struct.error, IndexError, KeyError, UnicodeDecodeError):
+            raise SaveCodec.InvalidFormat
+
+    def read_snapshot(self, reader):
+        current_map = reader.string()
+        player_pos = reader.unpack(self.POSITION)
+        bag = self.read_items(reader)
+        maps = tuple(MapState(reader.string(), self.read_items(reader)) for _ in range(reader.count()))
+        return GameSnapshot(current_map, player_pos, bag, maps)
+
+    def read_items(self, reader):
+        return tuple(self.read_item(reader) for _ in range(reader.count()))
+
+    def read_item(self, reader):
+        name = reader.string()
+        bits = reader.unpack(self.BYTE)[0]
+        pos = reader.unpack(self.POSITION) if bits & self.HAS_POSITION else None
+        image_name = reader.string()
+        flags = self.read_pairs(reader) if bits & self.HAS_FLAGS else None
+        messages = self.read_pairs(reader) if bits & self.HAS_MESSAGES else None
+        return ItemState(name, pos, image_name, bool(bits & self.USABLE), bool(bits & self.OBTAINABLE),
+                         bool(bits & self.LOOKED_AT), bool(bits & self.VISIBLE), flags, messages)
+
+    def read_pairs(self, reader):
+        return tuple((reader.string(), self.read_value(reader)) for _ in range(reader.count()))
+
+    def read_value(self, reader):
+        readers = {
+            self.NONE: lambda: None,
+            self.FALSE: lambda: False,
+            self.TRUE: lambda: True,
+            self.INTEGER_VALUE: lambda: reader.unpack(self.INTEGER)[0],
+            self.REAL_VALUE: lambda: reader.unpack(self.REAL)[0],
+            self.STRING_VALUE: reader.string
+        }
+        return readers[reader.unpack(self.BYTE)[0]]()
+
+
+def get_default_save_directory():
+    return os.environ.get("TEKMATE_SAVE_DIR", join(expanduser("~"), ".local", "share", "tekmate", "saves"))
+
+
+class SaveStore(object):
+    EXTENSION = ".tksv"
+
+    def __init__(self, directory=None):
+        self.directory = directory or get_default_save_directory()
+        self.codec = SaveCodec()
+
+    def get_path(self, slot):
+        return join(self.directory, slot + self.EXTENSION)
+
+    def save(self, slot, snapshot):
+        self.write(self.get_path(slot), self.codec.dumps(snapshot))
+
+    def load(self, slot):
+        try:
+            with open(self.get_path(slot), "rb") as save_file:
+                return self.codec.loads(save_file.read())
+        except (IOError, OSError, SaveCodec.InvalidFormat):
+            return None
+
+    def write(self, path, data):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "wb") as save_file:
+            save_file.write(data)
+        os.rename(temporary_path, path)
+
+
+class SaveWriter(object):
+    def __init__(self, save_store):
+        self.save_store = save_store
+        self.requested_saves = Queue()
+        self.thread = None
+
+    def save(self, slot, snapshot):
+        self.requested_saves.put((slot, snapshot))
+        self.start_thread()
+
+    def start_thread(self):
+        if self.thread is None:
+            self.thread = Thread(target=self.write_requested_saves, name="save-writer")
+            self.thread.daemon = True
+            self.thread.start()
+
+    def write_requested_saves(self):  # pragma: no cover
+        while True:
+            for slot, snapshot in self.take_latest(self.requested_saves.get()).items():
+                self.write_save(slot, snapshot)
+
+    def take_latest(self, request):
+        latest = dict([request])
+        try:
+            while True:
+                slot, snapshot = self.requested_saves.get_nowait()
+                latest[slot] = snapshot
+        except Empty:
+            return latest
+
+    def write_save(self, slot, snapshot):
+        try:
+            self.save_store.save(slot, snapshot)
+        except Exception:
+            logger.exception("Writing save %s failed" % slot)
@@ -0,0 +1,56 @@
+# -*- encoding: utf-8 -*-
+from heapq import heappop, heappush
+from itertools import count
+
+try:  # pragma: no cover
+    from time import monotonic
+except ImportError:  # pragma: no cover
+    from time import time as monotonic
+
+
+class ScheduledCall(object):
+    __slots__ = ("due", "interval", "callback", "args", "cancelled")
+
+    def __init__(self, due, interval, callback, args):
+        self.due = due
+        self.interval = interval
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Scheduler(object):
+    def __init__(self, clock=monotonic):
+        self.clock = clock
+        self.queue = list()
+        self.sequence = count()
+
+    def call_later(self, delay, callback, *args):
+        return self.schedule(ScheduledCall(self.clock() + delay / 1000.0, None, callback, args))
+
+    def call_every(self, interval, callback, *args):
+        assert interval > 0
+        return self.schedule(ScheduledCall(self.clock() + interval / 1000.0, interval / 1000.0, callback, args))
+
+    def schedule(self, call):
+        heappush(self.queue, (call.due, next(self.sequence), call))
+        return call
+
+    def run_due(self):
+        now = self.clock()
+        while self.queue and self.queue[0][0] <= now:
+            call = heappop(self.queue)[2]
+            if call.cancelled:
+                continue
+            if call.interval is not None:
+                call.due += call.interval
+                if call.due <= now:
+                    call.due = now + call.interval
+                self.schedule(call)
+            call.callback(*call.args)
+
+    def __len__(self):
+        return sum(1 for _, _, call in self.queue if not call.cancelled)
@@ -1 +1,10 @@
 # -*- encoding: utf-8 -*-
+import atexit
+import os
+import shutil
+import tempfile
+
+test_directory = tempfile.mkdtemp(prefix="tekmate-tests-")
+atexit.register(shutil.rmtree, test_directory, True)
+os.environ["TEKMATE_CACHE_DIR"] = os.path.join(test_directory, "cache")
+os.environ["TEKMATE_SAVE_DIR"] = os.path.join(test_directory, "saves")
@@ -0,0 +1,73 @@
+# -*- encoding: utf-8 -*-
+import io
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from tekmate.assetpack import AssetPack
+
+
+class AssetPackTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.source = os.path.join(self.directory, "assets")
+        self.write_asset("global/item_data.json", b'{"Door": {}}')
+        self.write_asset("maps/example.tmx", b"<map/>")
+        self.write_asset("items/door.xcf", b"layers")
+        self.pack_path = os.path.join(self.directory, "assets.pak")
+        AssetPack.build(self.source, self.pack_path)
+        self.pack = AssetPack(self.pack_path)
+
+    def tearDown(self):
+        self.pack.close()
+        shutil.rmtree(self.directory)
+
+    def write_asset(self, name, data):
+        path = os.path.join(self.source, *name.split("/"))
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "wb") as asset_file:
+            asset_file.write(data)
+
+    def test_pack_contains_assets_by_relative_name(self):
+        self.assertIn("maps/example.tmx", self.pack)
+        self.assertEqual(sorted(self.pack.names()), ["global/item_data.json", "maps/example.tmx"])
+
+    def test_read_returns_bytes_of_asset(self):
+        self.assertEqual(bytes(self.pack.read("global/item_data.json")), b'{"Door": {}}')
+
+    def test_open_returns_readable_file(self):
+        packed_file = self.pack.open("maps/example.tmx")
+        self.assertEqual(packed_file.read(), b"<map/>")
+
+    def test_packed_file_can_seek(self):
+        packed_file = self.pack.open("maps/example.tmx")
+        packed_file.seek(-2, io.SEEK_END)
+        self.assertEqual(packed_file.read(), b"/>")
+        self.assertEqual(packed_file.tell(), 6)
+        packed_file.seek(1)
+        packed_file.seek(2, io.SEEK_CUR)
+        self.assertEqual(packed_file.read(2), b"p/")
+
+    def test_when_file_is_no_pack_raise_invalid_pack(self):
+        with self.assertRaises(AssetPack.InvalidPack):
+            AssetPack(os.path.join(self.source, "maps", "example.tmx"))
+
+    def test_when_magic_is_wrong_raise_invalid_pack(self):
+        corrupt_path = os.path.join(self.directory, "corrupt.pak")
+        with open(self.pack_path, "rb") as pack_file:
+            data = pack_file.read()
+        with open(corrupt_path, "wb") as corrupt_file:
+            corrupt_file.write(b"XXXX" + data[4:])
+        with self.assertRaises(AssetPack.InvalidPack):
+            AssetPack(corrupt_path)
+
+    def test_packed_file_supports_buffered_reading(self):
+        packed_file = self.pack.open("maps/example.tmx")
+        self.assertTrue(packed_file.readable())
+        self.assertTrue(packed_file.seekable())
+        buffered_file = io.BufferedReader(packed_file)
+        self.assertEqual(buffered_file.read(4), b"<map")
+        buffered_file.seek(0)
+        self.assertEqual(buffered_file.read(), b"<map/>")
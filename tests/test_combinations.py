@@ -0,0 +1,97 @@
+# -*- encoding: utf-8 -*-
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from mock import patch
+
+from tekmate.combinations import CombinationTable, WRONG_COMBINATION
+from tekmate.items import Item, ItemContainer
+from tekmate.resources import DirectoryRoot, ResourceLocator
+
+
+class CombinationTableTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "combinations.json")
+        self.write_rules([{
+            "selected": "Key",
+            "target": "Door",
+            "conditions": [{"item": "target", "flag": "looked_at", "value": True, "message": "not_looked_at"}],
+            "effects": [{"action": "set", "item": "target", "flag": "usable", "value": True},
+                        {"action": "remove", "item": "selected"}],
+            "message": "combinate"
+        }])
+        self.table = CombinationTable(ResourceLocator([DirectoryRoot(self.directory)]), "combinations.json")
+        self.bag = ItemContainer()
+        self.key = Item(self.bag, "Key")
+        self.door = Item(ItemContainer(), "Door")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_rules(self, rules, mtime=1000):
+        with open(self.path, "w") as rules_file:
+            json.dump(rules, rules_file)
+        os.utime(self.path, (mtime, mtime))
+
+    def test_when_no_rule_exists_combination_is_wrong(self):
+        self.assertEqual(self.table.get_rule("Door", "Key").check(self.door, self.key), (False, WRONG_COMBINATION))
+
+    def test_applying_a_wrong_combination_changes_nothing(self):
+        self.table.get_rule("Door", "Key").apply(self.door, self.key)
+        self.assertIn(self.key, self.bag)
+
+    @patch("tekmate.items.item_data")
+    def test_when_condition_fails_return_its_message(self, mock_item_data):
+        mock_item_data.get_message.side_effect = lambda name, key: "%s.%s" % (name, key)
+        self.assertEqual(self.table.get_rule("Key", "Door").check(self.key, self.door), (False, "Door.not_looked_at"))
+
+    @patch("tekmate.items.item_data")
+    def test_when_conditions_hold_return_message_of_selected_item(self, mock_item_data):
+        mock_item_data.get_message.side_effect = lambda name, key: "%s.%s" % (name, key)
+        self.door.looked_at = True
+        self.assertEqual(self.table.get_rule("Key", "Door").check(self.key, self.door), (True, "Key.combinate"))
+
+    def test_apply_runs_effects_in_order(self):
+        self.table.get_rule("Key", "Door").apply(self.key, self.door)
+        self.assertTrue(self.door.usable)
+        self.assertNotIn(self.key, self.bag)
+
+    def test_condition_can_compare_flags_of_both_items(self):
+        condition = {"item": "target", "flag": "access_code", "equals": ["selected", "key_code"]}
+        self.write_rules([{"selected": "ID-Card", "target": "Door", "conditions": [condition]}], mtime=2000)
+        card = Item(ItemContainer(), "ID-Card")
+        self.assertTrue(self.table.get_rule("ID-Card", "Door").check(card, self.door)[0])
+        self.door.set_flag("access_code", 1)
+        self.assertFalse(self.table.get_rule("ID-Card", "Door").check(card, self.door)[0])
+
+    def test_flags_which_are_no_attributes_are_kept_in_unique_attributes(self):
+        self.write_rules([{"selected": "Key", "target": "Door",
+                           "effects": [{"action": "set", "item": "target", "flag": "unlocked_by_key", "value": True}]}],
+                         mtime=2000)
+        self.table.get_rule("Key", "Door").apply(self.key, self.door)
+        self.assertTrue(self.door.unique_attributes["unlocked_by_key"])
+
+    def test_when_rules_are_no_list_raise_invalid_combination(self):
+        self.write_rules({"Key": "Door"}, mtime=2000)
+        with self.assertRaises(CombinationTable.InvalidCombination):
+            self.table.get_rule("Key", "Door")
+
+    def test_when_action_is_unknown_raise_invalid_combination(self):
+        self.write_rules([{"selected": "Key", "target": "Door", "effects": [{"action": "explode", "item": "target"}]}],
+                         mtime=2000)
+        with self.assertRaises(CombinationTable.InvalidCombination):
+            self.table.get_rule("Key", "Door")
+
+    def test_when_rule_has_no_target_raise_invalid_combination(self):
+        self.write_rules([{"selected": "Key"}], mtime=2000)
+        with self.assertRaises(CombinationTable.InvalidCombination):
+            self.table.get_rule("Key", "Door")
+
+    def test_when_rule_is_declared_twice_raise_invalid_combination(self):
+        self.write_rules([{"selected": "Key", "target": "Door"}, {"selected": "Key", "target": "Door"}], mtime=2000)
+        with self.assertRaises(CombinationTable.InvalidCombination):
+            self.table.get_rule("Key", "Door")
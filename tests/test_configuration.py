@@ -1,19 +1,36 @@
 # -*- encoding: utf-8 -*-
+import shutil
+import tempfile
 from unittest import TestCase
 
-from mock import patch
+from mock import Mock, patch
 import pygame
 
-from tekmate.configuration import PyGameInitializer, TekmateFactory, MapLoader
+from tekmate.configuration import PyGameInitializer, TekmateFactory, MapLoader, MapRepository, MapPrefetcher
 from tekmate.draw.scenes import WorldScene
+from tekmate.events import EventDispatcher
+from tekmate.mapcache import MapCache, MapDescription
+from tekmate.scheduler import Scheduler
+
+
+class ObjectGroup(list):
+    def __init__(self, name, objects):
+        list.__init__(self, objects)
+        self.name = name
 
 
 class PyGameInitializerTestCase(TestCase):
     def setUp(self):
         self.conf = {"display_width": 640, "display_height": 480}
-        self.pygame_initializer = PyGameInitializer(self.conf)
+        self.cache_directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_directory)
+        self.pygame_initializer = PyGameInitializer(self.conf, MapCache(self.cache_directory))
         self.pygame_patcher = patch("tekmate.configuration.pygame", spec=True)
         self.pygame = self.pygame_patcher.start()
+        self.addCleanup(self.pygame_patcher.stop)
+        self.surface_cache_patcher = patch("tekmate.draw.surfacecache.surface_cache")
+        self.surface_cache_patcher.start()
+        self.addCleanup(self.surface_cache_patcher.stop)
         self.uc, self.rc = self.pygame_initializer.initialize()
 
     def test_can_create_pygame_initializer(self):
@@ -31,6 +48,16 @@ class PyGameInitializerTestCase(TestCase):
     def test_initialize_pygame_loads_global_images(self):
         self.assertEqual(self.pygame_initializer.load_global_images(), self.rc["images-global"])
 
+    def test_initialize_loads_global_images_only_once(self):
+        with patch.object(PyGameInitializer, "load_global_images") as mock_load:
+            self.pygame_initializer.initialize()
+        self.assertEqual(mock_load.call_count, 1)
+
+    def test_startup_images_contain_global_and_start_map_images(self):
+        image_names = self.pygame_initializer.get_startup_image_names()
+        self.assertIn("global/player.png", image_names)
+        self.assertIn("items/letter.png", image_names)
+
     def test_when_initialize_mouse_is_getting_configured_correctly(self):
         self.pygame.mouse.set_visible.assert_called_with(True)
 
@@ -40,6 +67,12 @@ class PyGameInitializerTestCase(TestCase):
     def test_update_context_should_have_get_event_reference(self):
         self.assertIs(self.uc["get_events"], self.pygame.event.get)
 
+    def test_update_context_should_have_an_event_dispatcher(self):
+        self.assertIsInstance(self.uc["event_dispatcher"], EventDispatcher)
+
+    def test_update_context_should_have_a_scheduler(self):
+        self.assertIsInstance(self.uc["scheduler"], Scheduler)
+
     def test_render_context_should_have_flip_function(self):
         self.assertIs(self.rc["flip"], self.pygame.display.flip)
 
@@ -51,7 +84,10 @@ class TekmateFactoryTestCase(TestCase):
     def setUp(self):
         pygame.init()
         pygame.display.set_mode((1, 1))
-        self.initializer = PyGameInitializer({"display_width": 1600, "display_height": 800})
+        self.cache_directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_directory)
+        self.initializer = PyGameInitializer({"display_width": 1600, "display_height": 800},
+                                             MapCache(self.cache_directory))
         self.game = TekmateFactory(self.initializer).create()
 
     def test_create_should_add_world_scene_to_game(self):
@@ -67,7 +103,11 @@ class MapLoaderTestCase(TestCase):
     def setUp(self):
         pygame.init()
         pygame.display.set_mode((1, 1))
-        self.map_loader = MapLoader()
+        self.cache_directory = tempfile.mkdtemp()
+        self.map_loader = MapLoader(MapCache(self.cache_directory))
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_directory)
 
     def test_when_tmx_added_len_of_tmx_list_is_not_none(self):
         self.map_loader.fill_tmx()
@@ -77,3 +117,180 @@ class MapLoaderTestCase(TestCase):
         self.map_loader.fill_tmx()
         self.map_loader.create_maps()
         self.assertNotEqual(len(self.map_loader.map_dict), 0)
+
+    def test_when_map_cache_is_valid_tmx_is_not_parsed_again(self):
+        waypoints = self.map_loader.map_dict["example"].waypoints
+        with patch.object(MapLoader, "parse_tmx") as mock_parse:
+            cached_map = MapLoader(MapCache(self.cache_directory)).map_dict["example"]
+        self.assertFalse(mock_parse.called)
+        self.assertEqual(set(cached_map.waypoints), set(waypoints))
+
+    def test_maps_are_not_loaded_before_first_access(self):
+        with patch.object(MapLoader, "load_map") as mock_load_map:
+            map_dict = MapLoader(MapCache(self.cache_directory)).map_dict
+        self.assertIn("example", map_dict)
+        self.assertFalse(mock_load_map.called)
+
+    def test_read_map_decodes_background_and_item_images(self):
+        description, decoded_images = self.map_loader.read_map("example", self.map_loader.get_item_attributes())
+        self.assertEqual(description.name, "example")
+        self.assertIn("items/door.png", decoded_images)
+        self.assertIn("images/title-background.png", decoded_images)
+
+    def test_read_map_uses_given_item_attributes_only(self):
+        item_attributes = self.map_loader.get_item_attributes()
+        with patch("tekmate.configuration.item_data") as mock_item_data:
+            self.map_loader.read_map("example", item_attributes)
+        self.assertEqual(mock_item_data.mock_calls, [])
+
+    def test_prefetched_map_uses_decoded_images(self):
+        prefetched_map = self.map_loader.read_map("example", self.map_loader.get_item_attributes())
+        with patch("tekmate.draw.ui.surface_cache") as mock_surface_cache:
+            created_map = self.map_loader.create_prefetched_map(*prefetched_map)
+        self.assertEqual(created_map.name, "example")
+        decoded_images = [call[0][3] for call in mock_surface_cache.load.call_args_list]
+        self.assertIn(prefetched_map[1]["items/door.png"], decoded_images)
+
+    def test_map_is_loaded_only_once(self):
+        self.assertIs(self.map_loader.map_dict["example"], self.map_loader.map_dict["example"])
+
+    def test_exits_are_loaded_from_tmx(self):
+        self.assertEqual(self.map_loader.map_dict["example"].exits, {(96, 480): "linux land"})
+
+    def test_obstacles_are_described_as_rects(self):
+        description = MapDescription("example")
+        self.map_loader.describe_obstacles(description, ObjectGroup("items", [Mock(x=5, y=6, width=7, height=8)]))
+        self.map_loader.describe_obstacles(description, ObjectGroup("obstacles", [Mock(x=1, y=2, width=3, height=4)]))
+        self.assertEqual(description.obstacles, [(1, 2, 3, 4)])
+
+
+class MapRepositoryTestCase(TestCase):
+    def setUp(self):
+        self.map_loader = Mock()
+        self.map_loader.get_map_names.return_value = ["a", "b", "c"]
+        self.map_loader.load_map.side_effect = lambda name: Mock(items=[Mock()])
+        self.repository = MapRepository(self.map_loader, resident_maps=2)
+
+    def test_when_more_maps_are_used_than_resident_least_recently_used_is_evicted(self):
+        first_map = self.repository["a"]
+        self.repository["b"]
+        self.repository["c"]
+        self.assertFalse(self.repository.is_resident("a"))
+        first_map.background.release_image.assert_called_with()
+        first_map.items[0].release_image.assert_called_with()
+
+    def test_when_evicted_map_is_used_again_surfaces_are_restored_and_state_is_kept(self):
+        first_map = self.repository["a"]
+        self.repository["b"]
+        self.repository["c"]
+        self.assertIs(self.repository["a"], first_map)
+        first_map.background.restore_image.assert_called_with()
+        self.assertEqual(self.map_loader.load_map.call_count, 3)
+
+    def test_accessing_a_map_makes_it_most_recently_used(self):
+        self.repository["a"]
+        self.repository["b"]
+        self.repository["a"]
+        self.repository["c"]
+        self.assertTrue(self.repository.is_resident("a"))
+        self.assertFalse(self.repository.is_resident("b"))
+
+    def test_when_prefetched_map_is_added_current_map_stays_resident(self):
+        self.repository["a"]
+        self.repository["b"]
+        self.repository.add_prefetched("c", Mock(items=[]))
+        self.assertTrue(self.repository.is_resident("b"))
+        self.assertFalse(self.repository.is_resident("a"))
+
+    def test_when_map_is_already_loaded_prefetched_map_is_ignored(self):
+        first_map = self.repository["a"]
+        self.repository.add_prefetched("a", Mock(items=[]))
+        self.assertIs(self.repository["a"], first_map)
+
+    def test_when_map_is_unknown_raise_key_error(self):
+        with self.assertRaises(KeyError):
+            self.repository["d"]
+
+    def test_len_and_iteration_use_map_names(self):
+        self.assertEqual(list(self.repository), ["a", "b", "c"])
+        self.assertEqual(len(self.repository), 3)
+
+    def test_adding_an_unknown_map_makes_it_accessible(self):
+        new_map = Mock(items=[])
+        self.repository.add("d", new_map)
+        self.assertIn("d", self.repository)
+        self.assertEqual(len(self.repository), 4)
+        self.assertIs(self.repository["d"], new_map)
+        self.assertFalse(self.map_loader.load_map.called)
+
+    def test_get_loaded_maps_does_not_load_maps(self):
+        first_map = self.repository["a"]
+        self.assertEqual(self.repository.get_loaded_maps(), [first_map])
+
+    def test_unloaded_map_is_loaded_again_on_next_access(self):
+        first_map = self.repository["a"]
+        self.repository.unload("c")
+        self.repository.unload("a")
+        self.assertFalse(self.repository.is_loaded("a"))
+        self.assertFalse(self.repository.is_resident("a"))
+        self.repository.add_prefetched("b", Mock(items=[]))
+        self.assertIsNot(self.repository["a"], first_map)
+        self.assertIn("a", self.repository)
+
+
+class MapPrefetcherTestCase(TestCase):
+    def setUp(self):
+        self.map_loader = Mock()
+        self.map_loader.get_map_names.return_value = ["hall", "office"]
+        self.repository = MapRepository(self.map_loader)
+        self.prefetcher = MapPrefetcher(self.repository)
+        self.prefetcher.start_thread = Mock()
+        self.current_map = Mock(exits={(0, 0): "hall", (10, 0): "hall", (20, 0): "outside"})
+
+    def test_prefetch_neighbors_requests_each_known_exit_once(self):
+        self.prefetcher.prefetch_neighbors(self.current_map)
+        self.assertEqual(self.prefetcher.pending, {"hall"})
+        self.assertEqual(self.prefetcher.requested_maps.qsize(), 1)
+
+    def test_when_map_is_already_loaded_it_is_not_prefetched(self):
+        self.repository["hall"]
+        self.prefetcher.prefetch_neighbors(self.current_map)
+        self.assertEqual(self.prefetcher.requested_maps.qsize(), 0)
+
+    def test_finish_prefetched_map_adds_created_map_to_repository(self):
+        self.map_loader.read_map.return_value = ("description", {})
+        self.prefetcher.prefetch("hall")
+        self.prefetcher.read_map(*self.prefetcher.requested_maps.get())
+        self.prefetcher.finish_prefetched_map()
+        self.assertTrue(self.repository.is_loaded("hall"))
+        self.assertEqual(self.prefetcher.pending, set())
+        self.map_loader.create_prefetched_map.assert_called_with("description", {})
+
+    def test_item_attributes_are_taken_when_map_is_requested(self):
+        self.map_loader.get_item_attributes.return_value = {"door": {"image": "door.png"}}
+        self.prefetcher.prefetch("hall")
+        self.assertEqual(self.prefetcher.requested_maps.get(), ("hall", {"door": {"image": "door.png"}}))
+
+    def test_prefetch_thread_reads_requested_maps(self):
+        self.map_loader.read_map.return_value = ("description", {})
+        prefetcher = MapPrefetcher(self.repository)
+        prefetcher.prefetch("hall")
+        prefetcher.prefetched_maps.put(prefetcher.prefetched_maps.get(timeout=5))
+        prefetcher.finish_prefetched_map()
+        thread = prefetcher.thread
+        prefetcher.start_thread()
+        self.assertIs(prefetcher.thread, thread)
+        self.assertTrue(thread.daemon)
+        self.assertTrue(self.repository.is_loaded("hall"))
+        self.map_loader.read_map.assert_called_with("hall", self.map_loader.get_item_attributes.return_value)
+
+    def test_when_nothing_is_prefetched_finish_returns_immediately(self):
+        self.prefetcher.finish_prefetched_map()
+        self.assertFalse(self.map_loader.create_prefetched_map.called)
+
+    def test_when_reading_map_fails_it_is_not_added(self):
+        self.map_loader.read_map.side_effect = IOError
+        self.prefetcher.prefetch("hall")
+        self.prefetcher.read_map("hall", {})
+        self.prefetcher.finish_prefetched_map()
+        self.assertFalse(self.repository.is_loaded("hall"))
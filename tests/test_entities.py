@@ -0,0 +1,102 @@
+# -*- encoding: utf-8 -*-
+from unittest import TestCase
+
+from tekmate.entities import EntityWorld, AnimationSystem
+
+
+class EntityWorldTestCase(TestCase):
+    def setUp(self):
+        self.world = EntityWorld(capacity=2, path_capacity=4)
+        self.arrived = []
+        self.world.subscribe(self.arrived.append)
+        self.entity = self.world.create_entity((0, 0), 0.5)
+
+    def test_create_entity_stores_components_in_arrays(self):
+        self.assertEqual(self.world.get_position(self.entity), (0, 0))
+        self.assertEqual(self.world.speeds[self.entity], 0.5)
+        self.assertEqual(self.world.facing[self.entity], 1)
+        self.assertFalse(self.world.is_moving(self.entity))
+        self.assertEqual(len(self.world), 1)
+
+    def test_world_grows_when_out_of_entities(self):
+        entities = [self.world.create_entity((index, 0), 1) for index in range(3)]
+        self.assertEqual(self.world.capacity, 4)
+        self.assertEqual(len(set(entities + [self.entity])), 4)
+        self.assertEqual(self.world.get_position(self.entity), (0, 0))
+        self.assertEqual(self.world.get_position(entities[-1]), (2, 0))
+
+    def test_destroyed_entities_are_reused(self):
+        self.world.destroy_entity(self.entity)
+        self.assertEqual(len(self.world), 0)
+        self.assertEqual(self.world.create_entity((1, 1), 1), self.entity)
+
+    def test_unknown_entity_raises(self):
+        self.world.destroy_entity(self.entity)
+        self.assertRaises(EntityWorld.NoSuchEntity, self.world.set_position, self.entity, (1, 1))
+        self.assertRaises(EntityWorld.NoSuchEntity, self.world.set_path, 99, [(1, 1)])
+
+    def test_entity_moves_at_constant_speed_across_segments(self):
+        self.world.set_path(self.entity, [(10, 0), (10, 10)])
+        self.world.update(30)
+        self.assertEqual(self.world.get_position(self.entity), (10, 5))
+        self.assertEqual(list(self.world.velocities[self.entity]), [0, 0.5])
+        self.assertEqual(self.arrived, [])
+        self.world.update(10)
+        self.assertEqual(self.world.get_position(self.entity), (10, 10))
+        self.assertFalse(self.world.is_moving(self.entity))
+        self.assertEqual(self.arrived, [self.entity])
+
+    def test_entities_move_independently(self):
+        other = self.world.create_entity((0, 0), 1)
+        self.world.set_path(self.entity, [(10, 0)])
+        self.world.set_path(other, [(-10, 0)])
+        self.world.update(10)
+        self.assertEqual(self.world.get_position(self.entity), (5, 0))
+        self.assertEqual(self.world.get_position(other), (-10, 0))
+        self.assertEqual(self.world.facing[other], -1)
+        self.assertEqual(self.arrived, [other])
+
+    def test_empty_path_stops_without_arriving(self):
+        self.world.set_path(self.entity, [(10, 0)])
+        self.world.update(10)
+        self.world.set_path(self.entity, [])
+        self.world.update(10)
+        self.assertFalse(self.world.is_moving(self.entity))
+        self.assertEqual(self.world.get_position(self.entity), (5, 0))
+        self.assertEqual(self.arrived, [])
+
+    def test_stopped_entity_stays_put(self):
+        self.world.set_path(self.entity, [(10, 0)])
+        self.world.update(10)
+        self.world.stop(self.entity)
+        self.world.update(10)
+        self.assertEqual(self.world.get_position(self.entity), (5, 0))
+        self.assertEqual(self.arrived, [])
+
+    def test_path_pool_is_compacted_and_grown(self):
+        other = self.world.create_entity((0, 0), 1)
+        self.world.set_path(other, [(1, 0), (2, 0), (100, 0)])
+        self.world.update(2)
+        self.world.set_path(self.entity, [(0, 1), (0, 2), (0, 3)])
+        self.assertEqual(self.world.path_size, 4)
+        self.assertEqual(len(self.world.path_points), 8)
+        self.world.update(200)
+        self.assertEqual(self.world.get_position(other), (100, 0))
+        self.assertEqual(self.world.get_position(self.entity), (0, 3))
+
+    def test_unsubscribed_listener_is_not_notified(self):
+        self.world.unsubscribe(self.arrived.append)
+        self.world.set_path(self.entity, [(1, 0)])
+        self.world.update(10)
+        self.assertEqual(self.arrived, [])
+
+    def test_walking_entities_advance_animation_frames(self):
+        idle = self.world.create_entity((0, 0), 1)
+        self.world.set_path(self.entity, [(1000, 0)])
+        self.world.update(AnimationSystem.FRAME_INTERVAL * 7 + 50)
+        self.assertEqual(self.world.animation_frames[self.entity], 7 % AnimationSystem.WALK_FRAMES)
+        self.assertEqual(self.world.animation_times[self.entity], 50)
+        self.assertEqual(self.world.animation_frames[idle], 0)
+        self.world.stop(self.entity)
+        self.world.update(10)
+        self.assertEqual(self.world.animation_frames[self.entity], 0)
@@ -0,0 +1,86 @@
+# -*- encoding: utf-8 -*-
+from unittest import TestCase
+
+try:  # pragma: no cover
+    from unittest.mock import patch
+except ImportError:  # pragma: no cover
+    from mock import patch
+
+import pygame
+
+from tekmate.events import EventDispatcher
+
+
+class EventDispatcherTestCase(TestCase):
+    def setUp(self):
+        self.dispatcher = EventDispatcher()
+        self.handled = []
+
+    def handler(self, name):
+        return lambda event: self.handled.append((name, event.type))
+
+    def motion(self, pos):
+        return pygame.event.Event(pygame.MOUSEMOTION, pos=pos)
+
+    def test_only_handlers_of_event_type_are_called(self):
+        self.dispatcher.subscribe(pygame.QUIT, self.handler("quit"))
+        self.dispatcher.subscribe(pygame.MOUSEMOTION, self.handler("motion"))
+        self.dispatcher.dispatch(pygame.event.Event(pygame.QUIT))
+        self.assertEqual(self.handled, [("quit", pygame.QUIT)])
+
+    def test_handlers_are_selected_by_button_and_key(self):
+        self.dispatcher.subscribe(pygame.MOUSEBUTTONDOWN, self.handler("left"), 1)
+        self.dispatcher.subscribe(pygame.MOUSEBUTTONDOWN, self.handler("right"), 3)
+        self.dispatcher.subscribe(pygame.KEYDOWN, self.handler("i"), pygame.K_i)
+        self.dispatcher.dispatch(pygame.event.Event(pygame.MOUSEBUTTONDOWN, button=3, pos=(0, 0)))
+        self.dispatcher.dispatch(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_ESCAPE))
+        self.assertEqual(self.handled, [("right", pygame.MOUSEBUTTONDOWN)])
+
+    def test_handlers_without_sub_key_receive_all_events_of_type(self):
+        self.dispatcher.subscribe(pygame.KEYDOWN, self.handler("any key"))
+        self.dispatcher.subscribe(pygame.KEYDOWN, self.handler("i"), pygame.K_i)
+        self.dispatcher.dispatch(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_i))
+        self.assertEqual([name for name, _ in self.handled], ["any key", "i"])
+
+    def test_unsubscribed_handlers_are_not_called(self):
+        handler = self.handler("quit")
+        self.dispatcher.subscribe(pygame.QUIT, handler)
+        self.dispatcher.unsubscribe(pygame.QUIT, handler)
+        self.dispatcher.dispatch(pygame.event.Event(pygame.QUIT))
+        self.assertEqual(self.handled, [])
+        self.assertEqual(self.dispatcher.get_event_types(), [])
+
+    def test_handlers_remain_until_last_one_is_unsubscribed(self):
+        handler = self.handler("quit")
+        self.dispatcher.subscribe(pygame.QUIT, handler)
+        self.dispatcher.subscribe(pygame.QUIT, self.handler("other"))
+        self.dispatcher.unsubscribe(pygame.QUIT, handler)
+        self.dispatcher.dispatch(pygame.event.Event(pygame.QUIT))
+        self.assertEqual(self.handled, [("other", pygame.QUIT)])
+
+    def test_bursts_of_mouse_motion_are_coalesced_into_last_event(self):
+        click = pygame.event.Event(pygame.MOUSEBUTTONDOWN, button=1, pos=(2, 2))
+        events = [self.motion((0, 0)), self.motion((1, 1)), click, self.motion((3, 3)), self.motion((4, 4))]
+        self.assertEqual(list(self.dispatcher.coalesce(events)), [events[1], click, events[4]])
+
+    def test_dispatch_all_dispatches_coalesced_events(self):
+        self.dispatcher.subscribe(pygame.MOUSEMOTION, lambda event: self.handled.append(event.pos))
+        self.dispatcher.dispatch_all([self.motion((0, 0)), self.motion((1, 1))])
+        self.dispatcher.dispatch_all([])
+        self.assertEqual(self.handled, [(1, 1)])
+
+    @patch("tekmate.events.pygame.event")
+    def test_only_subscribed_event_types_are_allowed(self, mock_event):
+        self.dispatcher.subscribe(pygame.QUIT, self.handler("quit"))
+        self.dispatcher.subscribe(pygame.KEYDOWN, self.handler("i"), pygame.K_i)
+        self.dispatcher.set_allowed_events()
+        mock_event.set_blocked.assert_called_with(None)
+        mock_event.set_allowed.assert_called_with(sorted([pygame.QUIT, pygame.KEYDOWN]))
+
+    @patch("tekmate.events.pygame.event")
+    def test_event_types_subscribed_after_blocking_are_allowed(self, mock_event):
+        self.dispatcher.subscribe(pygame.QUIT, self.handler("quit"))
+        self.assertFalse(mock_event.set_allowed.called)
+        self.dispatcher.set_allowed_events()
+        self.dispatcher.subscribe(pygame.KEYDOWN, self.handler("i"), pygame.K_i)
+        mock_event.set_allowed.assert_called_with(pygame.KEYDOWN)
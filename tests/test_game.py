@@ -6,8 +6,8 @@ try:  # pragma: no cover
 except ImportError:  # pragma: no cover
     from mock import Mock, patch
 
-from tekmate.game import Player, Map
-from tekmate.items import Item
+from tekmate.game import Player, Map, WaypointGraph
+from tekmate.items import Item, ItemContainer
 
 
 class PlayerTestCase(TestCase):
@@ -21,16 +21,16 @@ class PlayerTestCase(TestCase):
         self.create_invalid_items()
 
     def create_obtainable_item(self):
-        self.obtainable_item = Item([])
+        self.obtainable_item = Item(ItemContainer())
         self.obtainable_item.obtainable = True
 
     def create_usable_item(self):
-        self.usable_item = Item([])
+        self.usable_item = Item(ItemContainer())
         self.usable_item.usable = True
 
     def create_invalid_items(self):
-        self.not_usable_item = Item([])
-        self.not_obtainable_item = Item([])
+        self.not_usable_item = Item(ItemContainer())
+        self.not_obtainable_item = Item(ItemContainer())
 
     def test_player_position_defaults_at_zero_450(self):
         self.assertEqual(self.player.position, (0, 400))
@@ -60,7 +60,7 @@ class PlayerTestCase(TestCase):
     @patch("tekmate.items.Item.fill_attributes")
     def test_when_added_non_obtainable_item_return_false(self, mock_fill):
         mock_fill.return_value = None
-        any_item = Item([])
+        any_item = Item(ItemContainer())
         self.assertFalse(self.player.add_item(any_item))
 
 
@@ -68,3 +68,45 @@ class MapTestCase(TestCase):
     def test_when_creating_map_name_must_be_passed(self):
         test_map = Map("TestMap")
         self.assertEqual(test_map.name, "TestMap")
+
+
+class WaypointGraphTestCase(TestCase):
+    def setUp(self):
+        self.graph = WaypointGraph.from_description([
+            ("door", (0.0, 0.0), True, ["hall"]),
+            ("hall", (3.0, 4.0), False, ["door", "desk"]),
+            ("desk", (3.0, 10.0), False, [])
+        ])
+
+    def test_graph_stores_adjacency_as_csr_arrays(self):
+        self.assertEqual(len(self.graph), 3)
+        self.assertEqual(list(self.graph.indptr), [0, 1, 3, 3])
+        self.assertEqual(list(self.graph.indices), [1, 0, 2])
+        self.assertEqual(list(self.graph.get_neighbors(1)), [0, 2])
+        self.assertEqual(list(self.graph.get_edge_lengths(1)), [5.0, 6.0])
+
+    def test_waypoints_are_views_into_the_graph(self):
+        waypoints = self.graph.get_waypoints()
+        self.assertEqual(list(waypoints), ["door", "hall", "desk"])
+        hall = waypoints["hall"]
+        self.assertEqual(hall.pos, (3.0, 4.0))
+        self.assertFalse(hall.is_spawn)
+        self.assertTrue(waypoints["door"].is_spawn)
+        self.assertEqual(list(hall.neighbors), ["door", "desk"])
+        self.assertIs(hall.neighbors["desk"], waypoints["desk"])
+        self.assertRaises(AttributeError, setattr, hall, "height", 32)
+
+    def test_visibility_is_blocked_by_obstacles(self):
+        graph = WaypointGraph.from_description([
+            ("door", (0.0, 0.0), True, ["hall"]),
+            ("hall", (3.0, 4.0), False, ["door", "desk"]),
+            ("desk", (3.0, 10.0), False, [])
+        ], [(1.0, 6.0, 4.0, 1.0), (10.0, 0.0, 1.0, 1.0)])
+        self.assertTrue(graph.is_visible(0, 1))
+        self.assertFalse(graph.is_visible(1, 2))
+        self.assertFalse(graph.is_visible(2, 0))
+        self.assertTrue(graph.is_visible(2, 2))
+
+    def test_without_obstacles_only_connected_waypoints_are_visible(self):
+        visible = [(first, second) for first in range(3) for second in range(3) if self.graph.is_visible(first, second)]
+        self.assertEqual(visible, [(0, 0), (0, 1), (1, 0), (1, 1), (1, 2), (2, 1), (2, 2)])
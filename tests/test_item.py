@@ -1,18 +1,201 @@
 # -*- encoding: utf-8 -*-
+import json
+import os
+import shutil
+import tempfile
 from unittest import TestCase
 from mock import patch
-from tekmate.draw.ui import LetterUnderDoorUI
+from tekmate.draw.ui import ItemUI
 
 from tekmate.game import Player
-from tekmate.items import Item, Key, IdCard, Door, CardReader, Note, SymbolsFolder, TelephoneNote, \
-    Telephone, Paperclip, Letter, LetterUnderDoor
+from tekmate.resources import DirectoryRoot, ResourceLocator
+from tekmate.items import ItemDataRepository, ItemContainer, ItemType, Item
+
+
+class ItemDataRepositoryTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "item_data.json")
+        self.write_item_data({"Door": {"look_at": "A door."}})
+        self.repository = ItemDataRepository(ResourceLocator([DirectoryRoot(self.directory)]), "item_data.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_item_data(self, data, mtime=1000):
+        with open(self.path, "w") as item_file:
+            json.dump(data, item_file)
+        os.utime(self.path, (mtime, mtime))
+
+    def test_get_returns_attributes_of_item(self):
+        self.assertEqual(self.repository.get("Door"), {"look_at": "A door."})
+
+    def test_get_message_returns_message_of_item(self):
+        self.assertEqual(self.repository.get_message("Door", "look_at"), "A door.")
+
+    def test_when_item_is_unknown_raise_no_such_item(self):
+        with self.assertRaises(ItemDataRepository.NoSuchItem):
+            self.repository.get("Window")
+
+    @patch("tekmate.items.loads")
+    def test_file_is_only_parsed_once_while_unchanged(self, mock_load):
+        mock_load.return_value = {"Door": {}}
+        self.repository.get("Door")
+        self.repository.get("Door")
+        self.assertEqual(mock_load.call_count, 1)
+
+    def test_when_file_changes_item_data_is_reloaded(self):
+        self.repository.get("Door")
+        self.write_item_data({"Door": {"look_at": "Another door."}}, mtime=2000)
+        self.assertEqual(self.repository.get_message("Door", "look_at"), "Another door.")
+
+    def test_when_item_data_is_no_object_raise_invalid_item_data(self):
+        self.write_item_data(["Door"])
+        with self.assertRaises(ItemDataRepository.InvalidItemData):
+            self.repository.get("Door")
+
+    def test_get_item_name_returns_item_with_tmx_type(self):
+        self.write_item_data({"Door": {"tmx": "door"}}, mtime=2000)
+        self.assertEqual(self.repository.get_item_name("door"), "Door")
+
+    def test_when_tmx_type_is_unknown_raise_no_such_item(self):
+        with self.assertRaises(ItemDataRepository.NoSuchItem):
+            self.repository.get_item_name("window")
+
+    def test_find_returns_empty_attributes_for_unknown_item(self):
+        self.assertEqual(self.repository.find("Window"), {})
+
+    def test_get_type_returns_same_type_for_every_item(self):
+        self.assertIs(self.repository.get_type("Door"), self.repository.get_type("Door"))
+
+    def test_when_file_changes_types_are_compiled_again(self):
+        door_type = self.repository.get_type("Door")
+        self.write_item_data({"Door": {"look_at": "Another door."}}, mtime=2000)
+        self.assertEqual(self.repository.get_type("Door").messages["look_at_message"], "Another door.")
+        self.assertIsNot(self.repository.get_type("Door"), door_type)
+
+    def test_when_attributes_are_no_object_raise_invalid_item_data(self):
+        self.write_item_data({"Door": "look_at"})
+        with self.assertRaises(ItemDataRepository.InvalidItemData):
+            self.repository.get("Door")
+
+
+class ItemContainerTestCase(TestCase):
+    def setUp(self):
+        self.container = ItemContainer()
+        self.door = Item(self.container, "Door")
+        self.key = Item(self.container, "Key")
+        self.changes = []
+        self.container.subscribe(lambda change, entry: self.changes.append((change, entry)))
+
+    def test_container_keeps_insertion_order(self):
+        self.assertEqual(list(self.container), [self.door, self.key])
+        self.assertEqual(self.container[1], self.key)
+        self.assertEqual(len(self.container), 2)
+
+    def test_appending_an_item_twice_keeps_it_once(self):
+        self.container.append(self.door)
+        self.assertEqual(len(self.container), 2)
+        self.assertEqual(self.changes, [])
+
+    def test_find_returns_first_item_with_name(self):
+        second_door = Item(self.container, "Door")
+        self.assertIs(self.container.find("Door"), self.door)
+        self.door.remove_from_parent_container()
+        self.assertIs(self.container.find("Door"), second_door)
+
+    def test_when_name_is_unknown_raise_no_such_item(self):
+        self.key.remove_from_parent_container()
+        with self.assertRaises(ItemContainer.NoSuchItem):
+            self.container.find("Key")
+
+    def test_get_returns_item_by_id(self):
+        self.assertIs(self.container.get(id(self.key)), self.key)
+        with self.assertRaises(ItemContainer.NoSuchItem):
+            self.container.get(id(self))
+
+    def test_removing_an_item_shifts_later_items(self):
+        letter = Item(self.container, "Letter")
+        self.door.remove_from_parent_container()
+        self.assertEqual(list(self.container), [self.key, letter])
+        self.assertIs(self.container[1], letter)
+        self.assertIs(self.container.get(id(letter)), letter)
+        self.assertNotIn(self.door, self.container)
+
+    def test_when_removing_missing_item_raise_value_error(self):
+        with self.assertRaises(ValueError):
+            self.container.remove(Item(ItemContainer(), "Door"))
+
+    def test_listeners_are_notified_about_changes(self):
+        letter = Item(self.container, "Letter")
+        letter.remove_from_parent_container()
+        self.assertEqual(self.changes, [(ItemContainer.ADDED, letter), (ItemContainer.REMOVED, letter)])
+
+    def test_unsubscribed_listeners_are_not_notified(self):
+        listener = self.changes.append
+        self.container.subscribe(listener)
+        self.container.unsubscribe(listener)
+        self.key.remove_from_parent_container()
+        self.assertEqual(len(self.changes), 1)
+
+
+class ItemTypeTestCase(TestCase):
+    def setUp(self):
+        self.item_type = ItemType("Door", {"look_at": "A door.", "visible": False, "flags": {"access_code": 0}})
+
+    def test_messages_missing_in_data_use_defaults(self):
+        self.assertEqual(self.item_type.messages["look_at_message"], "A door.")
+        self.assertEqual(self.item_type.messages["inspect_message"], "INSPECT")
+
+    def test_items_of_a_type_share_its_messages(self):
+        first, second = Item(ItemContainer()), Item(ItemContainer())
+        first.set_item_type(self.item_type)
+        second.set_item_type(self.item_type)
+        self.assertIs(first.messages, second.messages)
+        self.assertFalse(first.visible)
+
+    def test_changing_a_message_only_changes_this_item(self):
+        first, second = Item(ItemContainer()), Item(ItemContainer())
+        first.set_item_type(self.item_type)
+        second.set_item_type(self.item_type)
+        first.look_at_message = "Another door."
+        first.inspect_message = "An inspected door."
+        self.assertEqual(first.get_look_at_message(), "Another door.")
+        self.assertEqual(second.get_look_at_message(), "A door.")
+        self.assertEqual(self.item_type.messages["inspect_message"], "INSPECT")
+
+    def test_changing_flags_only_changes_this_item(self):
+        item = Item(ItemContainer())
+        item.set_item_type(self.item_type)
+        item.unique_attributes["access_code"] = 1
+        self.assertEqual(self.item_type.flags, {"access_code": 0})
+
+    def test_visibility_changes_are_announced_to_listeners(self):
+        item = Item(ItemContainer(), "LetterUnderDoor")
+        changed = []
+        item.subscribe(changed.append)
+        item.subscribe(changed.append)
+        item.visible = False
+        item.set_flag("visible", True)
+        self.assertEqual(changed, [item, item])
+
+    def test_unsubscribed_listeners_are_not_notified(self):
+        item = Item(ItemContainer(), "LetterUnderDoor")
+        changed = []
+        item.subscribe(changed.append)
+        item.unsubscribe(changed.append)
+        item.visible = True
+        self.assertEqual(changed, [])
+
+    def test_items_have_no_instance_dict(self):
+        self.assertFalse(hasattr(Item(ItemContainer()), "__dict__"))
 
 
 class ItemTestCase(TestCase):
     @patch("tekmate.items.Item.fill_attributes")
     def setUp(self, mock_fill):
         mock_fill.return_value = None
-        self.container = []
+        self.container = ItemContainer()
         self.item = Item(self.container)
 
     def test_can_create_item(self):
@@ -55,7 +238,7 @@ class ItemTestCase(TestCase):
                 pass
 
 
-        mock_item = MockItem([])
+        mock_item = MockItem(ItemContainer())
         mock_item.combine(self.item)
         self.assertTrue(mock_item.called)
 
@@ -64,7 +247,7 @@ class ItemTestCase(TestCase):
         self.assertNotIn(self.item, self.container)
 
     def test_when_add_to_container_container_should_change(self):
-        container_new = []
+        container_new = ItemContainer()
         self.item.move_to_container(container_new)
         self.assertIn(self.item, container_new)
         self.assertNotIn(self.item, self.container)
@@ -76,7 +259,7 @@ class ItemTestCase(TestCase):
     def test_when_inspecting_an_item_return_inspect_message(self):
         self.assertEqual(self.item.get_inspect_message(), "INSPECT")
 
-    @patch("tekmate.items.load_item_data")
+    @patch("tekmate.items.item_data.get")
     def test_when_filling_attributes_values_are_set_correctly(self, mock_item_load_data):
         mock_item_load_data.return_value = {u'use': u'USE',
                                             u'inspect': u'INSPECT',
@@ -93,13 +276,13 @@ class ItemTestCase(TestCase):
     @patch("tekmate.items.Item.fill_attributes")
     def test_when_getting_obtainable_message_of_non_obtainable_item_get_not_obtainable_message(self, mock_fill):
         mock_fill.return_value = None
-        any_item = Item([])
+        any_item = Item(ItemContainer())
         self.assertEqual(any_item.add_not_obtainable_message, any_item.get_add_message())
 
     @patch("tekmate.items.Item.fill_attributes")
     def test_when_getting_obtainable_message_of_obtainable_item_get_add_message(self, mock_fill):
         mock_fill.return_value = None
-        any_item = Item([])
+        any_item = Item(ItemContainer())
         any_item.obtainable = True
         self.assertEqual(any_item.add_message, any_item.get_add_message())
 
@@ -108,11 +291,11 @@ class ItemTestCase(TestCase):
 
 class PaperclipTestCase(TestCase):
     def setUp(self):
-        self.container = []
-        self.world_container = []
-        self.paperclip = Paperclip(self.container)
-        self.key = Key(self.world_container)
-        self.door = Door(self.world_container)
+        self.container = ItemContainer()
+        self.world_container = ItemContainer()
+        self.paperclip = Item(self.container, "Paperclip")
+        self.key = Item(self.world_container, "Key")
+        self.door = Item(self.world_container, "Door")
         self.door.unique_attributes["combined_with_letter"] = True
 
     def test_can_create_paperclip(self):
@@ -121,18 +304,18 @@ class PaperclipTestCase(TestCase):
     @patch("tekmate.items.Item.fill_attributes")
     def test_when_combined_with_other_than_door_retrn_false(self, mock_fill):
         mock_fill.return_value = None
-        obj = Item([])
+        obj = Item(ItemContainer())
         comb = self.paperclip.is_combination_possible(obj)
         self.assertFalse(comb[0])
 
     def test_gets_consumed_when_combined_correctly_with_door(self):
-        self.door.parent_container.append(LetterUnderDoorUI())
+        self.door.parent_container.append(ItemUI("LetterUnderDoor"))
         self.paperclip.combine(self.door)
         self.assertNotIn(self.paperclip, self.container)
 
     def test_when_combined_correctly_key_is_obtainable(self):
         self.door.looked_at = True
-        lud = LetterUnderDoorUI()
+        lud = ItemUI("LetterUnderDoor")
         self.door.parent_container.append(lud)
         self.paperclip.combine(self.door)
         self.assertTrue(lud.item.obtainable)
@@ -153,7 +336,7 @@ class PaperclipTestCase(TestCase):
         self.assertFalse(comb[0])
 
     def test_when_combined_with_door_correctly_set_combined_with_paperclip_True(self):
-        self.door.parent_container.append(LetterUnderDoorUI())
+        self.door.parent_container.append(ItemUI("LetterUnderDoor"))
         self.paperclip.combine(self.door)
         self.assertTrue(self.door.unique_attributes["combined_with_paperclip"])
 
@@ -163,8 +346,8 @@ class IdCardTestCase(TestCase):
     @patch("tekmate.items.Item.fill_attributes")
     def setUp(self, mock_fill):
         mock_fill.return_value = None
-        self.idcard = IdCard([])
-        self.door = Door([])
+        self.idcard = Item(ItemContainer(), "ID-Card")
+        self.door = Item(ItemContainer(), "Door")
         self.door.unique_attributes["access_code"] = 1
 
     def test_can_create_id_card(self):
@@ -188,7 +371,7 @@ class IdCardTestCase(TestCase):
 
 class DoorTestCase(TestCase):
     def setUp(self):
-        self.door = Door([])
+        self.door = Item(ItemContainer(), "Door")
 
     def test_can_create_door(self):
         self.assertEqual("Door", self.door.get_name())
@@ -201,8 +384,8 @@ class CardReaderTestCase(TestCase):
     @patch("tekmate.items.Item.fill_attributes")
     def setUp(self, mock_fill):
         mock_fill.return_value = None
-        self.reader = CardReader([])
-        self.idcard = IdCard([])
+        self.reader = Item(ItemContainer(), "Card-Reader")
+        self.idcard = Item(ItemContainer(), "ID-Card")
 
     def test_can_create_card_reader(self):
         self.assertEqual("Card-Reader", self.reader.get_name())
@@ -214,7 +397,7 @@ class CardReaderTestCase(TestCase):
     @patch("tekmate.items.Item.fill_attributes")
     def test_when_combined_with_other_than_a_card_return_false(self, mock_fill):
         mock_fill.return_value = None
-        any_item = Item([])
+        any_item = Item(ItemContainer())
         comb = self.reader.is_combination_possible(any_item)
         self.assertFalse(comb[0])
 
@@ -226,9 +409,9 @@ class NoteTestCase(TestCase):
     @patch("tekmate.items.Item.fill_attributes")
     def setUp(self, mock_fill):
         mock_fill.return_value = None
-        self.folder = SymbolsFolder([])
+        self.folder = Item(ItemContainer(), "Symbols-Folder")
         self.player = Player()
-        self.note = Note(self.player.bag)
+        self.note = Item(self.player.bag, "Note")
 
     def test_can_create_note(self):
         self.assertEqual("Note", self.note.get_name())
@@ -236,7 +419,7 @@ class NoteTestCase(TestCase):
     @patch("tekmate.items.Item.fill_attributes")
     def test_when_combined_with_other_than_the_symbol_folder_return_false(self, mock_fill):
         mock_fill.return_value = None
-        any_item = Item([])
+        any_item = Item(ItemContainer())
         comb = self.note.is_combination_possible(any_item)
         self.assertFalse(comb[0])
 
@@ -260,12 +443,12 @@ class TelephoneTestCase(TestCase):
     @patch("tekmate.items.Item.fill_attributes")
     def setUp(self, mock_fill):
         mock_fill.return_value = None
-        self.telephone = Telephone([])
+        self.telephone = Item(ItemContainer(), "Telephone")
         self.setup_player_bag()
 
     def setup_player_bag(self):
         self.player = Player()
-        self.tel_note = TelephoneNote(self.player.bag)
+        self.tel_note = Item(self.player.bag, "Telephone-Note")
 
     def test_can_create_telephone(self):
         self.assertEqual(self.telephone.get_name(), "Telephone")
@@ -273,7 +456,7 @@ class TelephoneTestCase(TestCase):
     @patch("tekmate.items.Item.fill_attributes")
     def test_when_combined_with_other_than_telephone_note_return_false(self, mock_fill):
         mock_fill.return_value = None
-        any_item = Item([])
+        any_item = Item(ItemContainer())
         comb = self.telephone.is_combination_possible(any_item)
         self.assertFalse(comb[0])
 
@@ -287,11 +470,11 @@ class TelephoneTestCase(TestCase):
 
 class LetterTestCase(TestCase):
     def setUp(self):
-        self.container = []
-        self.letter = Letter(self.container)
-        self.world_container = []
-        self.key = Key(self.world_container)
-        self.door = Door(self.world_container)
+        self.container = ItemContainer()
+        self.letter = Item(self.container, "Letter")
+        self.world_container = ItemContainer()
+        self.key = Item(self.world_container, "Key")
+        self.door = Item(self.world_container, "Door")
 
     def test_can_create_letter(self):
         self.assertEqual(self.letter.get_name(), "Letter")
@@ -299,13 +482,13 @@ class LetterTestCase(TestCase):
     @patch("tekmate.items.Item.fill_attributes")
     def test_when_letter_combined_other_than_door_return_false(self, mock_fill):
         mock_fill.return_value = None
-        any_item = Item([])
+        any_item = Item(ItemContainer())
         comb = self.letter.is_combination_possible(any_item)
         self.assertFalse(comb[0])
 
     def test_gets_consumed_when_combined_correctly_with_door(self):
         self.door.looked_at = True
-        self.door.parent_container.append(LetterUnderDoorUI())
+        self.door.parent_container.append(ItemUI("LetterUnderDoor"))
         self.letter.combine(self.door)
         self.assertNotIn(self.letter, self.container)
 
@@ -316,7 +499,7 @@ class LetterTestCase(TestCase):
     def test_doors_combined_with_letter_return_true(self):
         self.assertFalse(self.door.unique_attributes["combined_with_letter"])
         self.door.looked_at = True
-        self.door.parent_container.append(LetterUnderDoorUI())
+        self.door.parent_container.append(ItemUI("LetterUnderDoor"))
         self.letter.combine(self.door)
         self.assertTrue(self.door.unique_attributes["combined_with_letter"])
 
@@ -327,17 +510,17 @@ class LetterTestCase(TestCase):
 
 class KeyTestCase(TestCase):
     def setUp(self):
-        self.container = []
-        self.key = Key(self.container)
-        self.door = Door([])
+        self.container = ItemContainer()
+        self.key = Item(self.container, "Key")
+        self.door = Item(ItemContainer(), "Door")
 
     def test_can_create_key(self):
-        self.assertIsInstance(self.key, Key)
+        self.assertEqual(self.key.get_name(), "Key")
 
     @patch("tekmate.items.Item.fill_attributes")
     def test_when_key_combined_other_than_door_raise_exception(self, mock_fill):
         mock_fill.return_value = None
-        any_item = Item([])
+        any_item = Item(ItemContainer())
         comb = self.key.is_combination_possible(any_item)
         self.assertFalse(comb[0])
 
@@ -0,0 +1,83 @@
+# -*- encoding: utf-8 -*-
+import shutil
+import tempfile
+from unittest import TestCase
+
+from tekmate.mapcache import MapCache, MapCodec, MapDescription
+
+
+class MapCodecTestCase(TestCase):
+    def setUp(self):
+        self.codec = MapCodec()
+        self.description = MapDescription("example")
+        self.description.background = "../images/title-background.png"
+        self.description.add_item("door", (64.0, 320.0))
+        self.description.add_waypoint("waypoint_door", (128.0, 480.0), True, ["waypoint_1"])
+        self.description.add_waypoint("waypoint_1", (288.0, 480.0), False, ["waypoint_door"])
+        self.description.add_exit((96.0, 480.0), "linux land")
+        self.description.add_obstacle((200.0, 400.0, 64.0, 32.0))
+        self.digest = MapCodec.get_digest(b"<map/>")
+        self.data = self.codec.dumps(self.description, self.digest)
+
+    def test_loads_restores_name_and_background(self):
+        description = self.codec.loads(self.data)
+        self.assertEqual(description.name, "example")
+        self.assertEqual(description.background, "../images/title-background.png")
+
+    def test_loads_restores_items(self):
+        self.assertEqual(self.codec.loads(self.data).items, [("door", (64.0, 320.0))])
+
+    def test_loads_restores_waypoints_with_neighbors(self):
+        self.assertEqual(self.codec.loads(self.data).waypoints, self.description.waypoints)
+
+    def test_loads_restores_exits(self):
+        self.assertEqual(self.codec.loads(self.data).exits, {(96.0, 480.0): "linux land"})
+
+    def test_loads_restores_obstacles(self):
+        self.assertEqual(self.codec.loads(self.data).obstacles, [(200.0, 400.0, 64.0, 32.0)])
+
+    def test_read_digest_returns_digest_of_header(self):
+        self.assertEqual(self.codec.read_digest(self.data), self.digest)
+
+    def test_when_magic_is_wrong_raise_invalid_format(self):
+        with self.assertRaises(MapCodec.InvalidFormat):
+            self.codec.read_digest(b"XXXX" + self.data[4:])
+
+    def test_when_header_is_truncated_raise_invalid_format(self):
+        with self.assertRaises(MapCodec.InvalidFormat):
+            self.codec.read_digest(self.data[:3])
+
+    def test_when_body_is_truncated_raise_invalid_format(self):
+        with self.assertRaises(MapCodec.InvalidFormat):
+            self.codec.loads(self.data[:-4])
+
+
+class MapCacheTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.map_cache = MapCache(self.directory)
+        self.description = MapDescription("example")
+        self.description.add_item("letter", (872.0, 360.0))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_when_nothing_stored_load_returns_none(self):
+        self.assertIsNone(self.map_cache.load("example", b"<map/>"))
+
+    def test_when_stored_with_same_tmx_load_returns_description(self):
+        self.map_cache.store(self.description, b"<map/>")
+        self.assertEqual(self.map_cache.load("example", b"<map/>").items, self.description.items)
+
+    def test_when_tmx_changed_load_returns_none(self):
+        self.map_cache.store(self.description, b"<map/>")
+        self.assertIsNone(self.map_cache.load("example", b"<map width='2'/>"))
+
+    def test_when_cache_file_is_corrupt_load_returns_none(self):
+        with open(self.map_cache.get_path("example"), "wb") as cache_file:
+            cache_file.write(b"garbage")
+        self.assertIsNone(self.map_cache.load("example", b"<map/>"))
+
+    def test_when_directory_can_not_be_created_store_does_not_raise(self):
+        self.map_cache.store(self.description, b"<map/>")
+        MapCache(self.map_cache.get_path("example")).store(self.description, b"<map/>")
@@ -1,7 +1,11 @@
+import shutil
+import tempfile
 from unittest import TestCase
 import pygame
 from tekmate.configuration import MapLoader
-from tekmate.pathfinding import AStar
+from tekmate.mapcache import MapCache
+from tekmate.game import WaypointGraph
+from tekmate.pathfinding import AStar, EdgeIndex, FlowField, FlowFieldService
 
 
 class AStarTestCase(TestCase):
@@ -14,7 +18,9 @@ class AStarTestCase(TestCase):
         self.a_star = AStar(self.waypoints, self.start, self.destination)
 
     def create_waypoints(self):
-        map_loader = MapLoader().map_dict["example"]
+        cache_directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_directory)
+        map_loader = MapLoader(MapCache(cache_directory)).map_dict["example"]
         return map_loader.waypoints
 
     def test_when_creating_a_star_nodes_must_be_not_none(self):
@@ -44,3 +50,141 @@ class AStarTestCase(TestCase):
     def test_find_shortest_path_returns_the_shortet_path_from_a_to_b(self):
         best_path = self.a_star.find_shortest_path()
         self.assertEqual(len(best_path), 4)
+
+
+class FlowFieldServiceTestCase(TestCase):
+    def setUp(self):
+        self.graph = WaypointGraph.from_description([
+            ("a", (0, 0), False, ["b", "d"]),
+            ("b", (10, 0), False, ["a", "c"]),
+            ("c", (10, 10), False, ["b", "d"]),
+            ("d", (0, 10), False, ["a", "c"]),
+            ("island", (50, 50), False, ["islet"]),
+            ("islet", (60, 50), False, ["island"])
+        ])
+        self.waypoints = self.graph.get_waypoints()
+        self.service = FlowFieldService(self.graph, capacity=2)
+
+    def get_id(self, name):
+        return self.graph.ids[name]
+
+    def test_field_stores_shortest_distance_to_goal(self):
+        field = self.service.get_field(self.get_id("a"))
+        self.assertEqual(field.distance(self.get_id("a")), 0)
+        self.assertEqual(field.distance(self.get_id("c")), 20)
+        self.assertFalse(field.is_reachable(self.get_id("island")))
+
+    def test_next_node_steps_towards_goal(self):
+        field = self.service.get_field(self.get_id("c"))
+        self.assertIn(field.next_node(self.get_id("a")), (self.get_id("b"), self.get_id("d")))
+        self.assertEqual(field.next_node(self.get_id("b")), self.get_id("c"))
+        self.assertEqual(field.next_node(self.get_id("c")), FlowField.ARRIVED)
+        self.assertEqual(field.next_node(self.get_id("island")), FlowField.ARRIVED)
+
+    def test_next_nodes_can_be_read_for_many_agents_at_once(self):
+        field = self.service.get_field(self.get_id("a"))
+        agents = [self.get_id("b"), self.get_id("c"), self.get_id("b")]
+        self.assertEqual(field.next_nodes[agents][0], self.get_id("a"))
+        self.assertEqual(field.next_nodes[agents][2], self.get_id("a"))
+
+    def test_next_waypoint_walks_the_graph(self):
+        self.assertIn(self.service.next_waypoint(self.waypoints["b"], self.waypoints["d"]).name, ("a", "c"))
+        self.assertIsNone(self.service.next_waypoint(self.waypoints["d"], self.waypoints["d"]))
+
+    def test_fields_are_cached_with_lru_eviction(self):
+        first = self.service.get_field(self.get_id("a"))
+        self.service.get_field(self.get_id("b"))
+        self.assertIs(self.service.get_field(self.get_id("a")), first)
+        self.service.get_field(self.get_id("c"))
+        self.assertEqual(list(self.service.fields), [self.get_id("a"), self.get_id("c")])
+
+    def test_field_to_position_snaps_goal_to_closest_waypoint(self):
+        field = self.service.get_field_to((9, 12))
+        self.assertEqual(field.goal, self.get_id("c"))
+
+    def test_maps_get_a_flow_field_service(self):
+        pygame.init()
+        pygame.display.set_mode((0, 0))
+        cache_directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_directory)
+        example = MapLoader(MapCache(cache_directory)).map_dict["example"]
+        field = example.flow_fields.get_field_to(example.waypoints["waypoint_4"].pos)
+        door = example.waypoints["waypoint_door"].id
+        self.assertTrue(field.is_reachable(door))
+        self.assertNotEqual(field.next_node(door), FlowField.ARRIVED)
+
+    def test_route_on_example_map_follows_its_waypoints(self):
+        pygame.init()
+        pygame.display.set_mode((0, 0))
+        cache_directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_directory)
+        example = MapLoader(MapCache(cache_directory)).map_dict["example"]
+        letter = example.items.find("Letter")
+        route = example.flow_fields.find_route(example.waypoints["waypoint_door"].pos, letter.rect.center)
+        names = ["waypoint_door", "waypoint_1", "waypoint_3", "waypoint_letter"]
+        self.assertEqual(route, [example.waypoints[name].pos for name in names])
+
+    def test_find_paths_answers_many_queries_at_once(self):
+        batch = self.service.find_paths([(1, 1), (11, 9), (49, 49), (0, 11)], [(10, 10), (10, 10), (0, 0), (1, 9)])
+        self.assertEqual(len(batch), 4)
+        self.assertEqual([waypoint.name for waypoint in batch.get_path(0)][::2], ["a", "c"])
+        self.assertEqual([waypoint.name for waypoint in batch.get_path(1)], ["c"])
+        self.assertEqual(batch.get_path(2), [])
+        self.assertEqual([waypoint.name for waypoint in batch.get_path(3)], ["d"])
+        self.assertEqual(list(batch.offsets), [0, 3, 4, 4, 5])
+
+    def test_find_paths_shares_one_field_per_goal(self):
+        self.service.find_paths([(0, 0), (10, 0), (0, 10)], [(10, 10), (10, 10), (10, 10)])
+        self.assertEqual(list(self.service.fields), [self.get_id("c")])
+
+    def test_find_paths_accepts_no_queries(self):
+        batch = self.service.find_paths([], [])
+        self.assertEqual(len(batch), 0)
+        self.assertEqual(len(batch.nodes), 0)
+
+    def test_edge_index_projects_onto_closest_edge(self):
+        edge_index = EdgeIndex(self.graph, cell_size=4)
+        self.assertEqual(edge_index.project((5, -3)), (self.get_id("a"), self.get_id("b"), (5.0, 0.0)))
+        self.assertEqual(edge_index.project((12, 30))[2], (10.0, 10.0))
+        self.assertEqual(edge_index.project((58, 47))[2], (58.0, 50.0))
+
+    def test_graph_without_edges_has_no_route(self):
+        service = FlowFieldService(WaypointGraph.from_description([("lonely", (0, 0), False, [])]))
+        self.assertIsNone(service.get_edge_index().project((1, 1)))
+        self.assertEqual(service.find_route((0, 0), (1, 1)), [])
+
+    def test_route_on_the_same_edge_goes_straight_to_the_click(self):
+        self.assertEqual(self.service.find_route((1, 0), (8, 1)), [(8.0, 0.0)])
+
+    def test_route_ends_exactly_at_the_projected_click(self):
+        self.assertEqual(self.service.find_route((0, 2), (12, 3)), [(0.0, 0.0), (10.0, 0.0), (10.0, 3.0)])
+        self.assertEqual(self.service.find_route((0, 9), (12, 3)), [(0.0, 10.0), (10.0, 10.0), (10.0, 3.0)])
+
+    def test_route_to_unconnected_part_of_graph_is_empty(self):
+        self.assertEqual(self.service.find_route((55, 51), (12, 3)), [])
+
+
+class PathSmoothingTestCase(TestCase):
+    def create_service(self, obstacles=()):
+        return FlowFieldService(WaypointGraph.from_description([
+            ("p", (0, 0), False, ["q"]),
+            ("q", (5, 5), False, ["p", "r"]),
+            ("r", (10, 0), False, ["q", "s"]),
+            ("s", (20, 0), False, ["r"])
+        ], obstacles))
+
+    def test_visible_intermediate_waypoints_are_skipped(self):
+        route = self.create_service([(100, 100, 1, 1)]).find_route((0, 0), (20, 0))
+        self.assertEqual(route, [(0.0, 0.0), (10.0, 0.0), (20.0, 0.0)])
+
+    def test_without_obstacles_route_follows_graph_edges(self):
+        route = self.create_service().find_route((0, 0), (20, 0))
+        self.assertEqual(route, [(0.0, 0.0), (5.0, 5.0), (10.0, 0.0), (20.0, 0.0)])
+
+    def test_target_on_last_waypoint_is_not_repeated(self):
+        route = self.create_service().find_route((0, 0), (10, 0))
+        self.assertEqual(route, [(0.0, 0.0), (5.0, 5.0), (10.0, 0.0)])
+
+    def test_waypoints_behind_obstacles_are_kept(self):
+        route = self.create_service([(4, -1, 2, 2)]).find_route((0, 0), (20, 0))
+        self.assertEqual(route, [(0.0, 0.0), (5.0, 5.0), (10.0, 0.0), (20.0, 0.0)])
@@ -0,0 +1,77 @@
+# -*- encoding: utf-8 -*-
+import sys
+from unittest import TestCase
+
+from mock import patch
+
+from tekmate.profiler import LazyModule, StartupProfiler
+
+
+class StartupProfilerTestCase(TestCase):
+    def setUp(self):
+        self.now = [0.0]
+        self.profiler = StartupProfiler(clock=lambda: self.now[0])
+
+    def advance(self, seconds):
+        self.now[0] += seconds
+
+    def test_section_records_elapsed_time(self):
+        with self.profiler.section("display"):
+            self.advance(0.25)
+        self.assertEqual(self.profiler.sections, [("display", 0.25)])
+
+    def test_section_is_recorded_when_it_raises(self):
+        with self.assertRaises(ValueError):
+            with self.profiler.section("display"):
+                raise ValueError
+        self.assertEqual(len(self.profiler.sections), 1)
+
+    def test_import_module_records_only_new_imports(self):
+        with patch.dict(sys.modules):
+            sys.modules.pop("colorsys", None)
+            self.profiler.import_module("colorsys")
+            self.profiler.import_module("colorsys")
+        self.assertEqual([name for name, _ in self.profiler.imports], ["colorsys"])
+
+    def test_first_frame_is_only_marked_once(self):
+        self.advance(1.5)
+        self.profiler.mark_first_frame()
+        self.advance(1.0)
+        self.profiler.mark_first_frame()
+        self.assertEqual(self.profiler.first_frame_time, 1.5)
+
+    @patch("tekmate.profiler.logger")
+    def test_when_enabled_report_is_logged_at_first_frame(self, mock_logger):
+        self.profiler.enabled = True
+        with self.profiler.section("display"):
+            self.advance(0.002)
+        self.profiler.mark_first_frame()
+        logged = [call[0][0] for call in mock_logger.info.call_args_list]
+        self.assertEqual(logged[0], "Startup report:")
+        self.assertIn("display", logged[1])
+        self.assertIn("first frame after 2.0 ms", logged[-1])
+
+    def test_report_before_first_frame_has_no_first_frame_line(self):
+        with self.profiler.section("display"):
+            self.advance(0.002)
+        report = self.profiler.report()
+        self.assertEqual(len(report), 2)
+        self.assertNotIn("first frame", report[-1])
+
+    @patch("tekmate.profiler.logger")
+    def test_when_disabled_report_is_not_logged(self, mock_logger):
+        self.profiler.mark_first_frame()
+        self.assertFalse(mock_logger.info.called)
+
+
+class LazyModuleTestCase(TestCase):
+    def setUp(self):
+        self.profiler = StartupProfiler()
+
+    def test_module_is_imported_on_first_attribute_access(self):
+        with patch.dict(sys.modules):
+            sys.modules.pop("colorsys", None)
+            lazy_colorsys = LazyModule("colorsys", self.profiler)
+            self.assertNotIn("colorsys", sys.modules)
+            self.assertEqual(lazy_colorsys.rgb_to_hsv(0, 0, 0), (0, 0, 0))
+            self.assertIn("colorsys", sys.modules)
@@ -0,0 +1,103 @@
+# -*- encoding: utf-8 -*-
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from tekmate.assetpack import AssetPack
+from tekmate.resources import DirectoryRoot, PackRoot, ResourceLocator
+
+
+class ResourceLocatorTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.write_file("assets/maps/example.tmx", b"<map/>")
+        self.write_file("assets/global/item_data.json", b"{}")
+        self.write_file("mods/b_mod/maps/example.tmx", b"<map mod='b'/>")
+        self.write_file("mods/a_mod/maps/example.tmx", b"<map mod='a'/>")
+        self.write_file("patches/global/item_data.json", b'{"Door": {}}')
+        self.locator = ResourceLocator.create_default(self.directory, loose=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_file(self, name, data):
+        path = os.path.join(self.directory, *name.split("/"))
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "wb") as resource_file:
+            resource_file.write(data)
+
+    def build_pack(self, name="assets.pak"):
+        pack_path = os.path.join(self.directory, *name.split("/"))
+        AssetPack.build(os.path.join(self.directory, "assets"), pack_path)
+        return pack_path
+
+    def test_first_mod_in_alphabetical_order_wins(self):
+        self.assertEqual(self.locator.read("maps/example.tmx"), b"<map mod='a'/>")
+
+    def test_patches_override_base_assets(self):
+        self.assertEqual(self.locator.read("global/item_data.json"), b'{"Door": {}}')
+
+    def test_resolved_root_is_cached(self):
+        root = self.locator.resolve("maps/example.tmx")
+        os.remove(root.get_path("maps/example.tmx"))
+        self.assertIs(self.locator.resolve("maps/example.tmx"), root)
+
+    def test_when_resource_is_missing_raise_resource_not_found(self):
+        with self.assertRaises(ResourceLocator.ResourceNotFound):
+            self.locator.open("maps/missing.tmx")
+        self.assertNotIn("maps/missing.tmx", self.locator)
+
+    def test_resource_of_any_root_is_contained(self):
+        self.assertIn("maps/example.tmx", self.locator)
+        self.assertIn("global/item_data.json", self.locator)
+
+    def test_glob_lists_names_of_all_roots_once(self):
+        self.assertEqual(self.locator.glob("maps/*.tmx"), ["maps/example.tmx"])
+
+    def test_get_path_and_getmtime_of_directory_root(self):
+        path = self.locator.get_path("global/item_data.json")
+        self.assertEqual(path, os.path.join(self.directory, "patches", "global", "item_data.json"))
+        self.assertEqual(self.locator.getmtime("global/item_data.json"), os.path.getmtime(path))
+
+    def test_add_root_takes_precedence_and_clears_cache(self):
+        self.locator.resolve("maps/example.tmx")
+        self.write_file("extra/maps/example.tmx", b"<map extra='1'/>")
+        self.locator.add_root(DirectoryRoot(os.path.join(self.directory, "extra")))
+        with self.locator.open("maps/example.tmx") as tmx_file:
+            self.assertEqual(tmx_file.read(), b"<map extra='1'/>")
+
+    def test_pack_is_preferred_over_loose_base_assets(self):
+        pack_path = self.build_pack()
+        self.write_file("assets/global/item_data.json", b'{"Key": {}}')
+        shutil.rmtree(os.path.join(self.directory, "patches"))
+        locator = ResourceLocator.create_default(self.directory, loose=False)
+        self.assertEqual(bytes(locator.read("global/item_data.json")), b"{}")
+        self.assertIsNone(locator.get_path("global/item_data.json"))
+        self.assertEqual(locator.getmtime("global/item_data.json"), os.path.getmtime(pack_path))
+        locator.resolve("global/item_data.json").pack.close()
+
+    def test_patch_packs_are_found_before_the_default_pack(self):
+        self.build_pack()
+        patch_pack = self.build_pack("patches/update.pak")
+        self.assertEqual(ResourceLocator.find_packs(self.directory)[0], patch_pack)
+
+
+class PackRootTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.directory, "assets", "maps"))
+        with open(os.path.join(self.directory, "assets", "maps", "example.tmx"), "wb") as tmx_file:
+            tmx_file.write(b"<map/>")
+        self.pack_path = os.path.join(self.directory, "assets.pak")
+        AssetPack.build(os.path.join(self.directory, "assets"), self.pack_path)
+        self.root = PackRoot(AssetPack(self.pack_path))
+
+    def tearDown(self):
+        self.root.pack.close()
+        shutil.rmtree(self.directory)
+
+    def test_pack_root_lists_and_opens_packed_names(self):
+        self.assertEqual(self.root.names(), ["maps/example.tmx"])
+        self.assertEqual(self.root.open("maps/example.tmx").read(), b"<map/>")
@@ -0,0 +1,194 @@
+# -*- encoding: utf-8 -*-
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+try:  # pragma: no cover
+    from unittest.mock import Mock, patch
+except ImportError:  # pragma: no cover
+    from mock import Mock, patch
+
+import pygame
+
+from tekmate.draw.ui import ItemUI, PlayerUI
+from tekmate.entities import EntityWorld
+from tekmate.items import Item, ItemContainer
+from tekmate.savegame import GameSnapshot, ItemState, MapState, SaveCodec, SaveStore, SaveWriter, \
+    capture_container, capture_item, restore_entries, restore_item, SAVE_VERSION
+from tekmate.scheduler import Scheduler
+
+
+class FakeItemUI(object):
+    def __init__(self, name):
+        self.item = Item(ItemContainer(), name)
+        self.rect = Mock(topleft=(0, 0))
+        self.image_name = "image"
+
+    def get_name(self):
+        return self.item.name
+
+    def load_image(self, name):
+        self.image_name = name
+
+
+def create_snapshot():
+    door = ItemState(u"Door", (64, 320), u"door", False, False, True, True,
+                     ((u"access_code", 3), (u"combined_with_letter", True), (u"note", u"sticky"),
+                      (u"weight", 1.5), (u"owner", None)),
+                     ((u"look_at_message", u"*click*"),))
+    paperclip = ItemState(u"Paperclip", None, u"", True, True, False, True, None, None)
+    return GameSnapshot(u"example", (300, 480), (paperclip,), (MapState(u"example", (door,)),))
+
+
+class CaptureTestCase(TestCase):
+    def test_capture_item_without_ui_has_no_position(self):
+        item = Item(ItemContainer(), "Paperclip")
+        state = capture_item(item)
+        self.assertEqual(state.name, "Paperclip")
+        self.assertIsNone(state.pos)
+        self.assertIsNone(state.flags)
+        self.assertIsNone(state.messages)
+
+    def test_capture_item_ui_stores_position_flags_and_changed_messages(self):
+        item_ui = FakeItemUI("Door")
+        item_ui.rect.topleft = (10, 20)
+        item_ui.item.set_flag("access_code", 2)
+        item_ui.item.look_at_message = "Changed"
+        state = capture_item(item_ui)
+        self.assertEqual(state.pos, (10, 20))
+        self.assertEqual(state.image_name, "image")
+        self.assertIn(("access_code", 2), state.flags)
+        self.assertIn(("look_at_message", "Changed"), state.messages)
+
+    def test_capture_container_captures_every_entry(self):
+        container = ItemContainer()
+        Item(container, "Door")
+        Item(container, "Key")
+        self.assertEqual([state.name for state in capture_container(container)], ["Door", "Key"])
+
+    def test_restore_item_applies_state(self):
+        item_ui = FakeItemUI("Door")
+        restore_item(item_ui, create_snapshot().maps[0].items[0])
+        self.assertEqual(item_ui.rect.topleft, (64, 320))
+        self.assertEqual(item_ui.image_name, "door")
+        self.assertTrue(item_ui.item.looked_at)
+        self.assertEqual(item_ui.item.get_flag("access_code"), 3)
+        self.assertEqual(item_ui.item.look_at_message, "*click*")
+
+    def test_restore_item_resets_to_item_type_defaults(self):
+        item = Item(ItemContainer(), "Door")
+        item.set_flag("access_code", 2)
+        item.look_at_message = "Changed"
+        restore_item(item, capture_item(Item(ItemContainer(), "Door")))
+        self.assertIs(item.messages, item.item_type.messages)
+        self.assertIsNone(item.flags)
+
+    def test_restore_entries_reuses_existing_uis_and_creates_missing_ones(self):
+        door = FakeItemUI("Door")
+        raw_item = Item(ItemContainer(), "Key")
+        states = [capture_item(door), capture_item(FakeItemUI("Door")), capture_item(raw_item)]
+        entries = restore_entries(states, [door, raw_item], FakeItemUI)
+        self.assertIs(entries[0], door)
+        self.assertIsInstance(entries[1], FakeItemUI)
+        self.assertIsNot(entries[1], door)
+        self.assertIsInstance(entries[2], Item)
+        self.assertIsNot(entries[2], raw_item)
+
+
+class SaveCodecTestCase(TestCase):
+    def setUp(self):
+        self.codec = SaveCodec()
+        self.snapshot = create_snapshot()
+        self.data = self.codec.dumps(self.snapshot)
+
+    def test_loads_restores_snapshot(self):
+        self.assertEqual(self.codec.loads(self.data), self.snapshot)
+
+    def test_when_magic_is_wrong_raise_invalid_format(self):
+        with self.assertRaises(SaveCodec.InvalidFormat):
+            self.codec.loads(b"XXXX" + self.data[4:])
+
+    def test_when_version_is_different_raise_invalid_format(self):
+        with self.assertRaises(SaveCodec.InvalidFormat):
+            self.codec.loads(SaveCodec.HEADER.pack(SaveCodec.MAGIC, SAVE_VERSION + 1) + self.data[6:])
+
+    def test_when_data_is_truncated_raise_invalid_format(self):
+        with self.assertRaises(SaveCodec.InvalidFormat):
+            self.codec.loads(self.data[:-4])
+
+    def test_when_value_type_is_unknown_raise_invalid_format(self):
+        data = self.codec.dumps(GameSnapshot(u"a", (0, 0), (ItemState(u"Key", None, u"", False, False, False, False,
+                                                                      ((u"x", None),), None),), ()))
+        with self.assertRaises(SaveCodec.InvalidFormat):
+            self.codec.loads(data[:-1] + b"\xff")
+
+
+class SaveStoreTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.save_store = SaveStore(os.path.join(self.directory, "saves"))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_saved_snapshot_can_be_loaded(self):
+        self.save_store.save("quicksave", GameSnapshot(u"old", (0, 0), (), ()))
+        self.save_store.save("quicksave", create_snapshot())
+        self.assertEqual(self.save_store.load("quicksave"), create_snapshot())
+        self.assertFalse(os.path.exists(self.save_store.get_path("quicksave") + ".tmp"))
+
+    def test_missing_save_loads_as_none(self):
+        self.assertIsNone(self.save_store.load("quicksave"))
+
+    def test_broken_save_loads_as_none(self):
+        self.save_store.write(self.save_store.get_path("quicksave"), b"broken")
+        self.assertIsNone(self.save_store.load("quicksave"))
+
+
+class SaveWriterTestCase(TestCase):
+    def setUp(self):
+        self.save_store = Mock()
+        self.save_writer = SaveWriter(self.save_store)
+
+    @patch("tekmate.savegame.Thread")
+    def test_save_queues_snapshot_and_starts_thread_once(self, mock_thread):
+        self.save_writer.save("autosave", "first")
+        self.save_writer.save("autosave", "second")
+        self.assertEqual(mock_thread.call_count, 1)
+        self.assertEqual(self.save_writer.requested_saves.qsize(), 2)
+
+    def test_only_latest_snapshot_per_slot_is_written(self):
+        self.save_writer.requested_saves.put(("autosave", "second"))
+        self.save_writer.requested_saves.put(("quicksave", "third"))
+        self.save_writer.requested_saves.put(("autosave", "fourth"))
+        latest = self.save_writer.take_latest(("autosave", "first"))
+        self.assertEqual(latest, {"autosave": "fourth", "quicksave": "third"})
+
+    def test_write_save_stores_snapshot(self):
+        self.save_writer.write_save("autosave", "snapshot")
+        self.save_store.save.assert_called_once_with("autosave", "snapshot")
+
+    def test_failed_write_is_logged(self):
+        self.save_store.save.side_effect = IOError
+        with patch("tekmate.savegame.logger") as mock_logger:
+            self.save_writer.write_save("autosave", "snapshot")
+        self.assertTrue(mock_logger.exception.called)
+
+
+class PlayerBagTestCase(TestCase):
+    def setUp(self):
+        pygame.init()
+        pygame.display.set_mode((1, 1))
+        self.player_ui = PlayerUI(EntityWorld())
+        self.player_ui.scheduler = Scheduler()
+
+    def test_split_items_survive_saving_and_loading(self):
+        letter_under_door = ItemUI("LetterUnderDoor")
+        letter_under_door.item.obtainable = True
+        self.player_ui.add_item(letter_under_door, ItemContainer([letter_under_door]))
+        codec = SaveCodec()
+        snapshot = codec.loads(codec.dumps(GameSnapshot(u"example", (0, 0), self.player_ui.capture_bag(), ())))
+        self.player_ui.restore_bag(snapshot.bag)
+        self.assertEqual([item_ui.get_name() for item_ui in self.player_ui.bag_item_group], ["Key"])
+        self.assertIn("Key", [item.get_name() for item in self.player_ui.player.bag])
@@ -0,0 +1,60 @@
+# -*- encoding: utf-8 -*-
+from unittest import TestCase
+
+from tekmate.scheduler import Scheduler
+
+
+class SchedulerTestCase(TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.scheduler = Scheduler(clock=lambda: self.now)
+        self.calls = []
+
+    def advance(self, milliseconds):
+        self.now += milliseconds / 1000.0
+        self.scheduler.run_due()
+
+    def test_call_later_runs_once_when_due(self):
+        self.scheduler.call_later(100, self.calls.append, "hide")
+        self.advance(99)
+        self.assertEqual(self.calls, [])
+        self.advance(1)
+        self.advance(500)
+        self.assertEqual(self.calls, ["hide"])
+
+    def test_calls_run_in_order_of_due_time(self):
+        self.scheduler.call_later(300, self.calls.append, "late")
+        self.scheduler.call_later(100, self.calls.append, "early")
+        self.scheduler.call_later(100, self.calls.append, "early too")
+        self.advance(1000)
+        self.assertEqual(self.calls, ["early", "early too", "late"])
+
+    def test_call_every_repeats_until_cancelled(self):
+        timer = self.scheduler.call_every(100, self.calls.append, "walk")
+        self.advance(100)
+        self.advance(100)
+        timer.cancel()
+        self.advance(100)
+        self.assertEqual(self.calls, ["walk", "walk"])
+        self.assertEqual(len(self.scheduler), 0)
+
+    def test_when_frame_is_late_repeating_call_runs_once(self):
+        self.scheduler.call_every(100, self.calls.append, "walk")
+        self.advance(1000)
+        self.advance(50)
+        self.assertEqual(self.calls, ["walk"])
+        self.advance(50)
+        self.assertEqual(self.calls, ["walk", "walk"])
+
+    def test_cancelled_call_does_not_affect_other_timers(self):
+        self.scheduler.call_later(100, self.calls.append, "crouch")
+        self.scheduler.call_later(100, self.calls.append, "text").cancel()
+        self.advance(100)
+        self.assertEqual(self.calls, ["crouch"])
+
+    def test_callbacks_can_schedule_new_calls(self):
+        self.scheduler.call_later(100, lambda: self.scheduler.call_later(100, self.calls.append, "resume"))
+        self.advance(100)
+        self.assertEqual(len(self.scheduler), 1)
+        self.advance(100)
+        self.assertEqual(self.calls, ["resume"])
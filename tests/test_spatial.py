@@ -0,0 +1,63 @@
+# -*- encoding: utf-8 -*-
+from unittest import TestCase
+
+import pygame
+
+from tekmate.draw.spatial import SpatialGroup
+
+
+class RectSprite(pygame.sprite.Sprite):
+    def __init__(self, rect, mask=None):
+        pygame.sprite.Sprite.__init__(self)
+        self.rect = pygame.Rect(rect)
+        if mask is not None:
+            self.mask = mask
+
+
+class SpatialGroupTestCase(TestCase):
+    def setUp(self):
+        self.group = SpatialGroup(cell_size=32)
+        self.door = RectSprite((0, 0, 100, 100))
+        self.letter = RectSprite((40, 40, 10, 10))
+        self.group.add(self.door, self.letter)
+
+    def test_topmost_at_returns_last_added_sprite_under_point(self):
+        self.assertIs(self.group.topmost_at((45, 45)), self.letter)
+        self.assertIs(self.group.topmost_at((5, 5)), self.door)
+
+    def test_when_nothing_is_under_point_return_none(self):
+        self.assertIsNone(self.group.topmost_at((150, 150)))
+        self.assertIsNone(self.group.topmost_at((100, 100)))
+
+    def test_sprites_at_returns_all_sprites_topmost_first(self):
+        self.assertEqual(self.group.sprites_at((45, 45)), [self.letter, self.door])
+
+    def test_killed_sprites_are_no_longer_found(self):
+        self.letter.kill()
+        self.assertIs(self.group.topmost_at((45, 45)), self.door)
+        self.door.kill()
+        self.assertEqual(self.group.cells, {})
+
+    def test_readded_sprite_is_on_top(self):
+        self.group.remove(self.door)
+        self.group.add(self.door)
+        self.assertIs(self.group.topmost_at((45, 45)), self.door)
+
+    def test_moved_sprite_is_found_at_new_position_after_reindex(self):
+        self.letter.rect.topleft = (200, 200)
+        self.group.reindex(self.letter)
+        self.assertIs(self.group.topmost_at((205, 205)), self.letter)
+        self.assertIs(self.group.topmost_at((45, 45)), self.door)
+
+    def test_empty_removes_all_sprites_from_index(self):
+        self.group.empty()
+        self.assertIsNone(self.group.topmost_at((45, 45)))
+        self.assertEqual(self.group.cells, {})
+
+    def test_transparent_pixels_of_masked_sprites_are_no_hit(self):
+        mask = pygame.mask.Mask((10, 10))
+        mask.set_at((0, 0))
+        key = RectSprite((40, 40, 10, 10), mask)
+        self.group.add(key)
+        self.assertIs(self.group.topmost_at((40, 40)), key)
+        self.assertEqual(self.group.sprites_at((45, 45)), [self.letter, self.door])